@@ -0,0 +1,35 @@
+"""test_import.py
+
+Benchmarks for the time it takes to `import synack`
+
+These are not pass/fail tests, they print numbers to compare between changes.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+src = os.path.abspath(os.path.join(__file__, '../../src'))
+
+
+class ImportBenchmark(unittest.TestCase):
+    rounds = 10
+
+    def test_import(self):
+        """Time `import synack` with `python -X importtime` and show the slowest modules by their own time"""
+        cumulative = 0
+        self_times = dict()
+        for _ in range(self.rounds):
+            res = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import synack'],
+                                 cwd=src, capture_output=True, text=True, check=True)
+            for line in res.stderr.splitlines()[1:]:
+                self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+                name = name.strip()
+                self_times[name] = self_times.get(name, 0) + int(self_us)
+                if name == 'synack':
+                    cumulative += int(cumulative_us)
+        print(f'\nimport synack: {cumulative / self.rounds / 1000:.2f}ms')
+        slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:10]
+        for name, total in slowest:
+            print(f'\t{total / self.rounds / 1000:8.2f}ms  {name}')
@@ -0,0 +1,58 @@
+"""test_json.py
+
+Benchmarks for the time it takes to decode large JSON responses
+
+These are not pass/fail tests, they print numbers to compare between changes.
+"""
+
+import gzip
+import json
+import os
+import requests
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._json  # noqa: E402
+import synack._standin  # noqa: E402
+
+
+class JSONBenchmark(unittest.TestCase):
+    rounds = 20
+
+    @classmethod
+    def setUpClass(cls):
+        standin = synack._standin.StandIn(missions=0, targets=1, assets=5000, hydra=0)
+        cls.content = json.dumps(next(iter(standin.assets.values()))).encode()
+        cls.compressed = gzip.compress(cls.content)
+
+    def run_rounds(self, title, decode):
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            res = requests.models.Response()
+            res._content = self.content
+            decode(res)
+        elapsed = time.perf_counter() - start
+        print(f'\n{title}: {elapsed / self.rounds * 1000:.2f}ms')
+
+    def test_decode(self):
+        """Time decoding a page of 5000 assets with requests and with each JSON backend"""
+        print(f'\n5000 assets: {len(self.content) / 1024:.0f}KiB -- {len(self.compressed) / 1024:.0f}KiB gzip')
+        self.run_rounds('requests Response.json()', lambda res: res.json())
+        for backend in ['json', 'orjson']:
+            try:
+                loads = synack._json.get_loads(backend)
+            except ImportError:
+                print(f'\n{backend}: not installed')
+                continue
+            self.run_rounds(f'{backend} backend', lambda res: synack._json.decode(res, loads))
+
+    def test_decompress(self):
+        """Time decompressing a gzip page of 5000 assets"""
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            gzip.decompress(self.compressed)
+        elapsed = time.perf_counter() - start
+        print(f'\ngzip.decompress(): {elapsed / self.rounds * 1000:.2f}ms')
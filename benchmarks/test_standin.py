@@ -0,0 +1,143 @@
+"""test_standin.py
+
+Benchmarks for common workflows against the local stand-in for Synack
+
+These are not pass/fail tests, they print numbers to compare between changes.
+Every response is delayed by `latency` seconds to stand in for the network,
+and the rate limits and response cache are turned off so only the client is measured.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+import synack._standin  # noqa: E402
+import synack._watcher  # noqa: E402
+
+
+class StandInBenchmark(unittest.TestCase):
+    rounds = 5
+    latency = 0.02
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standin = synack._standin.StandIn(missions=500, targets=10, assets=2000, hydra=200,
+                                              latency=cls.latency)
+        cls.standin.start()
+        cls.config_dir = tempfile.TemporaryDirectory()
+        cls.handler = synack.Handler(config_dir=cls.config_dir.name, base_url=cls.standin.base_url, login=True,
+                                     email='joe@schmoe.com', password='password1234',
+                                     otp_secret='JBSWY3DPEHPK3PXP', cache_ttls={}, rate_limits={},
+                                     use_scratchspace=False)
+        cls.handler.targets.get_assessments()
+        cls.handler.targets.get_registered_summary()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.handler.state.session.close()
+        cls.standin.stop()
+        cls.config_dir.cleanup()
+
+    def run_rounds(self, title, function):
+        self.handler.metrics.clear()
+        start = time.perf_counter()
+        for _ in range(self.rounds):
+            function()
+        elapsed = time.perf_counter() - start
+        requests = sum(m['count'] for m in self.handler.metrics.get_snapshot().values())
+        print(f'\n{title}: {elapsed / self.rounds * 1000:.2f}ms' +
+              f' -- {requests / self.rounds:.1f} requests')
+
+    def test_claim(self):
+        """Time 8 threads racing to claim the same 20 missions"""
+        def claim():
+            missions = self.handler.missions.get(max_pages=1)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                claims = [executor.submit(self.handler.missions.set_claimed, m) for m in missions for _ in range(8)]
+            for mission in missions:
+                self.handler.missions.set_disclaimed(mission)
+            assert sum(c.result()['success'] for c in claims) == len(missions)
+        self.run_rounds('missions.set_claimed() x8 threads', claim)
+
+    def test_claim_latency(self):
+        """Time from a poll returning a mission to its claim being answered, with and without a prepared claim"""
+        latency = self.standin.latency
+        for self.standin.latency in [0, latency]:
+            for title, prepare, reconnect in [('set_claimed() new connection', False, True),
+                                              ('set_claimed()', False, False),
+                                              ('build_claims() + set_claimed()', True, False)]:
+                elapsed = 0
+                for _ in range(self.rounds):
+                    mission = self.handler.missions.get(max_pages=1)[0]
+                    if reconnect:
+                        self.handler.state.session.close()
+                    start = time.perf_counter()
+                    if prepare:
+                        self.handler.missions.build_claims([mission])
+                    assert self.handler.missions.set_claimed(mission)['success']
+                    elapsed += time.perf_counter() - start
+                    self.handler.missions.set_disclaimed(mission)
+                print(f'\ndetect-to-claim {title} latency={self.standin.latency}: ' +
+                      f'{elapsed / self.rounds * 1000:.2f}ms')
+        self.standin.latency = latency
+
+    def test_get_hydra(self):
+        """Time fetching 20 pages of Hydra results"""
+        slug = self.standin.targets[0]['slug']
+        self.run_rounds('hydra.get_hydra()',
+                        lambda: self.handler.hydra.get_hydra(slug=slug, max_page=0, update_db=False))
+
+    def test_get_hydra_async(self):
+        """Time fetching 20 pages of Hydra results with the AsyncHandler"""
+        slug = self.standin.targets[0]['slug']
+
+        async def get_hydra():
+            async with synack.AsyncHandler(state=self.handler.state) as handler:
+                await handler.hydra.get_hydra(slug=slug, max_page=0, update_db=False)
+        self.run_rounds('AsyncHandler hydra.get_hydra()', lambda: asyncio.run(get_hydra()))
+
+    def test_get_missions(self):
+        """Time fetching 25 pages of missions with 1 and the default number of page workers"""
+        page_workers = self.handler.state.page_workers
+        for workers in [1, page_workers]:
+            self.handler.state.page_workers = workers
+            self.run_rounds(f'missions.get() page_workers={workers}',
+                            lambda: self.handler.missions.get(max_pages=25))
+        self.handler.state.page_workers = page_workers
+
+    def test_get_scope(self):
+        """Time fetching and building the scope of a Host and a Web target"""
+        for target in self.standin.targets[0], self.standin.targets[2]:
+            self.run_rounds(f'targets.get_scope() {target["category"]["name"]}',
+                            lambda: self.handler.targets.get_scope(slug=target['slug']))
+
+    def test_watch(self):
+        """Compare polling get_available() with the MissionWatcher over 50 polls, with a drop every 10
+
+        Both start from an empty listing, as most of the time there are no missions to claim.
+        """
+        def get_available():
+            self.handler.missions.get_available()
+
+        missions = self.standin.missions
+        watcher = synack._watcher.MissionWatcher(self.handler.missions)
+        for title, poll in [('missions.get_available() loop', get_available), ('MissionWatcher.poll()', watcher.poll)]:
+            self.standin.missions = []
+            self.handler.metrics.clear()
+            start = time.perf_counter()
+            for i in range(50):
+                if i % 10 == 9:
+                    self.standin.publish(2)
+                poll()
+            elapsed = time.perf_counter() - start
+            snapshot = self.handler.metrics.get_snapshot().values()
+            print(f'\n{title}: {elapsed * 1000:.2f}ms -- {sum(m["count"] for m in snapshot)} requests' +
+                  f' -- {sum(m["bytes"] for m in snapshot) / 1024:.1f}KiB')
+        self.standin.missions = missions
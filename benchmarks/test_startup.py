@@ -0,0 +1,52 @@
+"""test_startup.py
+
+Benchmarks for the time it takes to build a Handler
+
+These are not pass/fail tests, they print numbers to compare between changes.
+"""
+
+import alembic.command
+import os
+import sqlalchemy
+import sys
+import tempfile
+import time
+import unittest
+
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+
+
+class StartupBenchmark(unittest.TestCase):
+    rounds = 20
+
+    def run_rounds(self, title, plugins):
+        with tempfile.TemporaryDirectory() as config_dir:
+            synack.Handler(config_dir=config_dir, login=False).db
+            with patch.object(sqlalchemy, 'create_engine', wraps=sqlalchemy.create_engine) as mock_engine, \
+                    patch.object(alembic.command, 'upgrade', wraps=alembic.command.upgrade) as mock_upgrade:
+                start = time.perf_counter()
+                for _ in range(self.rounds):
+                    handler = synack.Handler(config_dir=config_dir, login=False)
+                    for plugin in plugins:
+                        getattr(handler, plugin)
+                elapsed = time.perf_counter() - start
+        print(f'\n{title}: {elapsed / self.rounds * 1000:.2f}ms' +
+              f' -- {mock_engine.call_count / self.rounds:.1f} engines' +
+              f' -- {mock_upgrade.call_count / self.rounds:.1f} migrations')
+
+    def test_handler(self):
+        """Time Handler creation without touching any plugins"""
+        self.run_rounds('Handler()', [])
+
+    def test_handler_all_plugins(self):
+        """Time Handler creation and loading every plugin"""
+        plugins = [name.lower() for name in synack.plugins.base.Plugin.registry.keys()]
+        self.run_rounds('Handler() + all plugins', plugins)
+
+    def test_handler_missions(self):
+        """Time Handler creation for a script that only needs missions"""
+        self.run_rounds('Handler() + missions', ['missions'])
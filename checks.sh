@@ -1,6 +1,6 @@
 #!/bin/bash
 
-flake8 src test live-tests
+flake8 src test live-tests benchmarks
 
 diff_arrays() {
     local -n _one=$1
@@ -18,7 +18,7 @@ diff_arrays() {
 for plugin in ./src/synack/plugins/*.py; do
     p=$(basename ${plugin})
     p=${p%.*}
-    defs=($(awk -F'[ (]*' '/ def / {print $3}' ${plugin} | egrep -v "__init__|__init_subclass__|_fk_pragma"))
+    defs=($(awk -F'[ (]*' '/ def / {print $($2 == "async" ? 4 : 3)}' ${plugin} | egrep -v "^_"))
     readarray -t a_defs < <(printf '%s\n' "${defs[@]}" | sort)
     # Check Alphabetical
     if [[ "${defs[@]}" != "${a_defs[@]}" ]]; then
@@ -39,7 +39,7 @@ done
 
 # Check Tests
 for test in ./test/test_*.py; do
-    defs=($(awk -F'[ (]*' '/ def / {print $3}' ${test} | egrep -v "__init__|setUp"))
+    defs=($(awk -F'[ (]*' '/ def / {print $($2 == "async" ? 4 : 3)}' ${test} | egrep -v "__init__|setUp"))
     readarray -t a_defs < <(printf '%s\n' "${defs[@]}" | sort)
     # Check Alphabetical
     if [[ "${defs[@]}" != "${a_defs[@]}" ]]; then
@@ -35,5 +35,14 @@ setuptools.setup(
         "requests==2.28.1",
         "SQLAlchemy==1.4.44",
         "urllib3==1.26.13",
-    ]
+    ],
+    extras_require={
+        "async": [
+            "aiohttp==3.8.3",
+        ],
+        "fast": [
+            "brotli==1.0.9",
+            "orjson==3.8.3",
+        ],
+    }
 )
@@ -1,4 +1,5 @@
 # flake8: noqa
 
+from ._handler import AsyncHandler
 from ._handler import Handler
 from ._state import State
@@ -0,0 +1,42 @@
+"""adapter.py
+
+Defines the HTTPAdapter used by the State to pool connections to each host.
+"""
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class CountingPoolMixin:
+    """Count every socket a pool opens, including reconnects of dropped keep-alive connections"""
+    num_sockets = 0
+
+    def _make_request(self, conn, *args, **kwargs):
+        if conn.sock is None:
+            self.num_sockets += 1
+        return super()._make_request(conn, *args, **kwargs)
+
+
+class CountingHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+POOL_CLASSES = {
+    'http': CountingHTTPConnectionPool,
+    'https': CountingHTTPSConnectionPool
+}
+
+
+class PoolAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = POOL_CLASSES
+        return manager
@@ -0,0 +1,194 @@
+"""cache.py
+
+Defines the conditional-GET response cache shared by everything using a State.
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+from urllib.parse import urlencode, urlparse
+
+from ._response import build_response
+
+
+class CacheEntry:
+    def __init__(self, url, headers, content, stored_at):
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.stored_at = stored_at
+
+    @property
+    def validators(self) -> dict:
+        """Headers that ask Synack to only send the body again if it changed"""
+        ret = dict()
+        for header, value in self.headers.items():
+            if header.lower() == 'etag':
+                ret['If-None-Match'] = value
+            elif header.lower() == 'last-modified':
+                ret['If-Modified-Since'] = value
+        return ret
+
+    def build_response(self):
+        """Return a new requests Response holding the cached body"""
+        return build_response(200, 'OK', self.url, self.headers, self.content)
+
+
+class ResponseCache:
+    """Cache of GET responses for the endpoints that have a TTL
+
+    TTLs are given as {pattern: seconds}, where pattern is matched against the host and
+    path of the URL (platform.synack.com/api/targets/*/resources).
+    Responses younger than their TTL are returned without a request being sent.
+    Older ones are checked with If-None-Match/If-Modified-Since so an unchanged body is not sent again.
+    """
+    def __init__(self, ttls, size=32, directory=None):
+        self.ttls = ttls or dict()
+        self.size = size
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._invalidated = dict()
+        self._lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _get_endpoint(url):
+        """Return the URL up to the first part of the API path, which writes invalidate together"""
+        match = re.match(r'([^?]*?/api/(v\d+/)?[^/?]*)', url)
+        return match.group(1) if match else url
+
+    @staticmethod
+    def _get_key(url, query, identity=None):
+        """Return the key of a URL, its query parameters, and who it was requested as
+
+        The identity is hashed so the Authorization header it usually is never reaches the disk.
+        """
+        if query:
+            query = sorted([(k, v) for k, v in query.items() if v is not None], key=lambda i: str(i[0]))
+            url = f'{url}{"&" if "?" in url else "?"}{urlencode(query, doseq=True)}'
+        if identity:
+            url = f'{url}#{hashlib.sha256(identity.encode()).hexdigest()[:16]}'
+        return url
+
+    def _get_path(self, key):
+        """Return the file a key is stored in within the directory"""
+        return self.directory / hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_ttl(self, url):
+        """Return the TTL of a URL, or None if it should not be cached"""
+        url = urlparse(url)
+        location = f'{url.hostname}{url.path}'
+        for pattern, ttl in self.ttls.items():
+            if fnmatch.fnmatchcase(location, pattern):
+                return ttl
+
+    def _read(self, key):
+        """Load an entry from the directory"""
+        if self.directory:
+            path = self._get_path(key)
+            try:
+                meta = json.loads(path.with_suffix('.json').read_text())
+                content = path.with_suffix('.body').read_bytes()
+            except (OSError, ValueError):
+                return None
+            if meta.get('key') == key:
+                return CacheEntry(meta['url'], meta['headers'], content, meta['stored_at'])
+
+    def _remember(self, key, entry):
+        """Put an entry at the front of the in-memory LRU, dropping the oldest if it is full"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _write(self, key, entry, content=True):
+        """Save an entry to the directory"""
+        if self.directory:
+            path = self._get_path(key)
+            meta = {'key': key, 'url': entry.url, 'headers': entry.headers, 'stored_at': entry.stored_at}
+            files = [(path.with_suffix('.json'), json.dumps(meta).encode())]
+            if content:
+                files.insert(0, (path.with_suffix('.body'), entry.content))
+            for file, data in files:
+                tmp = file.with_suffix(f'{file.suffix}.{os.getpid()}.{threading.get_ident()}')
+                try:
+                    tmp.write_bytes(data)
+                    os.replace(tmp, file)
+                except OSError:
+                    tmp.unlink(missing_ok=True)
+
+    def clear(self):
+        """Forget every cached response, both in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            for file in self.directory.iterdir():
+                file.unlink(missing_ok=True)
+
+    def invalidate(self, url):
+        """Make every cached response from the same endpoint as a URL be checked again
+
+        Arguments:
+        url -- URL that was just changed with a POST, PUT, etc.
+        """
+        self._invalidated[self._get_endpoint(url)] = time.time()
+
+    def lookup(self, url, query=None, identity=None):
+        """Return the key, cached entry, and whether the entry is still fresh for a GET request
+
+        The key is None when the URL does not have a TTL and should not be cached.
+
+        Arguments:
+        url -- URL about to be requested
+        query -- Query parameters of the request
+        identity -- Who the request is sent as (its Authorization header, etc.)
+                    Responses are only returned to requests sent as the same identity
+        """
+        ttl = self._get_ttl(url)
+        if ttl is None:
+            return None, None, False
+        key = self._get_key(url, query, identity)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._read(key)
+            if entry:
+                self._remember(key, entry)
+        if entry is None:
+            return key, None, False
+        invalidated = self._invalidated.get(self._get_endpoint(url), 0)
+        fresh = entry.stored_at >= invalidated and time.time() - entry.stored_at < ttl
+        return key, entry, fresh
+
+    def update(self, key, entry, res):
+        """Store a response, returning the cached body instead if Synack said it has not changed
+
+        Arguments:
+        key -- Key returned by lookup()
+        entry -- Entry returned by lookup()
+        res -- Response to the request
+        """
+        if res.status_code == 304 and entry:
+            entry.stored_at = time.time()
+            for header, value in res.headers.items():
+                if header.lower() in ['etag', 'last-modified']:
+                    entry.headers = {k: v for k, v in entry.headers.items() if k.lower() != header.lower()}
+                    entry.headers[header] = value
+            self._remember(key, entry)
+            self._write(key, entry, content=False)
+            return entry.build_response()
+        if res.status_code == 200:
+            entry = CacheEntry(res.url or key, dict(res.headers), res.content, time.time())
+            self._remember(key, entry)
+            self._write(key, entry)
+        return res
@@ -0,0 +1,130 @@
+"""cassette.py
+
+Defines the cassettes used to record responses and play them back without a network.
+"""
+
+import atexit
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import pathlib
+import threading
+
+from ._response import build_response
+
+# Response headers that are never written to a cassette
+SKIPPED_HEADERS = ['set-cookie']
+# Request body fields left out of the key, as they change every time (one-time passwords, etc.)
+VOLATILE_FIELDS = ['authy_token']
+
+
+class Cassette:
+    """Responses recorded to a JSON lines file (gzip compressed if it ends in .gz)
+
+    Requests are matched on their method, URL, query and a hash of their body, so
+    request bodies (passwords, etc.) are never written. Response bodies are, tokens included.
+    The VOLATILE_FIELDS of a body are not hashed, so a recorded login can be replayed later.
+    Identical requests are answered in the order they were recorded,
+    with the last answer repeating once the recorded ones run out.
+    """
+    def __init__(self, path, mode='replay', latency=None):
+        self.path = pathlib.Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.file = None
+        self.interactions = collections.defaultdict(collections.deque)
+        self.replayed = dict()
+
+        if mode == 'record':
+            self.file = self._open('wt')
+            atexit.register(self.close)
+        else:
+            with self._open('rt') as fp:
+                for line in fp:
+                    if line.strip():
+                        interaction = json.loads(line)
+                        self.interactions[interaction['key']].append(interaction)
+
+    def _open(self, mode):
+        if self.path.suffix == '.gz':
+            return gzip.open(self.path, mode, encoding='utf-8')
+        return open(self.path, mode, encoding='utf-8')
+
+    @staticmethod
+    def build_response(interaction):
+        """Return a new requests Response from a recorded interaction"""
+        if 'base64' in interaction:
+            content = base64.b64decode(interaction['base64'])
+        else:
+            content = interaction['text'].encode('utf-8')
+        return build_response(interaction['status'], interaction['reason'], interaction['url'],
+                              interaction['headers'], content)
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        atexit.unregister(self.close)
+
+    def get_delay(self, interaction):
+        """Return how long to wait before handing out a replayed response"""
+        if self.latency == 'recorded':
+            return interaction['seconds']
+        return self.latency or 0
+
+    @staticmethod
+    def get_key(method, url, query, data):
+        """Return what a request is matched on"""
+        body = None
+        if type(data) is dict:
+            data = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+        if data is not None:
+            body = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+        params = sorted([str(key), str(value)] for key, value in (query or dict()).items())
+        return json.dumps([method, url, params, body])
+
+    def record(self, method, url, query, data, res, seconds):
+        """Write a response to the cassette
+
+        Arguments:
+        method -- Request method verb
+        url -- Full URL the request was sent to
+        query -- Query string dictionary of the request
+        data -- Body of the request, of which only a hash is written
+        res -- Response received
+        seconds -- Time taken for the response to arrive
+        """
+        content = res.content or b''
+        interaction = {
+            'key': self.get_key(method, url, query, data),
+            'status': res.status_code,
+            'reason': res.reason,
+            'url': res.url,
+            'headers': {k: v for k, v in res.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            'seconds': round(seconds, 4)
+        }
+        try:
+            interaction['text'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            interaction['base64'] = base64.b64encode(content).decode('ascii')
+        line = json.dumps(interaction, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def replay(self, method, url, query, data):
+        """Return the recorded interaction for a request
+
+        Raises LookupError if the request was never recorded.
+        """
+        key = self.get_key(method, url, query, data)
+        with self.lock:
+            if self.interactions.get(key):
+                self.replayed[key] = self.interactions[key].popleft()
+            if key not in self.replayed:
+                raise LookupError(f'{method} {url} was not recorded in {self.path}')
+            return self.replayed[key]
@@ -0,0 +1,57 @@
+"""filelock.py
+
+Defines the lock file that lets Handlers in separate processes take turns.
+"""
+
+import os
+
+
+class FileLock:
+    """Hold an exclusive lock on a file for the length of a with block
+
+    Every process (or Handler) opening the same path waits for the one holding it.
+    The operating system drops the lock if the process holding it dies.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self.path, 'a+')
+        try:
+            self._lock()
+        except BaseException:
+            self._fp.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._unlock()
+        finally:
+            self._fp.close()
+            self._fp = None
+
+    def _lock(self):
+        if os.name == 'nt':
+            import msvcrt
+            self._fp.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._fp.fileno(), msvcrt.LK_LOCK, 1)
+                    return
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds
+                    pass
+        else:
+            import fcntl
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if os.name == 'nt':
+            import msvcrt
+            self._fp.seek(0)
+            msvcrt.locking(self._fp.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._fp.fileno(), fcntl.LOCK_UN)
@@ -8,19 +8,51 @@ from synack.plugins.base import Plugin
 
 
 class Handler:
-    def __init__(self, state=State(), **kwargs):
-        self.state = state
+    def __init__(self, state=None, **kwargs):
+        self.state = State() if state is None else state
 
         for key in kwargs.keys():
             if hasattr(self.state, key):
                 setattr(self.state, key, kwargs.get(key))
 
-        for name, subclass in Plugin.registry.items():
-            instance = subclass(self.state)
-            setattr(self, name.lower(), instance)
+        if self.state.defer_login:
+            self.state.login_pending = bool(self.state.login)
+        else:
+            self.login()
 
-        self.login()
+    def __getattr__(self, name):
+        for plugin in Plugin.registry.keys():
+            if plugin.lower() == name:
+                instance = Plugin._get_plugin(self.state, plugin)
+                setattr(self, name, instance)
+                return instance
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def login(self):
         if self.state.login:
             self.auth.get_api_token()
+
+
+class AsyncHandler(Handler):
+    """Handler whose plugins use coroutines for their busiest API calls
+
+    Plugins with an Async version (api, hydra, missions, targets) are swapped for it.
+    Everything else is the same as with the Handler.
+    """
+    def __getattr__(self, name):
+        for plugin in Plugin.registry.keys():
+            if plugin.lower() == f'async{name}':
+                instance = Plugin._get_plugin(self.state, plugin)
+                setattr(self, name, instance)
+                return instance
+        return super().__getattr__(name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if 'AsyncApi' in self.state.plugins:
+            await self.state.plugins['AsyncApi'].close()
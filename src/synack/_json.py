@@ -0,0 +1,49 @@
+"""json.py
+
+Defines the JSON decoding and compression used for the responses of everything using a State.
+"""
+
+import json
+
+
+def decode(res, loads, **kwargs):
+    """Decode the JSON body of a requests Response with loads
+
+    Bodies loads can not handle (other encodings, etc.) and calls with kwargs
+    are left to requests, so its errors are raised as before.
+    """
+    if not kwargs:
+        try:
+            return loads(res.content)
+        except ValueError:
+            pass
+    return type(res).json(res, **kwargs)
+
+
+def get_accept_encoding():
+    """Return the Accept-Encoding header listing every compression the installed packages can decode"""
+    encodings = ['gzip', 'deflate']
+    try:
+        import brotli  # noqa: F401
+        encodings.append('br')
+    except ImportError:
+        pass
+    return ', '.join(encodings)
+
+
+def get_loads(backend=None):
+    """Return the function decoding JSON for a backend
+
+    Arguments:
+    backend -- orjson, json, or None to use orjson when it is installed
+    """
+    if backend not in [None, 'json', 'orjson']:
+        raise ValueError(f'Unknown JSON backend: {backend}')
+    if backend in [None, 'orjson']:
+        try:
+            import orjson
+            return orjson.loads
+        except ImportError:
+            if backend:
+                raise
+    return json.loads
@@ -0,0 +1,85 @@
+"""limiter.py
+
+Defines the rate limiter shared by everything using a State.
+"""
+
+import threading
+import time
+
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, now, seconds):
+        """Hand out no more tokens for the given number of seconds"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1) - seconds * self.rate
+
+    def reserve(self, now):
+        """Take a token and return how many seconds to wait before it can be used"""
+        self._refill(now)
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0)
+
+
+class RateLimiter:
+    """Token buckets for each host and endpoint class that has a limit
+
+    Limits are given as {key: (rate, burst)}, where rate is requests per second and
+    burst is how many requests may be sent at once after sitting idle.
+    A key is either a host (platform.synack.com) or a host followed by the first part
+    of the API path (platform.synack.com/tasks).
+    """
+    def __init__(self, limits):
+        self._buckets = dict()
+        self._lock = threading.Lock()
+        for key, limit in (limits or dict()).items():
+            if limit:
+                self._buckets[key] = TokenBucket(*limit)
+
+    @staticmethod
+    def _get_keys(url):
+        """Return the host and endpoint class keys of a URL"""
+        url = urlparse(url)
+        parts = [p for p in url.path.split('/') if p and p != 'api' and not (p[0] == 'v' and p[1:].isdigit())]
+        keys = [url.hostname]
+        if parts:
+            keys.append(f'{url.hostname}/{parts[0]}')
+        return keys
+
+    def pause(self, url, seconds):
+        """Stop every request to the host of a URL for the given number of seconds
+
+        Arguments:
+        url -- URL that was throttled
+        seconds -- How long requests to the host should wait
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in self._get_keys(url):
+                if key in self._buckets:
+                    self._buckets[key].pause(now, seconds)
+
+    def reserve(self, url):
+        """Reserve a request to a URL and return how many seconds to wait before sending it
+
+        Arguments:
+        url -- URL about to be requested
+        """
+        now = time.monotonic()
+        wait = 0
+        with self._lock:
+            for key in self._get_keys(url):
+                if key in self._buckets:
+                    wait = max(wait, self._buckets[key].reserve(now))
+        return wait
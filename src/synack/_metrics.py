@@ -0,0 +1,176 @@
+"""metrics.py
+
+Defines the request metrics shared by everything using a State.
+"""
+
+import bisect
+import collections
+import re
+import threading
+
+from urllib.parse import urlparse
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# Number of recent latencies of each endpoint kept to work out percentiles
+SAMPLES = 1000
+# Path segments holding a digit (other than API versions) are IDs rather than part of the endpoint
+ID_SEGMENT = re.compile(r'^(?!v\d+$)[^/]*\d[^/]*$')
+# Segments followed by the ID (or slug) of one of their items, which may not hold a digit
+ID_PARENTS = ['attachments', 'campaigns', 'listings', 'organizations', 'profiles', 'targets', 'tasks', 'users']
+# Segments following one of the ID_PARENTS that are part of the endpoint rather than IDs
+NAMED_SEGMENTS = ['me', 'notifications_token', 'registered_summary', 'researcher']
+VERSION_SEGMENT = re.compile(r'^v\d+$')
+
+
+def get_endpoint(url):
+    """Return the host and path of a URL with its IDs collapsed to ...
+
+    https://platform.synack.com/api/tasks/v1/organizations/4rtgd8/listings/wrgqez/campaigns/...
+    becomes platform.synack.com/api/tasks/v1/organizations/.../listings/.../campaigns/...
+    IDs are segments holding a digit, or any segment after one of the ID_PARENTS,
+    so slugs without a digit do not each become an endpoint of their own.
+    """
+    parsed = urlparse(url)
+    segments = list()
+    previous = None
+    for segment in parsed.path.split('/'):
+        if ID_SEGMENT.match(segment):
+            segments.append('...')
+        elif previous in ID_PARENTS and segment and segment not in NAMED_SEGMENTS \
+                and not VERSION_SEGMENT.match(segment):
+            segments.append('...')
+        else:
+            segments.append(segment)
+        previous = segment
+    return parsed.netloc + '/'.join(segments)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.bytes = 0
+        self.count = 0
+        self.latencies = collections.deque(maxlen=SAMPLES)
+        self.seconds = 0.0
+        self.statuses = collections.Counter()
+
+    def get_percentile(self, percent):
+        """Return the latency that percent of the recent requests were faster than or equal to"""
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        index = max(0, -(-len(latencies) * percent // 100) - 1)
+        return latencies[int(index)]
+
+    def record(self, status, seconds, size):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.bytes += size
+        self.count += 1
+        self.latencies.append(seconds)
+        self.seconds += seconds
+        self.statuses[status] += 1
+
+    def snapshot(self):
+        return {
+            'bytes': self.bytes,
+            'count': self.count,
+            'latency': {
+                'mean': self.seconds / self.count if self.count else None,
+                'p50': self.get_percentile(50),
+                'p95': self.get_percentile(95),
+                'p99': self.get_percentile(99)
+            },
+            'statuses': dict(self.statuses)
+        }
+
+
+class RequestMetrics:
+    """Count, status codes, bytes received and latency of the requests sent to each endpoint
+
+    Endpoints are the method along with the host and path of the URL, with IDs collapsed
+    (POST platform.synack.com/api/tasks/v1/organizations/.../transitions).
+    """
+    def __init__(self):
+        self.endpoints = dict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _escape(value):
+        """Escape a Prometheus label value"""
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def clear(self):
+        with self.lock:
+            self.endpoints = dict()
+
+    def record(self, method, url, status, seconds, size):
+        """Record one response
+
+        Arguments:
+        method -- Request method verb
+        url -- Full URL the request was sent to
+        status -- Status code of the response
+        seconds -- Time taken for the response to arrive
+        size -- Number of bytes in the response body
+        """
+        key = (method, get_endpoint(url))
+        with self.lock:
+            if key not in self.endpoints:
+                self.endpoints[key] = EndpointMetrics()
+            self.endpoints[key].record(status, seconds, size)
+
+    def snapshot(self):
+        """Return the metrics of each endpoint as {'METHOD endpoint': {...}}"""
+        with self.lock:
+            return {f'{method} {endpoint}': metrics.snapshot()
+                    for (method, endpoint), metrics in sorted(self.endpoints.items())}
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        requests = ['# HELP synack_requests_total Requests sent to Synack',
+                    '# TYPE synack_requests_total counter']
+        received = ['# HELP synack_response_bytes_total Bytes received in response bodies',
+                    '# TYPE synack_response_bytes_total counter']
+        durations = ['# HELP synack_request_duration_seconds Time taken for responses to arrive',
+                     '# TYPE synack_request_duration_seconds histogram']
+        with self.lock:
+            for (method, endpoint), metrics in sorted(self.endpoints.items()):
+                labels = f'method="{self._escape(method)}",endpoint="{self._escape(endpoint)}"'
+                for status, count in sorted(metrics.statuses.items()):
+                    requests.append(f'synack_requests_total{{{labels},status="{status}"}} {count}')
+                received.append(f'synack_response_bytes_total{{{labels}}} {metrics.bytes}')
+                total = 0
+                for bound, count in zip(BUCKETS + ['+Inf'], metrics.buckets):
+                    total += count
+                    durations.append(f'synack_request_duration_seconds_bucket{{{labels},le="{bound}"}} {total}')
+                durations.append(f'synack_request_duration_seconds_sum{{{labels}}} {metrics.seconds}')
+                durations.append(f'synack_request_duration_seconds_count{{{labels}}} {metrics.count}')
+        return '\n'.join(requests + received + durations) + '\n'
+
+
+def serve_prometheus(metrics, host, port):
+    """Start a server answering every GET with the metrics in the Prometheus text format
+
+    Arguments:
+    metrics -- RequestMetrics to serve
+    host -- Address to listen on
+    port -- Port to listen on (0 picks a free one)
+    """
+    import http.server
+
+    class PrometheusHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), PrometheusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,29 @@
+"""response.py
+
+Defines how requests Responses are built for bodies that did not come from requests.
+"""
+
+
+def build_response(status_code, reason, url, headers, content):
+    """Return a new requests Response holding a body that was already read
+
+    Used for cached and recorded responses, and for responses received with aiohttp.
+
+    Arguments:
+    status_code -- HTTP status code
+    reason -- HTTP reason phrase (OK, Not Found, etc.)
+    url -- URL the response came from
+    headers -- Response headers
+    content -- Body of the response as bytes
+    """
+    import requests
+
+    res = requests.models.Response()
+    res.status_code = status_code
+    res.reason = reason
+    res.url = url
+    res.headers = requests.structures.CaseInsensitiveDict(headers)
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+    res._content = content
+    res._content_consumed = True
+    return res
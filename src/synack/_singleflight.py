@@ -0,0 +1,84 @@
+"""singleflight.py
+
+Defines the single-flight group that lets identical requests share one network call.
+"""
+
+import copy
+import threading
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+        self.result = None
+
+
+class SingleFlight:
+    """Run a function once for every caller asking for the same key at the same time
+
+    The first caller for a key does the work, and everyone who asks for it before
+    that finishes waits for and receives a copy of the same result (or exception).
+    """
+    def __init__(self):
+        self._flights = dict()
+        self._futures = dict()
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Call fn, or wait for the call already in flight for key
+
+        Arguments:
+        key -- Hashable identity of the call
+        fn -- Function to call if nobody else is already calling it
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            else:
+                self.shared += 1
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result
+        flight.done.wait()
+        if flight.error:
+            raise flight.error
+        return copy.copy(flight.result)
+
+    async def do_async(self, key, fn):
+        """Await fn(), or wait for the call already in flight for key within this event loop
+
+        Arguments:
+        key -- Hashable identity of the call
+        fn -- Function returning the awaitable to run if nobody else is already running it
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        future = self._futures.get(key)
+        if future is not None:
+            self.shared += 1
+            return copy.copy(await asyncio.shield(future))
+        future = self._futures[key] = loop.create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._futures[key]
@@ -0,0 +1,340 @@
+"""standin.py
+
+Defines a local stand-in for the Synack endpoints used by this package, for benchmarks and load tests.
+"""
+
+import base64
+import gzip
+import json
+import random
+import re
+import string
+import threading
+import time
+
+from urllib.parse import parse_qs, urlparse
+
+# Categories every researcher using the stand-in has passed
+CATEGORIES = {1: 'Host', 2: 'Web Application'}
+# Smallest JSON body that is gzip compressed for clients accepting it
+GZIP_MIN_SIZE = 1024
+# Number of results on each page of hydra_search/search
+HYDRA_PAGE_SIZE = 10
+TRANSITIONS = re.compile(r'^/api/tasks/v1/organizations/[^/]+/listings/[^/]+/campaigns/[^/]+'
+                         r'/tasks/([^/]+)/transitions$')
+SIGNUP = re.compile(r'^/api/targets/([^/]+)/signup$')
+RESOURCES = re.compile(r'^/api/targets/([^/]+)/resources$')
+EVIDENCES = re.compile(r'^/api/tasks/v2/tasks/([^/]+)/evidences$')
+
+
+class StandIn:
+    """Fake Synack data served over HTTP from a background thread
+
+    Requests are told apart by their Host header, so a Handler reaches every Synack host
+    through one server by setting state.base_url to StandIn.base_url.
+    Everything is generated from the seed, so runs with the same arguments see the same data.
+    Any email, password and OTP are accepted at login.
+    """
+    def __init__(self, missions=100, targets=10, assets=100, hydra=50, latency=0,
+                 error_rate=0, error_status=503, seed=0, token_lifetime=3600):
+        """
+        Arguments:
+        missions -- Number of PUBLISHED missions, spread across the targets
+        targets -- Number of targets, alternating between registered and not,
+                   and between Host and Web Application in pairs
+        assets -- Number of assets of each target
+        hydra -- Number of Hydra results of each target
+        latency -- Seconds waited before every response
+        error_rate -- Fraction (0-1) of requests answered with error_status instead
+        error_status -- Status code of the injected errors (sent with Retry-After: 0)
+        seed -- Seed of the random data and errors
+        token_lifetime -- Seconds each API token is accepted for after it is handed out
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.server = None
+        self.token_lifetime = token_lifetime
+        self.tokens = dict()
+        self.user_id = self._build_id(10)
+        self.token = self._build_token()
+        self.connected = ''
+        self.claim_limit = 500
+
+        self.targets = [self._build_target(i) for i in range(targets)]
+        self.assets = {t['slug']: [self._build_asset(t, i) for i in range(assets)] for t in self.targets}
+        self.hydra = {t['slug']: [self._build_hydra(t, i) for i in range(hydra)] for t in self.targets}
+        self.missions = [self._build_mission(self.targets[i % targets]) for i in range(missions)] if targets else []
+
+    def _build_asset(self, target, index):
+        if target['category']['id'] == 1:
+            location = f'10.{target["index"]}.{index // 256}.{index % 256}/32'
+            rules = []
+        else:
+            location = f'https://a{index}.{target["slug"]}.example.com'
+            rules = [{'rule': f'*.a{index}.{target["slug"]}.example.com'}]
+        return {
+            'active': True,
+            'assetType': 'host' if target['category']['id'] == 1 else 'webapp',
+            'listings': [{'listingUid': target['slug'], 'scope': 'in'}],
+            'location': location,
+            'scopeRules': rules
+        }
+
+    def _build_hydra(self, target, index):
+        return {
+            'ip': f'10.{target["index"]}.{index // 256}.{index % 256}',
+            'last_changed_dt': '2022-01-10T01:25:45Z',
+            'listing_uid': target['slug'],
+            'ports': {
+                str(self.random.choice([22, 80, 443, 8080])): {
+                    'tcp': {
+                        'hydra': {
+                            'open': {'parsed': True},
+                            'product': {'parsed': 'nginx'},
+                            'verified_service': {'parsed': 'http'}
+                        }
+                    }
+                }
+            }
+        }
+
+    def _build_id(self, length=8):
+        return ''.join(self.random.choices(string.ascii_lowercase + string.digits, k=length))
+
+    def _build_mission(self, target):
+        return {
+            'campaignUid': self._build_id(36),
+            'claimedOn': None,
+            'id': self._build_id(36),
+            'listingCodename': target['codename'],
+            'listingUid': target['slug'],
+            'maxCompletionTimeInSecs': 86400,
+            'modifiedOn': '2022-01-10T01:25:44.975Z',
+            'organizationUid': target['organization']['slug'],
+            'payout': {'amount': self.random.choice([10, 25, 50, 100, 250]), 'currency': 'USD'},
+            'status': 'PUBLISHED',
+            'title': f'Mission {self._build_id()}'
+        }
+
+    def _build_target(self, index):
+        slug = self._build_id()
+        return {
+            'category': {'id': index // 2 % 2 + 1, 'name': CATEGORIES[index // 2 % 2 + 1]},
+            'codename': f'TARGET{index}',
+            'dateUpdated': 1641777944,
+            'id': slug,
+            'index': index,
+            'isActive': True,
+            'isNew': False,
+            'isRegistered': index % 2 == 0,
+            'isUpdated': False,
+            'lastSubmitted': 0,
+            'organization': {'slug': self._build_id()},
+            'slug': slug
+        }
+
+    def _build_token(self):
+        """Hand out a new API token, shaped like a JWT holding its expiry"""
+        expiry = int(time.time() + self.token_lifetime)
+        parts = [{'alg': 'HS256', 'typ': 'JWT'}, {'exp': expiry, 'sub': self.user_id}]
+        parts = [base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip('=') for part in parts]
+        token = '.'.join(parts + [self._build_id(43)])
+        self.tokens[token] = expiry
+        self.token = token
+        return token
+
+    @staticmethod
+    def _get_page(items, query, per_page_param='perPage', per_page=None):
+        """Return the slice of items asked for by the page and per_page_param query parameters"""
+        page = max(int(query.get('page', ['1'])[0]), 1)
+        per_page = int(query.get(per_page_param, [per_page or len(items) or 1])[0])
+        return items[(page - 1) * per_page:page * per_page]
+
+    def _get_targets(self, registered):
+        return [{k: v for k, v in t.items() if k != 'index'} for t in self.targets if t['isRegistered'] == registered]
+
+    def _route(self, method, host, path, headers, body):
+        url = urlparse(path)
+        path = url.path
+        query = parse_qs(url.query, keep_blank_values=True)
+        try:
+            data = json.loads(body) if body else dict()
+        except ValueError:
+            data = dict()
+        if type(data) is not dict:
+            data = dict()
+
+        if host == 'login.synack.com':
+            if method == 'GET' and path in ['', '/']:
+                html = f'<html><head><meta name="csrf-token" content="{self._build_id(16)}"></head></html>'
+                return 200, {'Content-Type': 'text/html'}, html
+            if method == 'POST' and path == '/api/authenticate':
+                if data.get('authy_token') and data.get('progress_token'):
+                    return 200, {}, {'grant_token': self._build_id(32)}
+                if data.get('email') and data.get('password'):
+                    return 200, {}, {'progress_token': self._build_id(32)}
+                return 400, {}, {'message': 'Invalid credentials'}
+            return 404, {}, None
+
+        if method == 'GET' and path == '/token':
+            return 200, {}, {'access_token': self._build_token()}
+        token = (headers.get('Authorization') or '').replace('Bearer ', '', 1)
+        if self.tokens.get(token, 0) <= time.time():
+            return 401, {}, {'message': 'Unauthorized'}
+
+        if path == '/api/tasks/v2/tasks' and method == 'GET':
+            missions = [m for m in self.missions if m['status'] == query.get('status', ['PUBLISHED'])[0]]
+            listings = query.get('listingUids')
+            if listings:
+                missions = [m for m in missions if m['listingUid'] in listings]
+            return 200, {'x-count': str(len(missions))}, self._get_page(missions, query, per_page=20)
+        if path == '/api/tasks/v1/tasks' and method == 'HEAD':
+            count = len([m for m in self.missions if m['status'] == query.get('status', ['PUBLISHED'])[0]])
+            return 204, {'x-count': str(count)}, None
+        if TRANSITIONS.match(path) and method == 'POST':
+            task = TRANSITIONS.match(path).group(1)
+            mission = next((m for m in self.missions if m['id'] == task), None)
+            if mission is None:
+                return 404, {}, None
+            before, after = ('PUBLISHED', 'CLAIMED') if data.get('type') == 'CLAIM' else ('CLAIMED', 'PUBLISHED')
+            if mission['status'] != before:
+                return 412, {}, {'message': 'Mission is no longer available'}
+            mission['status'] = after
+            mission['claimedOn'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()) if after == 'CLAIMED' else None
+            return 201, {}, mission
+        if path == '/api/tasks/v2/researcher/claimed_amount' and method == 'GET':
+            amount = sum(m['payout']['amount'] for m in self.missions if m['status'] == 'CLAIMED')
+            return 200, {}, {'claimedAmount': amount}
+        if EVIDENCES.match(path):
+            return 200, {}, {'introduction': '', 'testing_methodology': '', 'conclusion': ''}
+        if path == '/api/asset/v2/assets' and method == 'GET':
+            assets = [a for slug in query.get('listingUid[]', []) for a in self.assets.get(slug, [])]
+            return 200, {}, self._get_page(assets, query)
+        if path == '/api/hydra_search/search' and method == 'GET':
+            results = self.hydra.get(query.get('listing_uids', [''])[0], [])
+            return 200, {}, self._get_page(results, query, per_page=HYDRA_PAGE_SIZE)
+        if path == '/api/targets' and method == 'GET':
+            primary = query.get('filter[primary]', ['registered'])[0]
+            return 200, {}, self._get_targets(primary == 'registered') if primary != 'upcoming' else []
+        if path == '/api/targets/registered_summary' and method == 'GET':
+            return 200, {}, self._get_targets(True)
+        if SIGNUP.match(path) and method == 'POST':
+            slug = SIGNUP.match(path).group(1)
+            for target in self.targets:
+                if target['slug'] == slug:
+                    target['isRegistered'] = True
+                    return 200, {}, {}
+            return 404, {}, None
+        if RESOURCES.match(path) and method == 'GET':
+            return 200, {}, []
+        if path == '/api/launchpoint':
+            if method == 'PUT':
+                self.connected = query.get('listing_id', [''])[0]
+            return 200, {}, {'slug': self.connected}
+        if path == '/api/assessments' and method == 'GET':
+            return 200, {}, [{
+                'category_id': category_id,
+                'category_name': name,
+                'practical_assessment': {'passed': True},
+                'written_assessment': {'passed': True}
+            } for category_id, name in CATEGORIES.items()]
+        if path.startswith('/api/profiles/') and method == 'GET':
+            return 200, {}, {'user_id': self.user_id, 'claim_limit': self.claim_limit}
+        if path == '/api/transactions' and method == 'HEAD':
+            return 200, {'x-balance': json.dumps({'total_balance': '0.0', 'pending_payout': '0.0'})}, None
+        if path == '/api/users/notifications_token' and method == 'GET':
+            return 200, {}, {'token': self._build_id(32)}
+        return 404, {}, None
+
+    @property
+    def base_url(self):
+        """URL to use as state.base_url while the server is running"""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def handle(self, method, host, path, headers, body):
+        """Return the status, headers and body of the response to a request
+
+        Arguments:
+        method -- Request method verb
+        host -- Host header of the request
+        path -- Path and query string of the request
+        headers -- Headers of the request
+        body -- Body of the request
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.error_status, {'Retry-After': '0'}, b''
+            status, extra, content = self._route(method, host.split(':')[0], path, headers, body)
+        if content is None:
+            return status, extra, b''
+        if type(content) is str:
+            return status, extra, content.encode()
+        content = json.dumps(content).encode()
+        extra = {'Content-Type': 'application/json', **extra}
+        if len(content) >= GZIP_MIN_SIZE and 'gzip' in (headers.get('Accept-Encoding') or ''):
+            content = gzip.compress(content)
+            extra['Content-Encoding'] = 'gzip'
+        return status, extra, content
+
+    def publish(self, missions=1):
+        """Publish new missions, spread across the targets, as a drop would, and return them
+
+        Arguments:
+        missions -- Number of missions to publish
+        """
+        with self.lock:
+            new = [self._build_mission(self.targets[(len(self.missions) + i) % len(self.targets)])
+                   for i in range(missions)]
+            self.missions.extend(new)
+        return new
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve the stand-in from a background thread and return the server
+
+        Arguments:
+        host -- Address to listen on
+        port -- Port to listen on (0 picks a free one)
+        """
+        import http.server
+
+        standin = self
+
+        class StandInHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # The headers and body are written separately, which Nagle would hold up on kept-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, headers, content = standin.handle(self.command, self.headers.get('Host', ''),
+                                                          self.path, self.headers, body)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(content)
+
+            do_HEAD = do_PATCH = do_POST = do_PUT = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), StandInHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def stop(self):
+        """Stop serving and close the listening socket"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
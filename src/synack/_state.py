@@ -4,26 +4,82 @@ Defines the handler class and generally sets up the project.
 """
 
 import pathlib
-import requests
+import threading
 
 from typing import Union
 
+from ._limiter import RateLimiter
+from ._metrics import RequestMetrics
+
+# Hosts that are each given their own connection pool
+# http:// and https:// catch everything else (Slack, proxies, etc.)
+POOL_HOSTS = [
+    'https://login.synack.com',
+    'https://notifications.synack.com',
+    'https://platform.synack.com',
+    'https://',
+    'http://'
+]
+
+# Seconds that GET responses from each endpoint are used before checking them again
+CACHE_TTLS = {
+    'platform.synack.com/api/assessments': 3600,
+    'platform.synack.com/api/asset/v2/assets': 300,
+    'platform.synack.com/api/targets/*/resources': 3600,
+    'platform.synack.com/api/targets/registered_summary': 60
+}
+
+# Requests per second, and how many can be sent at once, for each host or endpoint class
+RATE_LIMITS = {
+    'login.synack.com': (2, 5),
+    'notifications.synack.com': (5, 10),
+    'platform.synack.com': (10, 20),
+    'platform.synack.com/hydra_search': (5, 5)
+}
+
 
 class State(object):
     def __init__(self):
+        self._base_url = None
+        self._cache_size = 32
+        self._cassette = None
+        self._cassette_file = None
+        self._cassette_latency = None
+        self._cassette_mode = 'replay'
+        self._cache_ttls = CACHE_TTLS
         self._config_dir = None
         self._debug = None
+        self._debug_file = None
+        self._debug_max_length = 2000
+        self._defer_login = None
         self._email = None
         self._http_proxy = None
         self._https_proxy = None
+        self._json_backend = None
+        self._json_loads = None
+        self._keep_alive = True
         self._login = None
+        self._login_pending = False
+        self._max_retries = 3
         self._notifications_token = None
         self._otp_secret = None
+        self._page_workers = 4
         self._password = None
+        self._plugins = dict()
+        self._plugins_lock = threading.RLock()
+        self._pool_block = False
+        self._pool_connections = 10
+        self._pool_maxsize = 10
         self._proxies = None
+        self._rate_limiter = RateLimiter(RATE_LIMITS)
+        self._rate_limits = RATE_LIMITS
+        self._request_metrics = RequestMetrics()
+        self._response_cache = None
+        self._retry_backoff = 0.5
         self._session = None
         self._template_dir = None
         self._scratchspace_dir = None
+        self._use_disk_cache = None
         self._use_proxies = None
         self._use_scratchspace = None
         self._user_id = None
@@ -41,6 +97,92 @@ class State(object):
         if type(value) == str:
             value = pathlib.Path(value).expanduser().resolve()
         self._config_dir = value
+        self._response_cache = None
+
+    def _reset_cassette(self):
+        if self._cassette is not None:
+            self._cassette.close()
+        self._cassette = None
+
+    @property
+    def cassette(self):
+        if self._cassette is None and self.cassette_file is not None:
+            from ._cassette import Cassette
+            self._cassette = Cassette(self.cassette_file, self.cassette_mode, self.cassette_latency)
+        return self._cassette
+
+    @property
+    def cassette_file(self) -> pathlib.PosixPath:
+        return self._cassette_file
+
+    @cassette_file.setter
+    def cassette_file(self, value: Union[str, pathlib.PosixPath]) -> None:
+        if value is not None:
+            value = pathlib.Path(value).expanduser().resolve()
+        self._cassette_file = value
+        self._reset_cassette()
+
+    @property
+    def cassette_latency(self) -> Union[float, str]:
+        return self._cassette_latency
+
+    @cassette_latency.setter
+    def cassette_latency(self, value: Union[float, str]) -> None:
+        self._cassette_latency = value
+        if self._cassette is not None:
+            self._cassette.latency = value
+
+    @property
+    def cassette_mode(self) -> str:
+        return self._cassette_mode
+
+    @cassette_mode.setter
+    def cassette_mode(self, value: str) -> None:
+        self._cassette_mode = value
+        self._reset_cassette()
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    @base_url.setter
+    def base_url(self, value: str) -> None:
+        self._base_url = value
+
+    @property
+    def cache_size(self) -> int:
+        return self._cache_size
+
+    @cache_size.setter
+    def cache_size(self, value: int) -> None:
+        self._cache_size = value
+        self._response_cache = None
+
+    @property
+    def cache_ttls(self) -> dict:
+        return self._cache_ttls
+
+    @cache_ttls.setter
+    def cache_ttls(self, value: dict) -> None:
+        self._cache_ttls = value
+        self._response_cache = None
+
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            from ._cache import ResponseCache
+            directory = self.config_dir / 'cache' if self.use_disk_cache else None
+            self._response_cache = ResponseCache(self.cache_ttls, self.cache_size, directory)
+        return self._response_cache
+
+    @property
+    def use_disk_cache(self) -> bool:
+        return self._use_disk_cache
+
+    @use_disk_cache.setter
+    def use_disk_cache(self, value: bool) -> None:
+        self._use_disk_cache = value
+        self._response_cache = None
 
     @property
     def template_dir(self) -> pathlib.PosixPath:
@@ -76,12 +218,132 @@ class State(object):
     def debug(self, value: bool) -> None:
         self._debug = value
 
+    @property
+    def debug_file(self) -> pathlib.PosixPath:
+        return self._debug_file
+
+    @debug_file.setter
+    def debug_file(self, value: Union[str, pathlib.PosixPath]) -> None:
+        if value is not None:
+            value = pathlib.Path(value).expanduser().resolve()
+        self._debug_file = value
+
+    @property
+    def debug_max_length(self) -> int:
+        return self._debug_max_length
+
+    @debug_max_length.setter
+    def debug_max_length(self, value: int) -> None:
+        self._debug_max_length = value
+
+    @property
+    def plugins(self) -> dict:
+        return self._plugins
+
+    @property
+    def plugins_lock(self) -> threading.RLock:
+        return self._plugins_lock
+
     @property
     def session(self):
         if not self._session:
+            import requests
+            from ._json import get_accept_encoding
             self._session = requests.Session()
+            self._session.headers['Accept-Encoding'] = get_accept_encoding()
+            self._mount_adapters()
+            self._set_keep_alive()
         return self._session
 
+    def _mount_adapters(self):
+        """Give each Synack host its own connection pool built from the pool settings"""
+        from ._adapter import PoolAdapter
+
+        for host in POOL_HOSTS:
+            if host in self._session.adapters:
+                self._session.adapters[host].close()
+            self._session.mount(host, PoolAdapter(pool_connections=self.pool_connections,
+                                                  pool_maxsize=self.pool_maxsize,
+                                                  pool_block=self.pool_block))
+
+    def _set_keep_alive(self):
+        """Ask servers to close each connection after one request if keep_alive is off"""
+        if self.keep_alive:
+            self._session.headers.pop('Connection', None)
+        else:
+            self._session.headers['Connection'] = 'close'
+
+    @property
+    def connection_stats(self) -> dict:
+        """Count the requests sent to each host and how many of them needed a new connection"""
+        stats = dict()
+        if self._session:
+            for adapter in self._session.adapters.values():
+                for manager in [adapter.poolmanager, *adapter.proxy_manager.values()]:
+                    for key in manager.pools.keys():
+                        pool = manager.pools[key]
+                        host = stats.setdefault(pool.host, {'new': 0, 'requests': 0, 'reused': 0})
+                        host['new'] += pool.num_sockets
+                        host['requests'] += pool.num_requests
+                        host['reused'] += max(pool.num_requests - pool.num_sockets, 0)
+        return stats
+
+    @property
+    def json_backend(self) -> str:
+        return self._json_backend
+
+    @json_backend.setter
+    def json_backend(self, value: str) -> None:
+        self._json_backend = value
+        self._json_loads = None
+
+    @property
+    def json_loads(self):
+        if self._json_loads is None:
+            from ._json import get_loads
+            self._json_loads = get_loads(self.json_backend)
+        return self._json_loads
+
+    @property
+    def keep_alive(self) -> bool:
+        return self._keep_alive
+
+    @keep_alive.setter
+    def keep_alive(self, value: bool) -> None:
+        self._keep_alive = value
+        if self._session:
+            self._set_keep_alive()
+
+    @property
+    def pool_block(self) -> bool:
+        return self._pool_block
+
+    @pool_block.setter
+    def pool_block(self, value: bool) -> None:
+        self._pool_block = value
+        if self._session:
+            self._mount_adapters()
+
+    @property
+    def pool_connections(self) -> int:
+        return self._pool_connections
+
+    @pool_connections.setter
+    def pool_connections(self, value: int) -> None:
+        self._pool_connections = value
+        if self._session:
+            self._mount_adapters()
+
+    @property
+    def pool_maxsize(self) -> int:
+        return self._pool_maxsize
+
+    @pool_maxsize.setter
+    def pool_maxsize(self, value: int) -> None:
+        self._pool_maxsize = value
+        if self._session:
+            self._mount_adapters()
+
     @property
     def login(self) -> bool:
         return self._login
@@ -90,6 +352,63 @@ class State(object):
     def login(self, value: bool) -> None:
         self._login = value
 
+    @property
+    def defer_login(self) -> bool:
+        return self._defer_login
+
+    @defer_login.setter
+    def defer_login(self, value: bool) -> None:
+        self._defer_login = value
+
+    @property
+    def login_pending(self) -> bool:
+        return self._login_pending
+
+    @login_pending.setter
+    def login_pending(self, value: bool) -> None:
+        self._login_pending = value
+
+    @property
+    def max_retries(self) -> int:
+        return self._max_retries
+
+    @max_retries.setter
+    def max_retries(self, value: int) -> None:
+        self._max_retries = value
+
+    @property
+    def page_workers(self) -> int:
+        return self._page_workers
+
+    @page_workers.setter
+    def page_workers(self, value: int) -> None:
+        self._page_workers = value
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    @property
+    def rate_limits(self) -> dict:
+        return self._rate_limits
+
+    @rate_limits.setter
+    def rate_limits(self, value: dict) -> None:
+        self._rate_limits = value
+        self._rate_limiter = RateLimiter(value)
+
+    @property
+    def request_metrics(self) -> RequestMetrics:
+        return self._request_metrics
+
+    @property
+    def retry_backoff(self) -> float:
+        return self._retry_backoff
+
+    @retry_backoff.setter
+    def retry_backoff(self, value: float) -> None:
+        self._retry_backoff = value
+
     @property
     def use_proxies(self) -> bool:
         return self._use_proxies
@@ -0,0 +1,152 @@
+"""watcher.py
+
+Defines the watcher that polls for new missions and hands them to callbacks.
+"""
+
+import math
+import threading
+import time
+
+# Missions requested per page when the listing is fetched
+PER_PAGE = 20
+
+
+class MissionWatcher:
+    """Poll the number of missions, and fetch and deliver the new ones when it changes
+
+    The count comes from a HEAD request, so the listing is only downloaded when
+    there may be something new in it. A count that goes down is fetched too, since
+    missions claimed by others can hide a new one dropping in the same interval.
+    Right after a drop the watcher polls every min_interval seconds, and every
+    quiet poll doubles that, up to interval during busy hours and max_interval outside them.
+    Busy hours are the hours of the day (local time) given, or else every hour that
+    has seen a drop before (and every hour until the first drop is seen).
+    Missions already listed when the watcher starts are delivered by its first poll.
+    """
+    def __init__(self, missions, callbacks=None, status='PUBLISHED', listing_uids=None,
+                 interval=30, min_interval=5, max_interval=120, busy_hours=None, prepare_claims=False):
+        """
+        Arguments:
+        missions -- Missions Plugin used to count, fetch and claim missions
+        callbacks -- Functions called with each list of new missions
+        status -- Status of the missions to watch
+        listing_uids -- Only watch the missions of this target
+        interval -- Longest wait between polls during busy hours
+        min_interval -- Wait between polls right after a drop
+        max_interval -- Longest wait between polls outside busy hours
+        busy_hours -- Hours of the day (0-23, local time) missions usually drop in
+        prepare_claims -- Prepare a claim for each new mission before the callbacks are called
+        """
+        self.missions = missions
+        self.callbacks = list(callbacks or [])
+        self.status = status
+        self.listing_uids = listing_uids
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.busy_hours = busy_hours
+        self.prepare_claims = prepare_claims
+
+        self.count = 0
+        self.drops = [0] * 24
+        self.errors = 0
+        self.fetches = 0
+        self.polls = 0
+        self.quiet_polls = None
+        self.seen = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _deliver(self, missions):
+        """Call every callback with new missions, without letting one that fails stop the others"""
+        for callback in self.callbacks:
+            try:
+                callback(missions)
+            except Exception as e:
+                self.errors += 1
+                self.missions.debug.log("Mission Watcher", "Callback %s failed: %s", callback, repr(e))
+
+    def _fetch(self, count):
+        """Return the missions currently listed, or None if they could not be fetched"""
+        self.fetches += 1
+        return self.missions.get(status=self.status, max_pages=math.ceil(count / PER_PAGE),
+                                 per_page=PER_PAGE, listing_uids=self.listing_uids)
+
+    def add_callback(self, callback):
+        """Call callback with each list of new missions from now on"""
+        self.callbacks.append(callback)
+
+    def get_interval(self, now=None):
+        """Return how many seconds to wait before the next poll
+
+        Arguments:
+        now -- Time (seconds since the epoch) to work out busy hours for (Default: now)
+        """
+        hour = time.localtime(now).tm_hour
+        if self.busy_hours is not None:
+            busy = hour in self.busy_hours
+        else:
+            busy = self.drops[hour] > 0 or not any(self.drops)
+        longest = self.interval if busy else self.max_interval
+        if self.quiet_polls is None:
+            return longest
+        return min(self.min_interval * 2 ** self.quiet_polls, longest)
+
+    def poll(self):
+        """Check for new missions once, call the callbacks if there are any, and return them"""
+        self.polls += 1
+        count = self.missions.get_count(status=self.status, listing_uids=self.listing_uids)
+        new = list()
+        if count is not None:
+            if count != self.count and count > 0:
+                missions = self._fetch(count)
+                if missions is not None:
+                    new = [m for m in missions if m['id'] not in self.seen]
+                    self.seen = {m['id'] for m in missions}
+                    self.count = count
+            else:
+                if count == 0:
+                    self.seen.clear()
+                self.count = count
+        if not new:
+            if self.quiet_polls is not None:
+                self.quiet_polls += 1
+            return new
+        if self.polls > 1:
+            self.drops[time.localtime().tm_hour] += 1
+        self.quiet_polls = 0
+        if self.prepare_claims:
+            self.missions.build_claims(new)
+        self._deliver(new)
+        return new
+
+    def run(self):
+        """Poll until stop() is called
+
+        Errors while polling (the network going away, etc.) are counted, and the next poll is waited for as usual.
+        """
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.errors += 1
+                self.missions.debug.log("Mission Watcher", "Poll failed: %s", repr(e))
+            self._stop.wait(self.get_interval())
+
+    def start(self):
+        """Poll from a background thread, and return the watcher"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop polling, and wait for the background thread (if any) to finish
+
+        Arguments:
+        timeout -- Longest time to wait for the thread
+        """
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
@@ -4,5 +4,9 @@ from .models import Target
 from .models import Config
 from .models import Category
 from .models import IP
+from .models import Mission
 from .models import Organization
 from .models import Port
+
+# Newest revision in alembic/versions. Update this whenever a migration is added
+HEAD_REVISION = '7d2e5b1c9a4f'
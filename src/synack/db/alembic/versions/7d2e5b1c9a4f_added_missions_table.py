@@ -0,0 +1,27 @@
+"""Added Missions table
+
+Revision ID: 7d2e5b1c9a4f
+Revises: 349c447c0d37
+Create Date: 2026-10-18 09:41:12.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e5b1c9a4f'
+down_revision = '349c447c0d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('missions',
+                    sa.Column('id', sa.VARCHAR(100), primary_key=True),
+                    sa.Column('payout', sa.REAL, server_default='0'),
+                    sa.Column('status', sa.VARCHAR(50), server_default=''))
+
+
+def downgrade():
+    op.drop_table('missions')
@@ -4,6 +4,7 @@ from .target import Target
 from .config import Config
 from .category import Category
 from .ip import IP
+from .mission import Mission
 from .organization import Organization
 from .port import Port
 from .url import Url
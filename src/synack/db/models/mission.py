@@ -0,0 +1,17 @@
+"""db/models/mission.py
+
+Database Model for the Mission items that have been seen
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.orm import declarative_base
+
+
+Base = declarative_base()
+
+
+class Mission(Base):
+    __tablename__ = 'missions'
+    id = sa.Column(sa.VARCHAR(100), primary_key=True)
+    payout = sa.Column(sa.REAL, default=0.0)
+    status = sa.Column(sa.VARCHAR(50), default="")
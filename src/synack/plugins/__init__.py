@@ -2,10 +2,15 @@
 
 from .alerts import Alerts
 from .api import Api
+from .asyncapi import AsyncApi
+from .asynchydra import AsyncHydra
+from .asyncmissions import AsyncMissions
+from .asynctargets import AsyncTargets
 from .auth import Auth
 from .db import Db
 from .debug import Debug
 from .hydra import Hydra
+from .metrics import Metrics
 from .missions import Missions
 from .notifications import Notifications
 from .scratchspace import Scratchspace
@@ -3,12 +3,9 @@
 Functions to handle sending alerts to various clients
 """
 
-import email
 import datetime
 import json
 import re
-import requests
-import smtplib
 
 from .base import Plugin
 
@@ -16,12 +13,12 @@ from .base import Plugin
 class Alerts(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Db'])
 
     def email(self, subject='Test Alert', message='This is a test'):
+        import email.message
+        import smtplib
+
         message += f'\nTime: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
         msg = email.message.EmailMessage()
         msg.set_content(message)
@@ -59,6 +56,8 @@ class Alerts(Plugin):
         return message
 
     def slack(self, message='This is a test'):
+        import requests
+
         requests.post(self.db.slack_url,
                       data=json.dumps({'text': message}),
                       headers={'Content-Type': 'application/json'})
@@ -3,16 +3,302 @@
 Functions to handle interacting with the Synack APIs
 """
 
+import concurrent.futures
+import functools
+import time
 import warnings
 
+from urllib.parse import urlparse
+
 from .base import Plugin
+from synack._json import decode
+from synack._singleflight import SingleFlight
+
+# Responses that mean Synack wants us to slow down and try again
+RETRY_STATUSES = [429, 503]
+# Longest time to wait before retrying, even if Synack asks for longer
+MAX_RETRY_DELAY = 60
 
 
 class Api(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Debug', 'Db']:
-            setattr(self, plugin.lower(), self.registry.get(plugin)(self.state))
+        self._load_plugins(['Debug', 'Db'])
+        self._context = (None, None)
+        self._flights = SingleFlight()
+
+    def _get_context(self):
+        """Return the headers, proxies and verify flag used by every request
+
+        These are only rebuilt when the config in the Db or the proxy settings in the State change.
+        """
+        # Loading the config bumps its version, so it has to happen before the version is read
+        self.db.get_config()
+        key = (self.db.config_version, self.state.use_proxies, self.state.http_proxy, self.state.https_proxy)
+        context_key, context = self._context
+        if context is None or context_key != key:
+            context = {
+                'headers': {
+                    'Authorization': f'Bearer {self.db.api_token}',
+                    'user_id': self.db.user_id
+                }
+            }
+            if self.db.use_proxies:
+                warnings.filterwarnings("ignore")
+                context['verify'] = False
+                context['proxies'] = self.db.proxies
+            else:
+                context['verify'] = True
+                context['proxies'] = None
+            self._context = (key, context)
+        return context
+
+    def _get_retry_delay(self, res, attempt):
+        """Return how many seconds to wait before retrying a throttled request
+
+        Retry-After is used when it is sent. Otherwise, the wait doubles with every attempt.
+        """
+        delay = None
+        retry_after = res.headers.get('Retry-After')
+        if retry_after:
+            if retry_after.strip().isdigit():
+                delay = int(retry_after)
+            else:
+                from datetime import datetime, timezone
+                from email.utils import parsedate_to_datetime
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    pass
+        if delay is None:
+            delay = self.state.retry_backoff * 2 ** attempt
+        return min(max(delay, 0), MAX_RETRY_DELAY)
+
+    def _get_route(self, url, headers):
+        """Return the URL and headers a request is actually sent with
+
+        When state.base_url is set, requests to Synack hosts are sent there instead,
+        with the Synack host they were meant for in the Host header.
+        """
+        host = urlparse(url).hostname or ''
+        if self.state.base_url and (host == 'synack.com' or host.endswith('.synack.com')):
+            base = urlparse(self.state.base_url)
+            url = urlparse(url)._replace(scheme=base.scheme, netloc=base.netloc).geturl()
+            headers = {**headers, 'Host': host}
+        return url, headers
+
+    def _set_json(self, res):
+        """Make res.json() decode with the JSON backend of the State, and return res"""
+        import requests
+
+        if isinstance(res, requests.models.Response):
+            res.json = functools.partial(decode, res, self.state.json_loads)
+        return res
+
+    @staticmethod
+    def _build_page_query(query, per_page, per_page_param):
+        """Return the query paginate() sends with every page, before the page number is added"""
+        query = dict(query or dict())
+        if per_page and per_page_param:
+            query[per_page_param] = per_page
+        return query
+
+    @staticmethod
+    def _build_url(base, path):
+        """Return the full URL of an API endpoint path, which may already be a full URL"""
+        if path.startswith('http'):
+            return path
+        return f'{base}{path}'
+
+    def _build_notifications(self, path, kwargs):
+        """Return the URL of a Notifications API request, and send it with the notifications token"""
+        kwargs['headers'] = {**(kwargs.get('headers') or dict()),
+                             'Authorization': 'Bearer ' + self.db.notifications_token}
+        return self._build_url('https://notifications.synack.com/api/v2/', path)
+
+    def _check_cache(self, method, url, query, headers, stream=False):
+        """Look a request up in the response cache
+
+        Returns the cache key and entry (None if the request is not cached), whether the entry is still fresh,
+        and the headers to send, which ask Synack whether a stale entry has changed.
+        Writes (POST, PUT, etc.) make the cached responses of their endpoint be checked again instead.
+        """
+        if method == 'GET':
+            if stream:
+                return None, None, False, headers
+            cache_key, cached, fresh = self.state.response_cache.lookup(url, query, headers.get('Authorization'))
+            if cached and not fresh:
+                headers = {**headers, **cached.validators}
+            return cache_key, cached, fresh, headers
+        if method != 'HEAD':
+            self.state.response_cache.invalidate(url)
+        return None, None, False, headers
+
+    def _check_notifications(self, res):
+        """Forget the notifications token if Synack no longer accepts it, and return res"""
+        if res.status_code == 422:
+            self.db.notifications_token = ""
+        return res
+
+    def _get_cached(self, url, cached):
+        """Return a fresh entry of the response cache as a Response"""
+        self.debug.log("Network Request", "200 -- GET -- %s (cached)", url)
+        return self._set_json(cached.build_response())
+
+    @staticmethod
+    def _get_flight(method, url, query, headers):
+        """Return what identical GET and HEAD requests share a single network call on"""
+        return (method, url, repr(sorted((query or dict()).items())), tuple(sorted(headers.items())))
+
+    @staticmethod
+    def _is_last_page(items, page, per_page, max_pages):
+        """Return whether a page of items is the last one paginate() should request"""
+        if not items:
+            return True
+        if per_page and len(items) < per_page:
+            return True
+        return bool(max_pages) and page >= max_pages
+
+    def _is_token_rejected(self, res, url, token):
+        """Return whether Synack rejected the API token of a request that can be sent again after logging in
+
+        Only requests to the platform API that were sent with a token are, and only when state.login is set.
+        """
+        if res.status_code != 401 or not self.state.login or not token:
+            return False
+        url = urlparse(url)
+        return url.hostname == 'platform.synack.com' and url.path.startswith('/api/')
+
+    def _read_page(self, res, page, per_page, max_pages, strict=False):
+        """Return the items of a page paginate() received and whether it is the last one
+
+        None is returned if the page failed, or requests.HTTPError is raised if strict is set.
+        """
+        if res.status_code != 200:
+            if strict:
+                import requests
+
+                raise requests.HTTPError(f'{res.status_code} Error getting page {page} of {res.url}', response=res)
+            return None
+        items = res.json()
+        return items, self._is_last_page(items, page, per_page, max_pages)
+
+    def _receive(self, method, url, headers, query, data, res, elapsed, attempt,
+                 cache_key=None, cached=None, stream=False):
+        """Record a response, and return it unless it was throttled and should be sent again
+
+        The response is written to the cassette (when recording, unless it is streamed, as that would read
+        the whole body into memory), counted in the request metrics,
+        logged, and stored in the response cache. A throttled response pauses the rate limiter
+        before the next attempt instead, and None is returned.
+        """
+        cassette = self.state.cassette
+        if cassette and cassette.mode == 'record' and not stream:
+            cassette.record(method, url, query, data, res, elapsed)
+        size = int(res.headers.get('Content-Length') or 0) if stream else len(res.content or b'')
+        self.state.request_metrics.record(method, url, res.status_code, elapsed, size)
+
+        if self.debug.enabled:
+            self.debug.log("Network Request",
+                           "%s -- %s -- %s\n\tHeaders: %s\n\tQuery: %s\n\tData: %s\n\tContent: %s",
+                           res.status_code, method, url, headers, query, data,
+                           '(streamed)' if stream else res.content)
+
+        if res.status_code not in RETRY_STATUSES:
+            if cache_key:
+                res = self.state.response_cache.update(cache_key, cached, res)
+            return self._set_json(res)
+        if stream:
+            res.close()
+        if attempt < self.state.max_retries:
+            self.state.rate_limiter.pause(url, self._get_retry_delay(res, attempt))
+
+    def _refresh_api_token(self, token):
+        """Log in again, and return whether there is a new API token to send a rejected request again with"""
+        return self._get_plugin(self.state, 'Auth').get_api_token(expired=token) not in [None, token]
+
+    def _replay(self, method, url, query, data):
+        """Return the recorded response to a request and how long to wait before using it
+
+        None is returned when no cassette is being replayed.
+        """
+        cassette = self.state.cassette
+        if cassette and cassette.mode == 'replay':
+            interaction = cassette.replay(method, url, query, data)
+            return cassette.build_response(interaction), cassette.get_delay(interaction)
+
+    def _request(self, method, url, **kwargs):
+        """Send a request to a full URL through the response cache and single flight"""
+        method = method.upper()
+        context = self._get_context()
+        headers = context['headers']
+        if kwargs.get('headers'):
+            headers = {**headers, **kwargs['headers']}
+        query = kwargs.get('query')
+        data = kwargs.get('data')
+        stream = kwargs.get('stream', False)
+
+        cache_key, cached, fresh, headers = self._check_cache(method, url, query, headers, stream)
+        if fresh:
+            return self._get_cached(url, cached)
+
+        send = functools.partial(self._send, method, url, headers, context['proxies'], context['verify'],
+                                 query, data, cache_key, cached, stream)
+        if method in ['GET', 'HEAD'] and not stream:
+            return self._flights.do(self._get_flight(method, url, query, headers), send)
+        return send()
+
+    def _send(self, method, url, headers, proxies, verify, query, data, cache_key=None, cached=None, stream=False):
+        """Send a request, waiting for the rate limiter and retrying while it is throttled"""
+        for attempt in range(self.state.max_retries + 1):
+            wait = self.state.rate_limiter.reserve(url)
+            if wait:
+                time.sleep(wait)
+
+            route, route_headers = self._get_route(url, headers)
+            start = time.monotonic()
+            replayed = self._replay(method, url, query, data)
+            if replayed:
+                res, delay = replayed
+                time.sleep(delay)
+            elif method == 'GET':
+                res = self.state.session.get(route,
+                                             headers=route_headers,
+                                             proxies=proxies,
+                                             params=query,
+                                             stream=stream,
+                                             verify=verify)
+            elif method == 'HEAD':
+                res = self.state.session.head(route,
+                                              headers=route_headers,
+                                              proxies=proxies,
+                                              params=query,
+                                              verify=verify)
+            elif method == 'PATCH':
+                res = self.state.session.patch(route,
+                                               json=data,
+                                               headers=route_headers,
+                                               proxies=proxies,
+                                               verify=verify)
+            elif method == 'POST':
+                res = self.state.session.post(route,
+                                              json=data,
+                                              headers=route_headers,
+                                              proxies=proxies,
+                                              verify=verify)
+            elif method == 'PUT':
+                res = self.state.session.put(route,
+                                             headers=route_headers,
+                                             proxies=proxies,
+                                             params=data,
+                                             verify=verify)
+
+            ret = self._receive(method, url, headers, query, data, res, time.monotonic() - start, attempt,
+                                cache_key, cached, stream)
+            if ret is not None:
+                return ret
+
+        res.raise_for_status()
 
     def login(self, method, path, **kwargs):
         """Modify API Request for Login
@@ -26,13 +312,7 @@ class Api(Plugin):
         data -- POST body dictionary
         query -- GET query string dictionary
         """
-        if path.startswith('http'):
-            base = ''
-        else:
-            base = 'https://login.synack.com/api/'
-        url = f'{base}{path}'
-        res = self.request(method, url, **kwargs)
-        return res
+        return self.request(method, self._build_url('https://login.synack.com/api/', path), **kwargs)
 
     def notifications(self, method, path, **kwargs):
         """Modify API Request for Notifications
@@ -46,24 +326,65 @@ class Api(Plugin):
         data -- POST body dictionary
         query -- GET query string dictionary
         """
-        if path.startswith('http'):
-            base = ''
-        else:
-            base = 'https://notifications.synack.com/api/v2/'
-        url = f'{base}{path}'
+        url = self._build_notifications(path, kwargs)
+        return self._check_notifications(self.request(method, url, **kwargs))
 
-        if not kwargs.get('headers'):
-            kwargs['headers'] = dict()
-        auth = "Bearer " + self.db.notifications_token
-        kwargs['headers']['Authorization'] = auth
+    def paginate(self, method, path, page=1, per_page=None, max_pages=None,
+                 per_page_param='perPage', prefetch=False, strict=False, **kwargs):
+        """Yield the items of a paged endpoint as each page arrives
 
-        res = self.request(method, url, **kwargs)
-        if res.status_code == 422:
-            self.db.notifications_token = ""
-        return res
+        Pages are requested until one fails, is empty or short, or max_pages is reached.
+        Stopping early (break, close()) requests no more pages.
 
-    def request(self, method, path, **kwargs):
-        """Send API Request
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        page -- First page to request
+        per_page -- Items requested per page
+                    A page holding fewer items is the last one
+        max_pages -- Number of the last page to request (Default: no limit)
+        per_page_param -- Query parameter per_page is sent as
+                          None if the endpoint has a fixed page size
+        prefetch -- Request the next page while the current one is consumed
+        strict -- Raise requests.HTTPError when a page fails, instead of stopping as if it was the last one
+        headers -- Additional headers to be added for only these requests
+        data -- POST body dictionary
+        query -- GET query string dictionary
+        """
+        query = self._build_page_query(kwargs.pop('query', None), per_page, per_page_param)
+        get_page = functools.partial(self.request, method, path, **kwargs)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if prefetch else None
+        pending = None
+        try:
+            while True:
+                if pending:
+                    res, pending = pending.result(), None
+                else:
+                    res = get_page(query={**query, 'page': page})
+                read = self._read_page(res, page, per_page, max_pages, strict)
+                if read is None:
+                    return
+                items, last = read
+                if executor and not last:
+                    pending = executor.submit(get_page, query={**query, 'page': page+1})
+                yield from items
+                if last:
+                    return
+                page += 1
+        finally:
+            if pending:
+                pending.cancel()
+            if executor:
+                executor.shutdown(wait=False)
+
+    def prepare(self, method, path, **kwargs):
+        """Build a request ahead of time, to be sent later with send_prepared()
+
+        The headers are merged and the body serialized now, so sending it does no more work than needed.
+        The API token is read now as well, so prepared requests must be built again once it changes.
 
         Arguments:
         method -- Request method verb
@@ -74,65 +395,89 @@ class Api(Plugin):
         data -- POST body dictionary
         query -- GET query string dictionary
         """
-        if path.startswith('http'):
-            base = ''
-        else:
-            base = 'https://platform.synack.com/api/'
-        url = f'{base}{path}'
-
-        if self.db.use_proxies:
-            warnings.filterwarnings("ignore")
-            verify = False
-            proxies = self.db.proxies
-        else:
-            verify = True
-            proxies = None
-
-        headers = {
-            'Authorization': f'Bearer {self.db.api_token}',
-            'user_id': self.db.user_id
-        }
+        import requests
+
+        headers = self._get_context()['headers']
         if kwargs.get('headers'):
-            headers.update(kwargs.get('headers', {}))
+            headers = {**headers, **kwargs['headers']}
         query = kwargs.get('query')
         data = kwargs.get('data')
+        if method.upper() == 'PUT':
+            query, data = data, None
+        url = self._build_url('https://platform.synack.com/api/', path)
+        req = requests.Request(method.upper(), url, headers=headers, params=query, json=data)
+        return self.state.session.prepare_request(req)
+
+    def request(self, method, path, **kwargs):
+        """Send API Request
+
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        headers -- Additional headers to be added for only this request
+        data -- POST body dictionary
+        query -- GET query string dictionary
+        stream -- Return a GET response before its body is downloaded
+                  The body must then be read with iter_content() and the response closed
 
-        if method.upper() == 'GET':
-            res = self.state.session.get(url,
-                                         headers=headers,
-                                         proxies=proxies,
-                                         params=query,
-                                         verify=verify)
-        elif method.upper() == 'HEAD':
-            res = self.state.session.head(url,
-                                          headers=headers,
-                                          proxies=proxies,
-                                          params=query,
-                                          verify=verify)
-        elif method.upper() == 'PATCH':
-            res = self.state.session.patch(url,
-                                           json=data,
-                                           headers=headers,
-                                           proxies=proxies,
-                                           verify=verify)
-        elif method.upper() == 'POST':
-            res = self.state.session.post(url,
-                                          json=data,
-                                          headers=headers,
-                                          proxies=proxies,
-                                          verify=verify)
-        elif method.upper() == 'PUT':
-            res = self.state.session.put(url,
-                                         headers=headers,
-                                         proxies=proxies,
-                                         params=data,
-                                         verify=verify)
-
-        self.debug.log("Network Request",
-                       f"{res.status_code} -- {method.upper()} -- {url}" +
-                       f"\n\tHeaders: {headers}" +
-                       f"\n\tQuery: {query}" +
-                       f"\n\tData: {data}" +
-                       f"\n\tContent: {res.content}")
+        Requests wait for the rate limiter of the State, and are retried when Synack
+        responds with 429 or 503. If every retry is throttled, requests.HTTPError is raised.
+        GET requests to endpoints with a TTL in the State go through its response cache.
+        Identical GET and HEAD requests sent at the same time share one network call.
+        If state.login is set and Synack rejects the API token (401), the Handler
+        logs in again and the request is sent once more.
+        """
+        if self.state.login_pending:
+            self._get_plugin(self.state, 'Auth').get_deferred_api_token()
 
+        url = self._build_url('https://platform.synack.com/api/', path)
+        token = self.db.api_token
+        res = self._request(method, url, **kwargs)
+        if self._is_token_rejected(res, url, token) and self._refresh_api_token(token):
+            res = self._request(method, url, **kwargs)
         return res
+
+    def send_prepared(self, prepared):
+        """Send a request built by prepare() with as little work as possible
+
+        The request waits for the rate limiter and is counted in the request metrics,
+        but skips the response cache, single flight, cassette and retries, and is not sent again after logging in.
+
+        Arguments:
+        prepared -- Request returned by prepare()
+        """
+        url = prepared.url
+        wait = self.state.rate_limiter.reserve(url)
+        if wait:
+            time.sleep(wait)
+        if self.state.base_url:
+            prepared = prepared.copy()
+            prepared.url, headers = self._get_route(url, prepared.headers)
+            prepared.prepare_headers(headers)
+        context = self._get_context()
+        start = time.monotonic()
+        res = self.state.session.send(prepared, proxies=context['proxies'], verify=context['verify'])
+        elapsed = time.monotonic() - start
+        self.state.request_metrics.record(prepared.method, url, res.status_code, elapsed, len(res.content or b''))
+        if self.debug.enabled:
+            self.debug.log("Network Request", "%s -- %s -- %s (prepared)\n\tContent: %s",
+                           res.status_code, prepared.method, url, res.content)
+        return self._set_json(res)
+
+    def warm(self, path='transactions', connections=1):
+        """Open connections to a host ahead of time, so later requests to it skip connecting (and TLS)
+
+        Each connection is opened with a HEAD request, and is kept alive for later requests.
+        At most state.pool_maxsize connections are kept for each Synack host.
+
+        Arguments:
+        path -- API endpoint path to send the HEAD requests to
+                Can be an endpoint on platform.synack.com or a full URL on another host
+        connections -- Number of connections to open at the same time
+        """
+        prepared = self.prepare('HEAD', path)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=connections) as executor:
+            responses = executor.map(self.send_prepared, [prepared] * connections)
+            return [res.status_code for res in responses]
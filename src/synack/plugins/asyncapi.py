@@ -0,0 +1,221 @@
+"""plugins/asyncapi.py
+
+Functions to handle interacting with the Synack APIs from asyncio
+"""
+
+import functools
+import time
+
+from urllib.parse import urlparse
+
+from .api import Api
+from synack._json import get_accept_encoding
+from synack._response import build_response
+
+
+class AsyncApi(Api):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = None
+
+    @staticmethod
+    def _build_params(query):
+        """Flatten a query dictionary into pairs the same way requests does"""
+        if not query:
+            return None
+        ret = list()
+        for key, value in query.items():
+            for item in value if type(value) in [list, tuple] else [value]:
+                if item is not None:
+                    ret.append((str(key), str(item)))
+        return ret
+
+    def _get_session(self):
+        """Return the aiohttp session, creating it within the running event loop if needed"""
+        import aiohttp
+
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.state.pool_maxsize,
+                                             force_close=not self.state.keep_alive)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 headers={'Accept-Encoding': get_accept_encoding()})
+        return self.session
+
+    async def _request(self, method, url, **kwargs):
+        """Send a request to a full URL through the response cache and single flight"""
+        method = method.upper()
+        context = self._get_context()
+        headers = context['headers']
+        if kwargs.get('headers'):
+            headers = {**headers, **kwargs['headers']}
+        query = kwargs.get('query')
+        data = kwargs.get('data')
+
+        cache_key, cached, fresh, headers = self._check_cache(method, url, query, headers)
+        if fresh:
+            return self._get_cached(url, cached)
+
+        options = {
+            'headers': headers,
+            'allow_redirects': method != 'HEAD'
+        }
+        if not context['verify']:
+            options['ssl'] = False
+        if context['proxies']:
+            options['proxy'] = context['proxies'].get(urlparse(url).scheme)
+        if method in ['GET', 'HEAD']:
+            options['params'] = self._build_params(query)
+        elif method in ['PATCH', 'POST']:
+            options['json'] = data
+        elif method == 'PUT':
+            options['params'] = self._build_params(data)
+
+        send = functools.partial(self._send, method, url, options, query, data, cache_key, cached)
+        if method in ['GET', 'HEAD']:
+            return await self._flights.do_async(self._get_flight(method, url, query, headers), send)
+        return await send()
+
+    @staticmethod
+    async def _run_blocking(func, *args):
+        """Run a function that blocks (logging in, etc.) in a thread, so other coroutines carry on meanwhile"""
+        import asyncio
+
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    async def _send(self, method, url, options, query, data, cache_key=None, cached=None):
+        """Send a request, waiting for the rate limiter and retrying while it is throttled"""
+        import asyncio
+
+        for attempt in range(self.state.max_retries + 1):
+            wait = self.state.rate_limiter.reserve(url)
+            if wait:
+                await asyncio.sleep(wait)
+
+            start = time.monotonic()
+            replayed = self._replay(method, url, query, data)
+            if replayed:
+                res, delay = replayed
+                await asyncio.sleep(delay)
+            else:
+                route, headers = self._get_route(url, options['headers'])
+                async with self._get_session().request(method, route, **{**options, 'headers': headers}) as response:
+                    res = build_response(response.status, response.reason, str(response.url),
+                                         response.headers, await response.read())
+
+            ret = self._receive(method, url, options['headers'], query, data, res, time.monotonic() - start,
+                                attempt, cache_key, cached)
+            if ret is not None:
+                return ret
+
+        res.raise_for_status()
+
+    async def close(self):
+        """Close the aiohttp session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def login(self, method, path, **kwargs):
+        """Modify API Request for Login
+
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        headers -- Additional headers to be added for only this request
+        data -- POST body dictionary
+        query -- GET query string dictionary
+        """
+        return await super().login(method, path, **kwargs)
+
+    async def notifications(self, method, path, **kwargs):
+        """Modify API Request for Notifications
+
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        headers -- Additional headers to be added for only this request
+        data -- POST body dictionary
+        query -- GET query string dictionary
+        """
+        url = self._build_notifications(path, kwargs)
+        return self._check_notifications(await self.request(method, url, **kwargs))
+
+    async def paginate(self, method, path, page=1, per_page=None, max_pages=None,
+                       per_page_param='perPage', prefetch=False, strict=False, **kwargs):
+        """Yield the items of a paged endpoint as each page arrives (async for)
+
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        page -- First page to request
+        per_page -- Items requested per page
+                    A page holding fewer items is the last one
+        max_pages -- Number of the last page to request (Default: no limit)
+        per_page_param -- Query parameter per_page is sent as
+                          None if the endpoint has a fixed page size
+        prefetch -- Request the next page while the current one is consumed
+        strict -- Raise requests.HTTPError when a page fails, instead of stopping as if it was the last one
+        headers -- Additional headers to be added for only these requests
+        data -- POST body dictionary
+        query -- GET query string dictionary
+        """
+        import asyncio
+
+        query = self._build_page_query(kwargs.pop('query', None), per_page, per_page_param)
+        pending = None
+        try:
+            while True:
+                if pending:
+                    res, pending = await pending, None
+                else:
+                    res = await self.request(method, path, query={**query, 'page': page}, **kwargs)
+                read = self._read_page(res, page, per_page, max_pages, strict)
+                if read is None:
+                    return
+                items, last = read
+                if prefetch and not last:
+                    pending = asyncio.ensure_future(self.request(method, path,
+                                                                 query={**query, 'page': page+1}, **kwargs))
+                for item in items:
+                    yield item
+                if last:
+                    return
+                page += 1
+        finally:
+            if pending:
+                pending.cancel()
+
+    async def request(self, method, path, **kwargs):
+        """Send API Request
+
+        Arguments:
+        method -- Request method verb
+                  (GET, POST, etc.)
+        path -- API endpoint path
+                Can be an endpoint on platform.synack.com or a full URL
+        headers -- Additional headers to be added for only this request
+        data -- POST body dictionary
+        query -- GET query string dictionary
+
+        Requests wait for the rate limiter of the State, and are retried when Synack
+        responds with 429 or 503. If every retry is throttled, requests.HTTPError is raised.
+        GET requests to endpoints with a TTL in the State go through its response cache.
+        Identical GET and HEAD requests sent at the same time share one network call.
+        If state.login is set and Synack rejects the API token (401), the Handler
+        logs in again (in a thread, as logging in blocks) and the request is sent once more.
+        """
+        if self.state.login_pending:
+            await self._run_blocking(self._get_plugin(self.state, 'Auth').get_deferred_api_token)
+
+        url = self._build_url('https://platform.synack.com/api/', path)
+        token = self.db.api_token
+        res = await self._request(method, url, **kwargs)
+        if self._is_token_rejected(res, url, token) and await self._run_blocking(self._refresh_api_token, token):
+            res = await self._request(method, url, **kwargs)
+        return res
@@ -0,0 +1,38 @@
+"""plugins/asynchydra.py
+
+Coroutine versions of the Hydra functions that talk to the Synack API most
+"""
+
+from .hydra import Hydra
+
+
+class AsyncHydra(Hydra):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._load_plugins(['AsyncApi'])
+
+    async def get_hydra(self, page=1, max_page=5, update_db=True, **kwargs):
+        """Get Hydra results for target identified using kwargs (codename='x', slug='x', etc.)"""
+        max_page = 1000 if max_page == 0 else max_page
+        results = list()
+        target = None
+        targets = self.db.find_targets(**kwargs)
+        if targets:
+            target = targets[0]
+        if target:
+            query = {
+                'listing_uids': target.slug,
+                'q': '+port_is_open:true'
+            }
+            async for result in self.asyncapi.paginate('GET',
+                                                       'hydra_search/search',
+                                                       page=page,
+                                                       per_page=10,
+                                                       max_pages=max_page,
+                                                       per_page_param=None,
+                                                       prefetch=True,
+                                                       query=query):
+                results.append(result)
+            if update_db:
+                self.db.add_ports(self.build_db_input(results))
+            return results
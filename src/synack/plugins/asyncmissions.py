@@ -0,0 +1,114 @@
+"""plugins/asyncmissions.py
+
+Coroutine versions of the Missions functions that talk to the Synack API most
+"""
+
+from .missions import Missions
+
+
+class AsyncMissions(Missions):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._load_plugins(['AsyncApi'])
+
+    async def _get_page(self, status, page, per_page, listing_uids, semaphore):
+        """Return a single page of missions, or None if the request fails"""
+        async with semaphore:
+            res = await self.asyncapi.request('GET',
+                                              'tasks/v2/tasks',
+                                              query=self._build_query(status, page, per_page, listing_uids))
+        if res.status_code == 200:
+            return res.json()
+
+    async def get(self, status="PUBLISHED",
+                  max_pages=1, page=1, per_page=20, listing_uids=None):
+        """Get a list of missions given a status
+
+        Returns None if any page could not be fetched.
+
+        Arguments:
+        status -- String matching the type of missions
+                  (PUBLISHED, CLAIMED, FOR_REVIEW, APPROVED)
+        max_pages -- Maximum number of pages to query
+        page -- Starting page
+        per_page -- Missions to return per page
+        listing_uids -- A specific listing ID to check for missions
+        """
+        res = await self.asyncapi.request('GET',
+                                          'tasks/v2/tasks',
+                                          query=self._build_query(status, page, per_page, listing_uids))
+        if res.status_code == 200:
+            ret = res.json()
+            pages = self._get_next_pages(res, ret, page, per_page, max_pages)
+            if pages is None:
+                import requests
+
+                try:
+                    async for mission in self.asyncapi.paginate('GET',
+                                                                'tasks/v2/tasks',
+                                                                page=page+1,
+                                                                per_page=per_page,
+                                                                max_pages=max_pages,
+                                                                prefetch=True,
+                                                                strict=True,
+                                                                query=self._build_query(status, page+1,
+                                                                                        per_page, listing_uids)):
+                        ret.append(mission)
+                except requests.HTTPError:
+                    return None
+            elif pages:
+                import asyncio
+
+                semaphore = asyncio.Semaphore(max(1, self.state.page_workers))
+                results = await asyncio.gather(*[self._get_page(status, p, per_page, listing_uids, semaphore)
+                                                 for p in pages])
+                if None in results:
+                    return None
+                for missions in results:
+                    ret.extend(missions)
+            return ret
+
+    async def get_new(self, max_pages=50):
+        """Get the available missions that were not available the last time this (or diff()) was called
+
+        Returns None if the missions could not be fetched.
+
+        Arguments:
+        max_pages -- Maximum number of pages of available missions to fetch
+        """
+        missions = await self.get("PUBLISHED", max_pages=max_pages)
+        if missions is not None:
+            return self.diff(missions)['new']
+
+    async def set_claimed(self, mission):
+        """Try to claim a single mission
+
+        Claims prepared with build_claims() are not used, as they can only be sent with requests.
+
+        Arguments:
+        mission -- A single mission
+        """
+        return await self.set_status(mission, "CLAIM")
+
+    async def set_status(self, mission, status):
+        """Interact with single mission
+
+        Arguments:
+        mission -- A single mission
+        """
+        data = {
+            "type": status
+        }
+        res = await self.asyncapi.request('POST',
+                                          self._build_transition_path(mission),
+                                          data=data)
+        return self._build_status(mission, status, res)
+
+    def watch(self, callback=None, block=True, **kwargs):
+        """Watch for new missions with the Missions Plugin, and call callback with each list of them
+
+        The watcher polls with blocking requests, so from a running event loop it should be
+        started with block=False, which polls from a background thread.
+        See Missions.watch() for the arguments.
+        """
+        return self._get_plugin(self.state, 'Missions').watch(callback, block, **kwargs)
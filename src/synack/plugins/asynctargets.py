@@ -0,0 +1,133 @@
+"""plugins/asynctargets.py
+
+Coroutine versions of the Targets functions that talk to the Synack API most
+"""
+
+import json
+
+from .targets import Targets
+
+
+class AsyncTargets(Targets):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._load_plugins(['AsyncApi'])
+
+    async def get_assets(self, target=None, asset_type=None, host_type=None, active='true',
+                         scope=['in', 'discovered'], sort='location', sort_dir='asc',
+                         page=1, perPage=5000, organization_uid=None, **kwargs):
+        """Get the assets (scope) of a target"""
+        if target is None:
+            if len(kwargs) > 0:
+                target = self.db.find_targets(**kwargs)
+            else:
+                curr = self.get_connected()
+                target = self.db.find_targets(slug=curr.get('slug'))
+
+        if type(scope) == str:
+            scope = [scope]
+
+        if target:
+            if type(target) is list and len(target) > 0:
+                target = target[0]
+            query = {
+                'listingUid[]': target.slug,
+                'organizationUid[]': organization_uid,
+                'assetType[]': asset_type,
+                'hostType[]': host_type,
+                'scope[]': scope,
+                'sort[]': sort,
+                'active': active,
+                'sortDir': sort_dir
+            }
+
+            import requests
+
+            assets = list()
+            try:
+                async for asset in self.asyncapi.paginate('GET',
+                                                          'asset/v2/assets',
+                                                          page=page or 1,
+                                                          per_page=perPage,
+                                                          max_pages=None if perPage else page or 1,
+                                                          prefetch=True,
+                                                          strict=True,
+                                                          query=query):
+                    assets.append(asset)
+            except requests.HTTPError:
+                return None
+            if assets and self.db.use_scratchspace:
+                self.scratchspace.set_assets_file(json.dumps(assets), target=target)
+            return assets
+
+    async def get_scope(self, add_to_db=False, **kwargs):
+        """Get the scope of a target"""
+        if len(kwargs) > 0:
+            target = self.db.find_targets(**kwargs)
+        else:
+            curr = self.get_connected()
+            target = self.db.find_targets(slug=curr.get('slug'))
+
+        if target:
+            target = target[0]
+            categories = dict()
+            for category in self.db.categories:
+                categories[category.id] = category.name
+            if categories[target.category].lower() == 'host':
+                return await self.get_scope_host(target, add_to_db=add_to_db)
+            elif categories[target.category].lower() in ['web application', 'mobile']:
+                return await self.get_scope_web(target, add_to_db=add_to_db)
+
+    async def get_scope_host(self, target=None, add_to_db=False, **kwargs):
+        """Get the scope of a Host target"""
+        if target is None:
+            if len(kwargs) > 0:
+                targets = self.db.find_targets(**kwargs)
+            else:
+                curr = self.get_connected()
+                targets = self.db.find_targets(slug=curr.get('slug'))
+            if targets:
+                target = next(iter(targets), None)
+
+        scope = set()
+
+        if target:
+            assets = await self.get_assets(target=target, active='true', asset_type='host', host_type='cidr')
+            if assets is None:
+                return None
+            scope = self.build_scope_host(assets)
+
+            if len(scope) > 0:
+                if add_to_db:
+                    self.db.add_ips(self.build_scope_host_db(target.slug, scope))
+                if self.db.use_scratchspace:
+                    self.scratchspace.set_hosts_file(scope, target=target)
+
+        return scope
+
+    async def get_scope_web(self, target=None, add_to_db=False, **kwargs):
+        """Get the scope of a Web target"""
+        if target is None:
+            if len(kwargs) > 0:
+                targets = self.db.find_targets(**kwargs)
+            else:
+                curr = self.get_connected()
+                targets = self.db.find_targets(slug=curr.get('slug'))
+            if targets:
+                target = next(iter(targets), None)
+
+        scope = list()
+
+        if target:
+            assets = await self.get_assets(target=target, active='true', asset_type='webapp')
+            if assets is None:
+                return None
+            scope = self.build_scope_web(assets)
+
+            if len(scope) > 0:
+                if add_to_db:
+                    self.db.add_urls(self.build_scope_web_db(scope))
+                if self.db.use_scratchspace:
+                    self.scratchspace.set_burp_file(self.build_scope_web_burp(scope), target=target)
+
+        return scope
@@ -3,56 +3,129 @@
 Functions related to handling and checking authentication.
 """
 
-import pyotp
+import base64
+import json
 import re
+import threading
+import time
 
 from .base import Plugin
+from synack._filelock import FileLock
+
+# Seconds before an API token expires that it is no longer trusted without checking it
+EXPIRY_MARGIN = 60
+# Seconds before the OTP changes that it is no longer sent, as it may have changed by the time Synack checks it
+OTP_MARGIN = 2
 
 
 class Auth(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db', 'Users']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db', 'Users'])
+        self._expiry = (None, None)
+        self._lock = threading.RLock()
+
+    def _get_api_token(self, expired):
+        """Return the API token, logging in for a new one if needed (see get_api_token())"""
+        token = self.db.api_token
+        if expired is None:
+            expiry = self.get_api_token_expiry()
+            if expiry and expiry > time.time() + EXPIRY_MARGIN:
+                return token
+            if (not expiry or expiry > time.time()) and self.users.get_profile():
+                return self.db.api_token
+            token = self.db.api_token
+        elif token != expired:
+            return token
+        with FileLock(self.state.config_dir / 'login.lock'):
+            self.db.reload()
+            if self.db.api_token != token:
+                return self.db.api_token
+            csrf = self.get_login_csrf()
+            progress_token = None
+            grant_token = None
+            if csrf:
+                progress_token = self.get_login_progress_token(csrf)
+            if progress_token:
+                grant_token = self.get_login_grant_token(csrf, progress_token)
+            if grant_token:
+                url = 'https://platform.synack.com/'
+                headers = {
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+                query = {
+                    "grant_token": grant_token
+                }
+                res = self.api.request('GET',
+                                       url + 'token',
+                                       headers=headers,
+                                       query=query)
+                if res.status_code == 200:
+                    j = res.json()
+                    self.db.api_token = j.get('access_token')
+                    self.set_login_script()
+                    return j.get('access_token')
 
     def build_otp(self):
-        """Generate and return a OTP."""
+        """Generate and return a OTP.
+
+        If the OTP is about to change, this waits for the next one instead.
+        """
+        import pyotp
+
         totp = pyotp.TOTP(self.db.otp_secret)
         totp.digits = 7
         totp.interval = 10
         totp.issuer = 'synack'
+        remaining = totp.interval - time.time() % totp.interval
+        if remaining < OTP_MARGIN:
+            time.sleep(remaining)
         return totp.now()
 
-    def get_api_token(self):
-        """Log in to get a new API token."""
-        if self.users.get_profile():
+    def get_api_token(self, expired=None):
+        """Log in to get a new API token.
+
+        The current token is used without logging in while it is known to be valid,
+        either from its expiry or from checking it with Synack.
+        Only one thread or process logs in at a time, using a lock file in the config_dir.
+        Everyone waiting on it gets the token it logged in with from the Database.
+        If the Database does not have a user_id yet, it is filled in from the profile.
+
+        Arguments:
+        expired -- API token Synack just rejected
+                   If it has already been replaced, the new one is returned without logging in
+        """
+        with self._lock:
+            token = self._get_api_token(expired)
+            # A profile request rejected with the new token comes back here with expired set, so it is not repeated
+            if expired is None and token and not self.db.user_id:
+                self.users.get_profile()
+            return token
+
+    def get_api_token_expiry(self):
+        """Return when (seconds since the epoch) the API token expires, or None if the token does not say"""
+        token = self.db.api_token
+        cached_token, expiry = self._expiry
+        if token != cached_token:
+            expiry = None
+            try:
+                payload = token.split('.')[1]
+                expiry = float(json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['exp'])
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+                pass
+            self._expiry = (token, expiry)
+        return expiry
+
+    def get_deferred_api_token(self):
+        """Log in if the Handler deferred it, and return the API token
+
+        Everyone calling this while the login happens waits for it, so no request is sent without a token.
+        """
+        with self._lock:
+            if self.state.login_pending:
+                self.state.login_pending = False
+                self.get_api_token()
             return self.db.api_token
-        csrf = self.get_login_csrf()
-        progress_token = None
-        grant_token = None
-        if csrf:
-            progress_token = self.get_login_progress_token(csrf)
-        if progress_token:
-            grant_token = self.get_login_grant_token(csrf, progress_token)
-        if grant_token:
-            url = 'https://platform.synack.com/'
-            headers = {
-                'X-Requested-With': 'XMLHttpRequest'
-            }
-            query = {
-                "grant_token": grant_token
-            }
-            res = self.api.request('GET',
-                                   url + 'token',
-                                   headers=headers,
-                                   query=query)
-            if res.status_code == 200:
-                j = res.json()
-                self.db.api_token = j.get('access_token')
-                self.set_login_script()
-                return j.get('access_token')
 
     def get_login_csrf(self):
         """Get the CSRF Token from the login page"""
@@ -7,3 +7,29 @@ class Plugin:
 
     def __init__(self, state, **kwargs):
         self.state = state
+
+    @classmethod
+    def _get_plugin(cls, state, name):
+        """Return the one instance of a plugin shared by everything using this State
+
+        Arguments:
+        state -- State the plugin instance belongs to
+        name -- Name of the plugin in the registry (Api, Db, etc.)
+
+        Plugins are built while holding the plugins_lock of the State, and are only shared
+        once they are fully built, so threads using a plugin for the first time all get
+        the same finished instance.
+        """
+        with state.plugins_lock:
+            if name not in state.plugins:
+                state.plugins[name] = cls.registry.get(name)(state)
+            return state.plugins[name]
+
+    def _load_plugins(self, plugins):
+        """Attach the shared instances of other plugins to this one
+
+        Arguments:
+        plugins -- List of plugin names this plugin depends on
+        """
+        for plugin in plugins:
+            setattr(self, plugin.lower(), self._get_plugin(self.state, plugin))
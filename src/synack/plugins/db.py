@@ -3,33 +3,37 @@
 Manipulates/Reads the database and provides it to other plugins
 """
 
-import alembic.config
-import alembic.command
-import sqlalchemy as sa
+import contextlib
+import threading
 
 from pathlib import Path
-from sqlalchemy.orm import sessionmaker
-from synack.db.models import Target
-from synack.db.models import Config
-from synack.db.models import Category
-from synack.db.models import IP
-from synack.db.models import Organization
-from synack.db.models import Port
-from synack.db.models import Url
 
 from .base import Plugin
 
+# Imported by the first Db that is built rather than with synack, as they pull in sqlalchemy
+models = None
+sa = None
+
 
 class Db(Plugin):
     def __init__(self, *args, **kwargs):
+        global models, sa
+        import sqlalchemy as sa
+        from sqlalchemy.orm import sessionmaker
+        from synack.db import HEAD_REVISION, models
+
         super().__init__(*args, **kwargs)
         self.sqlite_db = self.state.config_dir / 'synackapi.db'
+        self._config = None
+        self._config_batch = threading.local()
+        self.config_version = 0
 
-        self.set_migration()
+        self.engine = sa.create_engine(f'sqlite:///{str(self.sqlite_db)}')
+        sa.event.listen(self.engine, 'connect', self._fk_pragma_on_connect)
+        self.Session = sessionmaker(bind=self.engine)
 
-        engine = sa.create_engine(f'sqlite:///{str(self.sqlite_db)}')
-        sa.event.listen(engine, 'connect', self._fk_pragma_on_connect)
-        self.Session = sessionmaker(bind=engine)
+        if self.get_migration() != HEAD_REVISION:
+            self.set_migration()
 
     @staticmethod
     def _fk_pragma_on_connect(dbapi_con, con_record):
@@ -37,11 +41,11 @@ class Db(Plugin):
 
     def add_categories(self, categories):
         session = self.Session()
-        q = session.query(Category)
+        q = session.query(models.Category)
         for c in categories:
             db_c = q.filter_by(id=c.get('category_id')).first()
             if not db_c:
-                db_c = Category(id=c['category_id'])
+                db_c = models.Category(id=c['category_id'])
                 session.add(db_c)
             db_c.name = c['category_name']
             db_c.passed_practical = c['practical_assessment']['passed']
@@ -54,16 +58,16 @@ class Db(Plugin):
         if session is None:
             session = self.Session()
             close = True
-        q = session.query(IP)
+        q = session.query(models.IP)
         for result in results:
             if result.get('ip'):
                 filt = sa.and_(
-                    IP.ip.like(result.get('ip')),
-                    IP.target.like(result.get('target'))
+                    models.IP.ip.like(result.get('ip')),
+                    models.IP.target.like(result.get('target'))
                 )
                 db_ip = q.filter(filt).first()
                 if not db_ip:
-                    db_ip = IP(
+                    db_ip = models.IP(
                         ip=result.get('ip'),
                         target=result.get('target'))
                     session.add(db_ip)
@@ -71,12 +75,22 @@ class Db(Plugin):
             session.commit()
             session.close()
 
+    def add_missions(self, missions):
+        """Remember the status and payout of missions that have been seen"""
+        session = self.Session()
+        for m in missions:
+            session.merge(models.Mission(id=m['id'],
+                                         payout=float(m['payout']['amount']),
+                                         status=m['status']))
+        session.commit()
+        session.close()
+
     def add_organizations(self, targets, session=None):
         close = False
         if session is None:
             session = self.Session()
             close = True
-        q = session.query(Organization)
+        q = session.query(models.Organization)
         for t in targets:
             if t.get('organization'):
                 slug = t['organization']['slug']
@@ -84,7 +98,7 @@ class Db(Plugin):
                 slug = t.get('organization_id')
             db_o = q.filter_by(slug=slug).first()
             if not db_o:
-                db_o = Organization(slug=slug)
+                db_o = models.Organization(slug=slug)
                 session.add(db_o)
         if close:
             session.commit()
@@ -93,21 +107,21 @@ class Db(Plugin):
     def add_ports(self, results):
         self.add_ips(results)
         session = self.Session()
-        q = session.query(Port)
-        ips = session.query(IP)
+        q = session.query(models.Port)
+        ips = session.query(models.IP)
         for result in results:
             ip = ips.filter_by(ip=result.get('ip'))
             if ip:
                 ip = ip.first()
                 for port in result.get('ports', []):
                     filt = sa.and_(
-                        Port.port.like(port.get('port')),
-                        Port.protocol.like(port.get('protocol')),
-                        Port.ip.like(ip.id),
-                        Port.source.like(result.get('source')))
+                        models.Port.port.like(port.get('port')),
+                        models.Port.protocol.like(port.get('protocol')),
+                        models.Port.ip.like(ip.id),
+                        models.Port.source.like(result.get('source')))
                     db_port = q.filter(filt)
                     if not db_port:
-                        db_port = Port(
+                        db_port = models.Port(
                             port=port.get('port'),
                             protocol=port.get('protocol'),
                             service=port.get('service'),
@@ -128,7 +142,7 @@ class Db(Plugin):
     def add_targets(self, targets, **kwargs):
         session = self.Session()
         self.add_organizations(targets, session)
-        q = session.query(Target)
+        q = session.query(models.Target)
         for t in targets:
             if t.get('organization'):
                 org_slug = t['organization']['slug']
@@ -137,7 +151,7 @@ class Db(Plugin):
             slug = t.get('slug', t.get('id'))
             db_t = q.filter_by(slug=slug).first()
             if not db_t:
-                db_t = Target(slug=slug)
+                db_t = models.Target(slug=slug)
                 session.add(db_t)
             for k in t.keys():
                 setattr(db_t, k, t[k])
@@ -157,21 +171,21 @@ class Db(Plugin):
     def add_urls(self, results, **kwargs):
         self.add_ips(results)
         session = self.Session()
-        q = session.query(Url)
-        ips = session.query(IP)
+        q = session.query(models.Url)
+        ips = session.query(models.IP)
         for result in results:
             ip = ips.filter_by(ip=result.get('ip')).first()
             for url in result.get('urls', []):
                 if ip:
                     filt = sa.and_(
-                        Url.url.like(url.get('url')),
-                        Url.ip.like(ip.id))
+                        models.Url.url.like(url.get('url')),
+                        models.Url.ip.like(ip.id))
                 else:
                     filt = sa.and_(
-                        Url.url.like(url.get('url')))
+                        models.Url.url.like(url.get('url')))
                 db_url = q.filter(filt).first()
                 if not db_url:
-                    db_url = Url()
+                    db_url = models.Url()
                 db_url.url = url.get('url')
                 db_url.screenshot_url = url.get('screenshot_url')
                 if ip:
@@ -188,10 +202,24 @@ class Db(Plugin):
     def api_token(self, value):
         self.set_config('api_token', value)
 
+    @contextlib.contextmanager
+    def batch_configs(self):
+        """Collect config changes made in this thread and write them in one transaction"""
+        if getattr(self._config_batch, 'values', None) is not None:
+            yield self._config_batch.values
+            return
+        self._config_batch.values = dict()
+        try:
+            yield self._config_batch.values
+            values = self._config_batch.values
+        finally:
+            self._config_batch.values = None
+        self.set_configs(**values)
+
     @property
     def categories(self):
         session = self.Session()
-        categories = session.query(Category).all()
+        categories = session.query(models.Category).all()
         session.close()
         return categories
 
@@ -225,12 +253,12 @@ class Db(Plugin):
 
     def find_ips(self, ip=None, **kwargs):
         session = self.Session()
-        query = session.query(IP)
+        query = session.query(models.IP)
 
         if ip:
             query = query.filter_by(ip=ip)
 
-        query = query.join(Target)
+        query = query.join(models.Target)
         if kwargs:
             query = query.filter_by(**kwargs)
 
@@ -250,7 +278,7 @@ class Db(Plugin):
 
     def find_ports(self, port=None, protocol=None, source=None, ip=None, **kwargs):
         session = self.Session()
-        query = session.query(Port)
+        query = session.query(models.Port)
         if port:
             query = query.filter_by(port=port)
         if protocol:
@@ -258,11 +286,11 @@ class Db(Plugin):
         if source:
             query = query.filter_by(source=source)
 
-        query = query.join(IP)
+        query = query.join(models.IP)
         if ip:
             query = query.filter_by(ip=ip)
 
-        query = query.join(Target)
+        query = query.join(models.Target)
         if kwargs:
             query = query.filter_by(**kwargs)
 
@@ -282,7 +310,7 @@ class Db(Plugin):
 
         ret = list()
         for ip_id in ips.keys():
-            ip = session.query(IP).filter_by(id=ip_id).first()
+            ip = session.query(models.IP).filter_by(id=ip_id).first()
             ret.append({
                 "ip": ip.ip,
                 "target": ip.target,
@@ -295,22 +323,22 @@ class Db(Plugin):
 
     def find_targets(self, **kwargs):
         session = self.Session()
-        targets = session.query(Target).filter_by(**kwargs).all()
+        targets = session.query(models.Target).filter_by(**kwargs).all()
         session.expunge_all()
         session.close()
         return targets
 
     def find_urls(self, url=None, ip=None, **kwargs):
         session = self.Session()
-        query = session.query(Url)
+        query = session.query(models.Url)
         if url:
             query = query.filter_by(url=url)
 
-        query = query.join(IP)
+        query = query.join(models.IP)
         if ip:
             query = query.filter_by(ip=ip)
 
-        query = query.join(Target)
+        query = query.join(models.Target)
         if kwargs:
             query = query.filter_by(**kwargs)
 
@@ -326,7 +354,7 @@ class Db(Plugin):
 
         ret = list()
         for ip_id in ips.keys():
-            ip = session.query(IP).filter_by(id=ip_id).first()
+            ip = session.query(models.IP).filter_by(id=ip_id).first()
             ret.append({
                 "ip": ip.ip,
                 "target": ip.target,
@@ -338,13 +366,31 @@ class Db(Plugin):
         return ret
 
     def get_config(self, name=None):
-        session = self.Session()
-        config = session.query(Config).filter_by(id=1).first()
-        if not config:
-            config = Config()
-            session.add(config)
-        session.close()
-        return getattr(config, name) if name else config
+        if self._config is None:
+            session = self.Session()
+            config = session.query(models.Config).filter_by(id=1).first()
+            if not config:
+                config = models.Config()
+                session.add(config)
+            session.close()
+            self._config = config
+            self.config_version += 1
+        if name:
+            # A thread sees the changes it has made in a batch before they are written
+            pending = getattr(self._config_batch, 'values', None)
+            if pending and name in pending:
+                return pending[name]
+            return getattr(self._config, name)
+        return self._config
+
+    def get_migration(self):
+        """Return the revision the database schema is currently at"""
+        try:
+            with self.engine.connect() as connection:
+                query = sa.text('SELECT version_num FROM alembic_version')
+                return connection.execute(query).scalar()
+        except sa.exc.OperationalError:
+            return None
 
     @property
     def http_proxy(self):
@@ -365,10 +411,17 @@ class Db(Plugin):
     @property
     def ips(self):
         session = self.Session()
-        ips = session.query(IP).all()
+        ips = session.query(models.IP).all()
         session.close()
         return ips
 
+    @property
+    def missions(self):
+        session = self.Session()
+        missions = session.query(models.Mission).all()
+        session.close()
+        return missions
+
     @property
     def notifications_token(self):
         return self.get_config('notifications_token')
@@ -413,7 +466,7 @@ class Db(Plugin):
     @property
     def ports(self):
         session = self.Session()
-        ports = session.query(Port).all()
+        ports = session.query(models.Port).all()
         session.close()
         return ports
 
@@ -434,9 +487,21 @@ class Db(Plugin):
             'https': https_proxy
         }
 
+    def reload(self):
+        """Drop cached config values and read them from the database again"""
+        self._config = None
+        return self.get_config()
+
+    def remove_missions(self, ids):
+        """Forget missions that are no longer listed"""
+        session = self.Session()
+        session.query(models.Mission).filter(models.Mission.id.in_(ids)).delete(synchronize_session=False)
+        session.commit()
+        session.close()
+
     def remove_targets(self, **kwargs):
         session = self.Session()
-        session.query(Target).filter_by(**kwargs).delete()
+        session.query(models.Target).filter_by(**kwargs).delete()
         session.commit()
         session.close()
 
@@ -454,16 +519,32 @@ class Db(Plugin):
         self.set_config('scratchspace_dir', value)
 
     def set_config(self, name, value):
+        self.set_configs(**{name: value})
+
+    def set_configs(self, **values):
+        if getattr(self._config_batch, 'values', None) is not None:
+            self._config_batch.values.update(values)
+            return
+        if not values:
+            return
         session = self.Session()
-        config = session.query(Config).filter_by(id=1).first()
+        config = session.query(models.Config).filter_by(id=1).first()
         if not config:
-            config = Config()
+            config = models.Config()
             session.add(config)
-        setattr(config, name, value)
+        for name, value in values.items():
+            setattr(config, name, value)
         session.commit()
+        session.refresh(config)
+        session.expunge(config)
         session.close()
+        self._config = config
+        self.config_version += 1
 
     def set_migration(self):
+        import alembic.command
+        import alembic.config
+
         db_folder = Path(__file__).parent.parent / 'db'
 
         config = alembic.config.Config()
@@ -541,7 +622,7 @@ class Db(Plugin):
     @property
     def targets(self):
         session = self.Session()
-        targets = session.query(Target).all()
+        targets = session.query(models.Target).all()
         session.close()
         return targets
 
@@ -561,7 +642,7 @@ class Db(Plugin):
     @property
     def urls(self):
         session = self.Session()
-        urls = session.query(Url).all()
+        urls = session.query(models.Url).all()
         session.close()
         return urls
 
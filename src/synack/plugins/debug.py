@@ -3,20 +3,105 @@
 Defines the methods to increase verbosity and aid in debugging
 """
 
-from datetime import datetime
+import atexit
+import logging
+import logging.handlers
+import queue
+import re
+import sys
 
 from .base import Plugin
 
+# Every debug message is sent to a child of this logger for its State (synack.<id>), and reaches
+# this one from there, so other handlers can be attached to it as well
+LOGGER_NAME = 'synack'
+# Name given to the handler this Plugin attaches, so it is only ever attached once
+HANDLER_NAME = 'synack-debug'
+FORMAT = '%(asctime)s -- %(title)s\n\t%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Secrets that are replaced with REDACTED before a message is written
+SECRETS = [
+    re.compile(r'(bearer\s+)[^\s\'"]+', re.IGNORECASE),
+    re.compile(r'([\'"][\w-]*(?:token|password|secret|otp)[\'"]\s*:\s*[\'"])[^\'"]*', re.IGNORECASE)
+]
+
+
+class Payload:
+    """Argument of a debug message, redacted and truncated only if the message is written"""
+    def __init__(self, value, max_length=None):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        if type(self.value) is bytes:
+            text = self.value.decode('utf-8', errors='replace')
+        else:
+            text = str(self.value)
+        for secret in SECRETS:
+            text = secret.sub(r'\1REDACTED', text)
+        if self.max_length and len(text) > self.max_length:
+            text = f'{text[:self.max_length]}... ({len(text) - self.max_length} more characters)'
+        return text
+
 
 class Debug(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
-
-    def log(self, title, message):
-        if self.db.debug:
-            t = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
-            print(f'{t} -- {title.upper()}\n\t{message}')
+        self._load_plugins(['Db'])
+        self._destination = None
+        self._listener = None
+        # Handlers with a different debug_file each need a logger of their own to attach a handler to
+        self.logger = logging.getLogger(f'{LOGGER_NAME}.{id(self.state)}')
+
+    def _set_handler(self):
+        """Attach the handler writing debug messages to stdout, or to state.debug_file through a queue"""
+        destination = self.state.debug_file
+        if self._destination == (destination,):
+            return
+        for handler in [h for h in self.logger.handlers if h.name == HANDLER_NAME]:
+            self.logger.removeHandler(handler)
+        if self._listener:
+            atexit.unregister(self._listener.stop)
+            self._listener.stop()
+            self._listener = None
+
+        formatter = logging.Formatter(FORMAT, DATE_FORMAT)
+        if destination:
+            file_handler = logging.FileHandler(destination)
+            file_handler.setFormatter(formatter)
+            records = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(records, file_handler)
+            self._listener.start()
+            atexit.register(self._listener.stop)
+            handler = logging.handlers.QueueHandler(records)
+        else:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(formatter)
+        handler.name = HANDLER_NAME
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.DEBUG)
+        # The messages are already written here, so handlers on the root logger would only write them again
+        logging.getLogger(LOGGER_NAME).propagate = False
+        self._destination = (destination,)
+
+    @property
+    def enabled(self) -> bool:
+        if self.state.debug is not None:
+            return bool(self.state.debug)
+        return bool(self.db.debug)
+
+    def log(self, title, message, *args):
+        """Log a debug message if debugging is enabled
+
+        Arguments:
+        title -- Title of the message, shown in capital letters
+        message -- Message, with %s wherever one of args should go
+        args -- Values for the message, which are only formatted if it is written
+                Bearer tokens, passwords, etc. are redacted and long values are truncated
+        """
+        if self.enabled:
+            self._set_handler()
+            max_length = self.state.debug_max_length
+            self.logger.debug(message,
+                              *[Payload(arg, max_length) for arg in args],
+                              extra={'title': title.upper()})
@@ -3,9 +3,6 @@
 Functions dealing with hydra
 """
 
-import json
-import time
-
 from .base import Plugin
 from datetime import datetime
 
@@ -13,10 +10,7 @@ from datetime import datetime
 class Hydra(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db'])
 
     def build_db_input(self, results):
         """Format the Hydra output so that it can be ingested into the DB"""
@@ -57,25 +51,23 @@ class Hydra(Plugin):
     def get_hydra(self, page=1, max_page=5, update_db=True, **kwargs):
         """Get Hydra results for target identified using kwargs (codename='x', slug='x', etc.)"""
         max_page = 1000 if max_page == 0 else max_page
-        results = list()
+        target = None
         targets = self.db.find_targets(**kwargs)
         if targets:
             target = targets[0]
         if target:
             query = {
-                'page': page,
                 'listing_uids': target.slug,
                 'q': '+port_is_open:true'
             }
-            time.sleep(page*0.01)
-            res = self.api.request('GET',
-                                   'hydra_search/search',
-                                   query=query)
-            if res.status_code == 200:
-                curr_results = json.loads(res.content)
-                results.extend(curr_results)
-                if len(curr_results) == 10 and page < max_page:
-                    results.extend(self.get_hydra(page=page+1, max_page=max_page, **kwargs))
+            results = list(self.api.paginate('GET',
+                                             'hydra_search/search',
+                                             page=page,
+                                             per_page=10,
+                                             max_pages=max_page,
+                                             per_page_param=None,
+                                             prefetch=True,
+                                             query=query))
             if update_db:
                 self.db.add_ports(self.build_db_input(results))
             return results
@@ -0,0 +1,49 @@
+"""plugins/metrics.py
+
+Functions to view and export metrics of the requests sent to Synack
+"""
+
+import os
+import pathlib
+import tempfile
+
+from .base import Plugin
+from synack._metrics import serve_prometheus
+
+
+class Metrics(Plugin):
+    def clear(self):
+        """Forget every request recorded so far"""
+        self.state.request_metrics.clear()
+
+    def get_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        return self.state.request_metrics.to_prometheus()
+
+    def get_snapshot(self):
+        """Return the count, status codes, bytes received and latency percentiles of each endpoint"""
+        return self.state.request_metrics.snapshot()
+
+    def set_prometheus_file(self, path):
+        """Write the metrics in the Prometheus text format to a file
+
+        The file is replaced in one step, so a collector reading it never sees half of it.
+
+        Arguments:
+        path -- Location of the file (node_exporter textfile collectors read *.prom files)
+        """
+        path = pathlib.Path(path).expanduser().resolve()
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(self.get_prometheus())
+        os.replace(tmp, path)
+        return path
+
+    def set_prometheus_server(self, port, host='127.0.0.1'):
+        """Serve the metrics over HTTP for Prometheus to scrape, from a background thread
+
+        Arguments:
+        port -- Port to listen on (0 picks a free one)
+        host -- Address to listen on
+        """
+        return serve_prometheus(self.state.request_metrics, host, port)
@@ -3,21 +3,48 @@
 Functions related to handling, viewing, claiming, etc. missions
 """
 
+import concurrent.futures
+import functools
+import math
 import operator
 import random
+import threading
 
 from datetime import datetime
 
 from .base import Plugin
+from synack._watcher import MissionWatcher
+
+# Prepared claims kept by build_claims(), so a long-running watcher does not keep one for every mission it saw
+MAX_CLAIMS = 100
 
 
 class Missions(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db', 'Targets', 'Templates']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db', 'Debug', 'Targets', 'Templates'])
+        self._claims = dict()
+        self._seen = None
+        self._seen_lock = threading.Lock()
+
+    def build_claims(self, missions):
+        """Prepare the requests claiming missions, so set_claimed() only has to send them
+
+        Each prepared claim is used once, and is dropped if the API token changes before it is sent.
+        Only the MAX_CLAIMS most recently prepared claims are kept.
+
+        Arguments:
+        missions -- A list of missions likely to be claimed
+        """
+        token = self.db.api_token
+        for mission in missions:
+            prepared = self.api.prepare('POST', self._build_transition_path(mission), data={"type": "CLAIM"})
+            self._claims.pop(mission["id"], None)
+            self._claims[mission["id"]] = (token, prepared)
+        for mission_id, (claim_token, prepared) in list(self._claims.items()):
+            if claim_token != token or len(self._claims) > MAX_CLAIMS:
+                self._claims.pop(mission_id, None)
+        return len(missions)
 
     def build_order(self, missions, sort="payout-high"):
         """Sort a list of missions by what's desired first
@@ -77,10 +104,101 @@ class Missions(Plugin):
             ret['value'] = ret['value'] + m['payout']['amount']
         return ret
 
+    def diff(self, missions):
+        """Compare a listing of missions with the one given last time, and remember it for next time
+
+        The IDs, statuses and payouts of the missions are kept in the Database, so this carries on
+        where it left off when a script is started again. Only the differences are written.
+
+        Arguments:
+        missions -- A list of missions, holding every mission that should be remembered
+                    Missions seen last time but not in this list are reported as gone
+        """
+        current = {m['id']: (m['status'], float(m['payout']['amount'])) for m in missions}
+        with self._seen_lock:
+            if self._seen is None:
+                self._seen = {m.id: (m.status, m.payout) for m in self.db.missions}
+            seen = self._seen
+            ret = {
+                'new': [m for m in missions if m['id'] not in seen],
+                'changed': [m for m in missions if m['id'] in seen and seen[m['id']] != current[m['id']]],
+                'gone': [{'id': i, 'status': s, 'payout': p} for i, (s, p) in seen.items() if i not in current]
+            }
+            if ret['new'] or ret['changed']:
+                self.db.add_missions(ret['new'] + ret['changed'])
+            if ret['gone']:
+                self.db.remove_missions([m['id'] for m in ret['gone']])
+            self._seen = current
+        return ret
+
+    @staticmethod
+    def _build_query(status, page, per_page, listing_uids):
+        """Return the query string used to get a page of missions"""
+        query = {
+                'status': status,
+                'perPage': per_page,
+                'page': page,
+                'viewed': "true"
+        }
+        if listing_uids:
+            query["listingUids"] = listing_uids
+        return query
+
+    @staticmethod
+    def _build_status(mission, status, res):
+        """Return the result of a transition of a mission"""
+        return {
+            "target": mission["listingUid"],
+            "title": mission["title"],
+            "payout": str(mission["payout"]["amount"]),
+            "status": status,
+            "success": True if res.status_code == 201 else False
+        }
+
+    @staticmethod
+    def _build_transition_path(mission):
+        """Return the endpoint transitioning (claiming, disclaiming, etc.) a mission"""
+        return f'tasks/v1/organizations/{mission["organizationUid"]}/listings/{mission["listingUid"]}' + \
+            f'/campaigns/{mission["campaignUid"]}/tasks/{mission["id"]}/transitions'
+
+    @staticmethod
+    def _get_next_pages(res, missions, page, per_page, max_pages):
+        """Return the pages left to get after a page of missions
+
+        None is returned when the response has no x-count header,
+        in which case the remaining pages are walked with api.paginate().
+
+        Arguments:
+        res -- Response of the page just received
+        missions -- Missions of the page just received
+        page -- Number of the page just received
+        per_page -- Missions requested per page
+        max_pages -- Number of the last page to get
+        """
+        if len(missions) < per_page or page >= max_pages:
+            return []
+        count = res.headers.get('x-count')
+        if count is None:
+            return None
+        last = min(max_pages, math.ceil(int(count) / per_page))
+        return list(range(page+1, last+1))
+
+    def _get_page(self, status, page, per_page, listing_uids):
+        """Return a single page of missions, or None if the request fails"""
+        res = self.api.request('GET',
+                               'tasks/v2/tasks',
+                               query=self._build_query(status, page, per_page, listing_uids))
+        if res.status_code == 200:
+            return res.json()
+
     def get(self, status="PUBLISHED",
             max_pages=1, page=1, per_page=20, listing_uids=None):
         """Get a list of missions given a status
 
+        The first page tells how many missions there are (x-count),
+        after which the remaining pages are requested concurrently.
+        Returns None if any page could not be fetched, as a partial list would look like missions are gone.
+
         Arguments:
         status -- String matching the type of missions
                   (PUBLISHED, CLAIMED, FOR_REVIEW, APPROVED)
@@ -91,25 +209,38 @@ class Missions(Plugin):
                     (Bad: per_page=5000, per_page=1&max_pages=10)
         listing_uids -- A specific listing ID to check for missions
         """
-        query = {
-                'status': status,
-                'perPage': per_page,
-                'page': page,
-                'viewed': "true"
-        }
-        if listing_uids:
-            query["listingUids"] = listing_uids
         res = self.api.request('GET',
                                'tasks/v2/tasks',
-                               query=query)
+                               query=self._build_query(status, page, per_page, listing_uids))
         if res.status_code == 200:
             ret = res.json()
-            if len(ret) == per_page and page < max_pages:
-                new = self.get(status,
-                               max_pages,
-                               page+1,
-                               per_page)
-                ret.extend(new)
+            pages = self._get_next_pages(res, ret, page, per_page, max_pages)
+            if pages is None:
+                import requests
+
+                try:
+                    ret.extend(self.api.paginate('GET',
+                                                 'tasks/v2/tasks',
+                                                 page=page+1,
+                                                 per_page=per_page,
+                                                 max_pages=max_pages,
+                                                 prefetch=True,
+                                                 strict=True,
+                                                 query=self._build_query(status, page+1, per_page, listing_uids)))
+                except requests.HTTPError:
+                    return None
+            elif pages:
+                get_page = functools.partial(self._get_page,
+                                             status,
+                                             per_page=per_page,
+                                             listing_uids=listing_uids)
+                workers = max(1, min(self.state.page_workers, len(pages)))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(get_page, pages))
+                if None in results:
+                    return None
+                for missions in results:
+                    ret.extend(missions)
             return ret
 
     def get_approved(self):
@@ -166,6 +297,18 @@ class Missions(Plugin):
         """Get a list of missions currently in review"""
         return self.get("FOR_REVIEW")
 
+    def get_new(self, max_pages=50):
+        """Get the available missions that were not available the last time this (or diff()) was called
+
+        Returns None if the missions could not be fetched.
+
+        Arguments:
+        max_pages -- Maximum number of pages of available missions to fetch
+        """
+        missions = self.get("PUBLISHED", max_pages=max_pages)
+        if missions is not None:
+            return self.diff(missions)['new']
+
     def get_wallet_claimed(self):
         """Get Current Claimed Amount for Mission Wallet"""
         res = self.api.request('GET',
@@ -183,9 +326,17 @@ class Missions(Plugin):
     def set_claimed(self, mission):
         """Try to claim a single mission
 
+        If build_claims() prepared a claim for the mission, that claim is sent.
+
         Arguments:
         mission -- A single mission
         """
+        if self._claims:
+            token, prepared = self._claims.pop(mission["id"], (None, None))
+            if prepared and token == self.db.api_token:
+                res = self.api.send_prepared(prepared)
+                if res.status_code != 401:
+                    return self._build_status(mission, "CLAIM", res)
         return self.set_status(mission, "CLAIM")
 
     def set_disclaimed(self, mission):
@@ -234,25 +385,26 @@ class Missions(Plugin):
         data = {
             "type": status
         }
-        orgId = mission["organizationUid"]
-        listingId = mission["listingUid"]
-        campaignId = mission["campaignUid"]
-        taskId = mission["id"]
-        payout = str(mission["payout"]["amount"])
-        title = mission["title"]
-
         res = self.api.request('POST',
-                               'tasks/v1' +
-                               '/organizations/' + orgId +
-                               '/listings/' + listingId +
-                               '/campaigns/' + campaignId +
-                               '/tasks/' + taskId +
-                               '/transitions',
+                               self._build_transition_path(mission),
                                data=data)
-        return {
-            "target": listingId,
-            "title": title,
-            "payout": payout,
-            "status": status,
-            "success": True if res.status_code == 201 else False
-        }
+        return self._build_status(mission, status, res)
+
+    def watch(self, callback=None, block=True, **kwargs):
+        """Watch for new missions, and call callback with each list of them
+
+        The number of missions is polled with a cheap HEAD request, and the missions are only
+        fetched when it changes. The wait between polls adapts to the time of day and recent drops.
+
+        Arguments:
+        callback -- Function called with each list of new missions
+        block -- Poll in this thread until watcher.stop() is called (from a callback, etc.)
+                 If False, poll from a background thread and return right away
+        kwargs -- Passed to MissionWatcher (status, listing_uids, interval, min_interval,
+                  max_interval, busy_hours, prepare_claims)
+        """
+        watcher = MissionWatcher(self, [callback] if callback else None, **kwargs)
+        if block:
+            watcher.run()
+            return watcher
+        return watcher.start()
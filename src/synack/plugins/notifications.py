@@ -9,10 +9,7 @@ from .base import Plugin
 class Notifications(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db'])
 
     def get(self):
         """Get a list of recent notifications"""
@@ -3,18 +3,84 @@
 This contains the Templates class
 """
 
+import hashlib
 import json
+import os
 
 from .base import Plugin
 
+# Bytes written to disk at a time while downloading
+CHUNK_SIZE = 1024 * 1024
+
 
 class Scratchspace(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db'])
+
+    def _download(self, url, dest_file, checksum=None):
+        """Stream a file into place through a .part file, resuming it if the download was interrupted
+
+        A .part file is only resumed when the ETag or Last-Modified it was downloaded with was kept beside it,
+        and that validator is sent as If-Range, so a file that changed since is downloaded again from the start.
+        """
+        import requests
+
+        part = dest_file.with_name(f'{dest_file.name}.part')
+        validator = dest_file.with_name(f'{dest_file.name}.part.validator')
+        for attempt in range(self.state.max_retries + 1):
+            offset = part.stat().st_size if part.exists() and validator.exists() else 0
+            headers = {'Range': f'bytes={offset}-', 'If-Range': validator.read_text()} if offset else None
+            res = self.api.request('GET', url, headers=headers, stream=True)
+            try:
+                if res.status_code == 416:
+                    if offset and res.headers.get('Content-Range') == f'bytes */{offset}':
+                        break
+                    part.unlink(missing_ok=True)
+                    validator.unlink(missing_ok=True)
+                    continue
+                if res.status_code not in [200, 206]:
+                    return False
+                if res.status_code == 200:
+                    self._set_validator(validator, res)
+                with open(part, 'ab' if res.status_code == 206 else 'wb') as fp:
+                    for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                        fp.write(chunk)
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                continue
+            finally:
+                res.close()
+        else:
+            return False
+
+        validator.unlink(missing_ok=True)
+        if checksum:
+            algorithm, _, expected = checksum.rpartition(':')
+            algorithm = algorithm or 'sha256'
+            if self.build_checksum(part, algorithm) != f'{algorithm}:{expected.lower()}':
+                part.unlink()
+                return False
+        os.replace(part, dest_file)
+        return True
+
+    @staticmethod
+    def _set_validator(validator, res):
+        """Keep the strong ETag or Last-Modified of a download beside its .part file, for If-Range to resume it"""
+        etag = res.headers.get('ETag')
+        value = etag if etag and not etag.startswith('W/') else res.headers.get('Last-Modified')
+        if value:
+            validator.write_text(value)
+        else:
+            validator.unlink(missing_ok=True)
+
+    def build_checksum(self, path, algorithm='sha256'):
+        """Return the checksum of a file as algorithm:hexdigest without reading it all into memory"""
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return f'{algorithm}:{digest.hexdigest()}'
 
     def build_filepath(self, filename, target=None, codename=None):
         if target:
@@ -45,7 +111,9 @@ class Scratchspace(Plugin):
                 fp.write(content)
                 return dest_file
 
-    def set_download_attachments(self, attachments, target=None, codename=None, prompt_overwrite=True, overwrite=True):
+    def set_download_attachments(self, attachments, target=None, codename=None, prompt_overwrite=True, overwrite=True,
+                                 checksums=None):
+        checksums = checksums or dict()
         downloads = list()
         for attachment in attachments:
             overwrite_current = overwrite
@@ -55,11 +123,9 @@ class Scratchspace(Plugin):
                     ans = input(f'{attachment.get("filename")} exists. Overwrite? [y/N]: ')
                     overwrite_current = ans.lower().startswith('y')
                 if overwrite_current or not dest_file.exists():
-                    res = self.api.request('GET', attachment.get('url'))
-                    if res.status_code == 200:
-                        with open(dest_file, 'wb') as fp:
-                            fp.write(res.content)
-                            downloads.append(dest_file)
+                    checksum = checksums.get(attachment.get('filename'))
+                    if self._download(attachment.get('url'), dest_file, checksum):
+                        downloads.append(dest_file)
         return downloads
 
     def set_hosts_file(self, content, target=None, codename=None):
@@ -4,6 +4,7 @@ Functions related to handling and checking targets
 """
 
 import ipaddress
+import json
 import re
 
 from urllib.parse import urlparse
@@ -13,10 +14,7 @@ from .base import Plugin
 class Targets(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db', 'Scratchspace']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db', 'Scratchspace'])
 
     def build_codename_from_slug(self, slug):
         """Return a codename for a target given its slug
@@ -33,6 +31,21 @@ class Targets(Plugin):
             codename = targets[0].codename
         return codename
 
+    def build_scope_host(self, assets):
+        """Return the active IPv4 networks from the assets of a Host target"""
+        scope = set()
+        for asset in assets:
+            if asset.get('active'):
+                try:
+                    ipaddress.IPv4Network(asset.get('location'))
+                    scope.add(asset.get('location'))
+                except ipaddress.AddressValueError:
+                    # Not actually an IP
+                    pass
+
+        scope.discard(None)
+        return scope
+
     def build_scope_host_db(self, slug, scope):
         """Return a Host Scope that can be ingested into the Database"""
         ret = list()
@@ -44,6 +57,24 @@ class Targets(Plugin):
                 })
         return ret
 
+    def build_scope_web(self, assets):
+        """Return the scope rules from the assets of a Web target"""
+        scope = list()
+        for asset in assets:
+            if asset.get('active'):
+                location = next(iter(re.split(r' \(', asset.get('location', ''))))
+                for listing in asset.get('listings', []):
+                    status = listing.get('scope')
+                    listing = listing.get('listingUid')
+                    for rule in asset.get('scopeRules', []):
+                        scope.append({
+                            'status': status,
+                            'listing': listing,
+                            'location': location,
+                            'rule': rule.get('rule')
+                        })
+        return scope
+
     def build_scope_web_burp(self, scope):
         """Return a Burp Suite scope given retrieved web scope"""
         ret = {'target': {'scope': {'advanced_mode': 'true', 'exclude': list(), 'include': list()}}}
@@ -135,16 +166,23 @@ class Targets(Plugin):
                 queries.append(f'active={active}')
             if sort_dir is not None:
                 queries.append(f'sortDir={sort_dir}')
-            if page is not None:
-                queries.append(f'page={page}')
-            if perPage is not None:
-                queries.append(f'perPage={perPage}')
 
-            res = self.api.request('GET', f'asset/v2/assets?{"&".join(queries)}')
-            if res.status_code == 200:
-                if self.db.use_scratchspace:
-                    self.scratchspace.set_assets_file(res.text, target=target)
-                return res.json()
+            import requests
+
+            try:
+                # Without perPage, Synack picks the page size, so only the one page is asked for
+                assets = list(self.api.paginate('GET',
+                                                f'asset/v2/assets?{"&".join(queries)}',
+                                                page=page or 1,
+                                                per_page=perPage,
+                                                max_pages=None if perPage else page or 1,
+                                                prefetch=True,
+                                                strict=True))
+            except requests.HTTPError:
+                return None
+            if assets and self.db.use_scratchspace:
+                self.scratchspace.set_assets_file(json.dumps(assets), target=target)
+            return assets
 
     def get_attachments(self, target=None, **kwargs):
         """Get the attachments of a target."""
@@ -265,16 +303,9 @@ class Targets(Plugin):
 
         if target:
             assets = self.get_assets(target=target, active='true', asset_type='host', host_type='cidr')
-            for asset in assets:
-                if asset.get('active'):
-                    try:
-                        ipaddress.IPv4Network(asset.get('location'))
-                        scope.add(asset.get('location'))
-                    except ipaddress.AddressValueError:
-                        # Not actually an IP
-                        pass
-
-            scope.discard(None)
+            if assets is None:
+                return None
+            scope = self.build_scope_host(assets)
 
             if len(scope) > 0:
                 if add_to_db:
@@ -299,19 +330,9 @@ class Targets(Plugin):
 
         if target:
             assets = self.get_assets(target=target, active='true', asset_type='webapp')
-            for asset in assets:
-                if asset.get('active'):
-                    location = next(iter(re.split(r' \(', asset.get('location', ''))))
-                    for listing in asset.get('listings', []):
-                        status = listing.get('scope')
-                        listing = listing.get('listingUid')
-                        for rule in asset.get('scopeRules', []):
-                            scope.append({
-                                'status': status,
-                                'listing': listing,
-                                'location': location,
-                                'rule': rule.get('rule')
-                            })
+            if assets is None:
+                return None
+            scope = self.build_scope_web(assets)
 
             if len(scope) > 0:
                 if add_to_db:
@@ -386,12 +407,18 @@ class Targets(Plugin):
             targets = self.get_unregistered()
         data = '{"ResearcherListing":{"terms":1}}'
         ret = []
-        for t in targets:
-            res = self.api.request('POST',
-                                   f'targets/{t["slug"]}/signup',
-                                   data=data)
-            if res.status_code == 200:
-                ret.append(t)
-        if len(targets) >= 15:
-            ret.extend(self.set_registered())
+        while targets:
+            registered = len(ret)
+            for t in targets:
+                res = self.api.request('POST',
+                                       f'targets/{t["slug"]}/signup',
+                                       data=data)
+                if res.status_code == 200:
+                    ret.append(t)
+            # A full page means more targets may be waiting after these,
+            # unless none of them could be registered and the same page would come back
+            if len(targets) >= 15 and len(ret) > registered:
+                targets = self.get_unregistered()
+            else:
+                targets = None
         return ret
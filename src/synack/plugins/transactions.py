@@ -11,10 +11,7 @@ from .base import Plugin
 class Transactions(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api'])
 
     def get_balance(self):
         """Get your current account balance and requested payout values"""
@@ -9,10 +9,7 @@ from .base import Plugin
 class Users(Plugin):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for plugin in ['Api', 'Db']:
-            setattr(self,
-                    plugin.lower(),
-                    self.registry.get(plugin)(self.state))
+        self._load_plugins(['Api', 'Db'])
 
     def get_profile(self, user_id="me"):
         """Get a user's profile"""
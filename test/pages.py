@@ -0,0 +1,47 @@
+"""pages.py
+
+Defines the request side_effects the tests use to answer paged endpoints
+"""
+
+import asyncio
+import time
+
+from unittest.mock import MagicMock
+
+
+def build_async_pages(pages, count=None, delays=None):
+    """Return an async request side_effect answering each page with its items, or a 500 if there is none
+
+    Arguments:
+    pages -- Items of each page, by page number
+    count -- Total number of items, sent in the x-count header
+    delays -- Seconds to wait before answering, by page number
+    """
+    async def request(method, path, query, **kwargs):
+        await asyncio.sleep((delays or dict()).get(query['page'], 0))
+        return build_page(pages, count, query['page'])
+    return request
+
+
+def build_page(pages, count, page):
+    """Return the response to a page, or a 500 if there is none"""
+    res = MagicMock()
+    res.status_code = 200 if page in pages else 500
+    if count is not None:
+        res.headers = {'x-count': count}
+    res.json.return_value = list(pages.get(page, []))
+    return res
+
+
+def build_pages(pages, count=None, delays=None):
+    """Return a request side_effect answering each page with its items, or a 500 if there is none
+
+    Arguments:
+    pages -- Items of each page, by page number
+    count -- Total number of items, sent in the x-count header
+    delays -- Seconds to wait before answering, by page number
+    """
+    def request(method, path, query, **kwargs):
+        time.sleep((delays or dict()).get(query['page'], 0))
+        return build_page(pages, count, query['page'])
+    return request
@@ -0,0 +1,43 @@
+"""test_adapter.py
+
+Tests for the PoolAdapter class
+"""
+
+import os
+import sys
+import unittest
+
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._adapter  # noqa: E402
+
+
+class PoolAdapterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.adapter = synack._adapter.PoolAdapter(pool_maxsize=3)
+
+    def test_counting_pool(self):
+        """Should only count requests sent on a connection without an open socket"""
+        pool = synack._adapter.CountingHTTPSConnectionPool('platform.synack.com')
+        conn = MagicMock(sock=None)
+        pool._validate_conn = MagicMock()
+        pool._make_request(conn, 'GET', '/')
+        conn.sock = MagicMock()
+        pool._make_request(conn, 'GET', '/')
+        self.assertEqual(1, pool.num_sockets)
+
+    def test_init_poolmanager(self):
+        """Should build pools which count their sockets"""
+        pool = self.adapter.poolmanager.connection_from_url('https://platform.synack.com')
+        self.assertIsInstance(pool, synack._adapter.CountingHTTPSConnectionPool)
+        self.assertEqual(3, pool.pool.maxsize)
+        self.assertEqual(0, pool.num_sockets)
+
+    def test_proxy_manager_for(self):
+        """Should build proxied pools which count their sockets"""
+        manager = self.adapter.proxy_manager_for('http://127.0.0.1:8080')
+        pool = manager.connection_from_url('http://platform.synack.com')
+        self.assertIsInstance(pool, synack._adapter.CountingHTTPConnectionPool)
+        self.assertIs(manager, self.adapter.proxy_manager_for('http://127.0.0.1:8080'))
@@ -3,15 +3,22 @@
 Tests for the plugins/api.py Api Class
 """
 
+import email.utils
 import os
+import requests
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, PropertyMock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '..')))
 
 import synack  # noqa: E402
+from pages import build_pages  # noqa: E402
 
 
 class ApiTestCase(unittest.TestCase):
@@ -21,6 +28,33 @@ class ApiTestCase(unittest.TestCase):
         self.api.debug = MagicMock()
         self.api.db = MagicMock()
 
+    def test_get_context_loaded(self):
+        """The context should be built once, even though the first read of the config bumps its version"""
+        self.api.db.config_version = 0
+        self.api.db.get_config.side_effect = lambda name=None: setattr(self.api.db, 'config_version', 1) or name
+        type(self.api.db).api_token = PropertyMock(side_effect=lambda: self.api.db.get_config('api_token'))
+        self.api.db.use_proxies = False
+        context = self.api._get_context()
+        self.assertEqual('Bearer api_token', context['headers']['Authorization'])
+        self.assertIs(context, self.api._get_context())
+
+    def test_get_retry_delay(self):
+        """Should wait as long as Retry-After asks, or back off exponentially"""
+        res = requests.models.Response()
+        self.assertEqual(0.5, self.api._get_retry_delay(res, 0))
+        self.assertEqual(2, self.api._get_retry_delay(res, 2))
+        self.assertEqual(60, self.api._get_retry_delay(res, 10))
+        res.headers['Retry-After'] = '3'
+        self.assertEqual(3, self.api._get_retry_delay(res, 2))
+        res.headers['Retry-After'] = '3600'
+        self.assertEqual(60, self.api._get_retry_delay(res, 0))
+        res.headers['Retry-After'] = email.utils.formatdate(time.time() + 10, usegmt=True)
+        self.assertAlmostEqual(10, self.api._get_retry_delay(res, 0), delta=1.5)
+        res.headers['Retry-After'] = email.utils.formatdate(time.time() - 10, usegmt=True)
+        self.assertEqual(0, self.api._get_retry_delay(res, 0))
+        res.headers['Retry-After'] = 'soon'
+        self.assertEqual(1, self.api._get_retry_delay(res, 1))
+
     def test_login_full_path(self):
         """Login Base URL should prepend and request should be made"""
         self.api.request = MagicMock()
@@ -76,6 +110,186 @@ class ApiTestCase(unittest.TestCase):
                                             url,
                                             headers=headers)
 
+    def test_paginate(self):
+        """Should yield the items of every page until a short page"""
+        self.api.request = MagicMock(side_effect=build_pages({1: [1, 2], 2: [3, 4], 3: [5], 4: [6]}))
+        ret = list(self.api.paginate('GET', 'tasks', per_page=2, query={'status': 'CLAIMED'}, headers={'a': 'b'}))
+        self.assertEqual([1, 2, 3, 4, 5], ret)
+        self.assertEqual(3, self.api.request.call_count)
+        self.api.request.assert_called_with('GET', 'tasks', query={'status': 'CLAIMED', 'perPage': 2, 'page': 3},
+                                            headers={'a': 'b'})
+
+    def test_paginate_failed(self):
+        """Should stop at the first page that fails or comes back empty"""
+        self.api.request = MagicMock(side_effect=build_pages({1: [1], 2: [2]}))
+        self.assertEqual([1, 2], list(self.api.paginate('GET', 'tasks')))
+        self.assertEqual(3, self.api.request.call_count)
+        self.api.request = MagicMock(side_effect=build_pages({1: [1], 2: []}))
+        self.assertEqual([1], list(self.api.paginate('GET', 'tasks')))
+
+    def test_paginate_max_pages(self):
+        """Should not request pages past max_pages, or send per_page without per_page_param"""
+        self.api.request = MagicMock(side_effect=build_pages({2: [1], 3: [2], 4: [3]}))
+        ret = list(self.api.paginate('GET', 'hydra', page=2, per_page=1, max_pages=3, per_page_param=None))
+        self.assertEqual([1, 2], ret)
+        self.api.request.assert_called_with('GET', 'hydra', query={'page': 3})
+
+    def test_paginate_prefetch(self):
+        """Should request the next page early, and nothing more once the caller stops"""
+        self.api.request = MagicMock(side_effect=build_pages({1: [1, 2], 2: [3, 4], 3: [5, 6]}))
+        pager = self.api.paginate('GET', 'tasks', per_page=2, prefetch=True)
+        self.assertEqual(1, next(pager))
+        time.sleep(0.1)
+        self.assertEqual(2, self.api.request.call_count)
+        pager.close()
+        self.assertEqual(2, self.api.request.call_count)
+        self.api.request.reset_mock()
+        self.assertEqual([1, 2, 3, 4, 5, 6], list(self.api.paginate('GET', 'tasks', per_page=2, prefetch=True)))
+        self.assertEqual(4, self.api.request.call_count)
+
+    def test_paginate_strict(self):
+        """Should raise at a page that fails when strict is set, but not at an empty one"""
+        self.api.request = MagicMock(side_effect=build_pages({1: [1]}))
+        with self.assertRaises(requests.HTTPError):
+            list(self.api.paginate('GET', 'tasks', strict=True))
+        self.api.request = MagicMock(side_effect=build_pages({1: [1], 2: []}))
+        self.assertEqual([1], list(self.api.paginate('GET', 'tasks', strict=True)))
+
+    def test_prepare(self):
+        """Should build a request with the headers of every request and a serialized body"""
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        prepared = self.api.prepare('post', 'test', data={'type': 'CLAIM'}, headers={'X-Test': '1'})
+        self.assertEqual('POST', prepared.method)
+        self.assertEqual('https://platform.synack.com/api/test', prepared.url)
+        self.assertEqual(b'{"type": "CLAIM"}', prepared.body)
+        self.assertEqual('Bearer 12345', prepared.headers['Authorization'])
+        self.assertEqual('paco', prepared.headers['user_id'])
+        self.assertEqual('1', prepared.headers['X-Test'])
+        self.assertIn('gzip', prepared.headers['Accept-Encoding'])
+        prepared = self.api.prepare('PUT', 'https://platform.synack.com/api/launchpoint', data={'listing_id': 'abc'})
+        self.assertEqual('https://platform.synack.com/api/launchpoint?listing_id=abc', prepared.url)
+        self.assertIsNone(prepared.body)
+        prepared = self.api.prepare('GET', 'test', query={'page': 2})
+        self.assertEqual('https://platform.synack.com/api/test?page=2', prepared.url)
+
+    def test_request_base_url(self):
+        """Requests to Synack hosts should be sent to base_url with their host in the Host header"""
+        self.api.state.session.get = MagicMock()
+        self.api.state.session.get.return_value.status_code = 200
+        self.api.state.session.get.return_value.content = b'[]'
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.state.base_url = 'http://127.0.0.1:8080'
+        headers = {
+            'Authorization': 'Bearer 12345',
+            'user_id': 'paco',
+            'Host': 'platform.synack.com'
+        }
+        self.api.request('GET', 'tasks/v2/tasks', query={'page': 1})
+        self.api.state.session.get.assert_called_with('http://127.0.0.1:8080/api/tasks/v2/tasks',
+                                                      headers=headers,
+                                                      proxies=None,
+                                                      params={'page': 1},
+                                                      stream=False,
+                                                      verify=True)
+        self.assertIn('GET platform.synack.com/api/tasks/v2/tasks', self.state.request_metrics.snapshot())
+        del headers['Host']
+        self.api.request('GET', 'https://hooks.slack.com/test')
+        self.api.state.session.get.assert_called_with('https://hooks.slack.com/test',
+                                                      headers=headers,
+                                                      proxies=None,
+                                                      params=None,
+                                                      stream=False,
+                                                      verify=True)
+
+    def test_request_cache(self):
+        """GET requests to endpoints with a TTL should use the response cache"""
+        self.api.state.cache_ttls = {'platform.synack.com/api/assessments': 60}
+        self.api.db.use_proxies = False
+        fetched = requests.models.Response()
+        fetched.status_code = 200
+        fetched.headers['ETag'] = '"abc"'
+        fetched._content = b'[1]'
+        not_modified = requests.models.Response()
+        not_modified.status_code = 304
+        self.api.state.session.get = MagicMock(side_effect=[fetched, not_modified])
+        self.assertEqual([1], self.api.request('GET', 'assessments').json())
+        self.assertEqual([1], self.api.request('GET', 'assessments').json())
+        self.assertEqual(1, self.api.state.session.get.call_count)
+        self.api.state.session.post = MagicMock()
+        self.api.request('POST', 'assessments/1', data={})
+        self.assertEqual([1], self.api.request('GET', 'assessments').json())
+        self.assertEqual('"abc"', self.api.state.session.get.call_args.kwargs['headers']['If-None-Match'])
+        self.assertEqual(2, self.api.state.session.get.call_count)
+
+    def test_request_cassette(self):
+        """Responses should be recorded to the cassette and then played back without a network"""
+        res = requests.models.Response()
+        res.status_code = 200
+        res.reason = 'OK'
+        res.url = 'https://platform.synack.com/api/profiles/me'
+        res._content = b'{"user_id": "paco"}'
+        self.api.state.session.post = MagicMock(return_value=res)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.api.state.cassette_file = os.path.join(tmp, 'cassette.jsonl')
+            self.api.state.cassette_mode = 'record'
+            self.api.request('POST', 'profiles/me', data={'a': 1})
+            self.api.state.cassette_mode = 'replay'
+            self.api.state.cassette_latency = 0.05
+            self.api.state.session.post = MagicMock(side_effect=requests.exceptions.ConnectionError)
+            start = time.monotonic()
+            replayed = self.api.request('POST', 'profiles/me', data={'a': 1})
+            self.assertGreaterEqual(time.monotonic() - start, 0.05)
+            self.assertEqual({'user_id': 'paco'}, replayed.json())
+            self.api.state.session.post.assert_not_called()
+            with self.assertRaises(LookupError):
+                self.api.request('POST', 'profiles/me', data={'a': 2})
+            self.api.state.cassette_file = None
+
+    def test_request_context_cached(self):
+        """Headers and proxies should not be rebuilt while the config is unchanged"""
+        self.api.state.session.get = MagicMock()
+        self.api.db.config_version = 1
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.request('GET', 'test')
+        self.api.db.api_token = "67890"
+        self.api.request('GET', 'test')
+        headers = self.api.state.session.get.call_args.kwargs['headers']
+        self.assertEqual('Bearer 12345', headers['Authorization'])
+
+    def test_request_context_db_changed(self):
+        """Headers should be rebuilt when the Db config changes"""
+        self.api.state.session.get = MagicMock()
+        self.api.db.config_version = 1
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.request('GET', 'test')
+        self.api.db.api_token = "67890"
+        self.api.db.config_version = 2
+        self.api.request('GET', 'test')
+        headers = self.api.state.session.get.call_args.kwargs['headers']
+        self.assertEqual('Bearer 67890', headers['Authorization'])
+
+    def test_request_context_state_changed(self):
+        """Proxies should be rebuilt when the State proxy settings change"""
+        self.api.state.session.get = MagicMock()
+        self.api.db.config_version = 1
+        self.api.db.use_proxies = False
+        self.api.request('GET', 'test')
+        self.assertEqual(None, self.api.state.session.get.call_args.kwargs['proxies'])
+        self.api.db.use_proxies = True
+        self.api.db.proxies = {'https': 'http://127.0.0.1:8080'}
+        self.api.state.use_proxies = True
+        self.api.request('GET', 'test')
+        self.assertEqual({'https': 'http://127.0.0.1:8080'}, self.api.state.session.get.call_args.kwargs['proxies'])
+        self.assertFalse(self.api.state.session.get.call_args.kwargs['verify'])
+
     def test_request_full_url(self):
         """Base URL should not be added if a full url is passed"""
         self.api.state.session.get = MagicMock()
@@ -92,6 +306,7 @@ class ApiTestCase(unittest.TestCase):
                                                       headers=headers,
                                                       proxies=None,
                                                       params=None,
+                                                      stream=False,
                                                       verify=True)
 
     def test_request_get(self):
@@ -110,6 +325,7 @@ class ApiTestCase(unittest.TestCase):
                                                       headers=headers,
                                                       proxies=None,
                                                       params=None,
+                                                      stream=False,
                                                       verify=True)
 
     def test_request_head(self):
@@ -147,7 +363,25 @@ class ApiTestCase(unittest.TestCase):
                                                       headers=headers,
                                                       proxies=None,
                                                       params=None,
+                                                      stream=False,
                                                       verify=True)
+        self.api.request('GET', 'test')
+        self.assertNotIn('test', self.api.state.session.get.call_args.kwargs['headers'])
+
+    def test_request_json(self):
+        """Responses, cached ones included, should be decoded with the JSON backend of the State"""
+        res = requests.models.Response()
+        res.status_code = 200
+        res._content = b'{"test": "test"}'
+        self.api.state.session.get = MagicMock(return_value=res)
+        self.api.state.cache_ttls = {'platform.synack.com/api/assessments': 60}
+        self.state._json_loads = MagicMock(return_value={'fast': True})
+        self.assertEqual({'fast': True}, self.api.request('GET', 'assessments').json())
+        self.assertEqual({'fast': True}, self.api.request('GET', 'assessments').json())
+        self.state._json_loads.assert_called_with(b'{"test": "test"}')
+        self.assertEqual(2, self.state._json_loads.call_count)
+        self.state.session.get.return_value = MagicMock(status_code=200, content=b'')
+        self.assertIsInstance(self.api.request('GET', 'test').json, MagicMock)
 
     def test_request_logged(self):
         """All requests should call the logger"""
@@ -162,12 +396,45 @@ class ApiTestCase(unittest.TestCase):
             'user_id': 'paco'
         }
         self.api.request('GET', 'test')
-        message = "200 -- GET -- https://platform.synack.com/api/test" + \
-                  f"\n\tHeaders: {headers}" + \
-                  "\n\tQuery: None" + \
-                  "\n\tData: None" + \
-                  "\n\tContent: Returned Content"
-        self.api.debug.log.assert_called_with("Network Request", message)
+        message = "%s -- %s -- %s\n\tHeaders: %s\n\tQuery: %s\n\tData: %s\n\tContent: %s"
+        self.api.debug.log.assert_called_with("Network Request", message,
+                                              200, 'GET', 'https://platform.synack.com/api/test',
+                                              headers, None, None, "Returned Content")
+
+    def test_request_login_pending(self):
+        """A deferred login should happen once, before the first request"""
+        self.api.state.session.get = MagicMock()
+        self.api.state.plugins['Auth'] = MagicMock()
+        self.api.state.plugins['Auth'].get_deferred_api_token.side_effect = \
+            lambda: setattr(self.api.state, 'login_pending', False)
+        self.api.state.login_pending = True
+        self.api.request('GET', 'test')
+        self.api.request('GET', 'test')
+        self.api.state.plugins['Auth'].get_deferred_api_token.assert_called_once_with()
+
+    def test_request_metrics(self):
+        """Every response should be recorded in the request metrics of the State"""
+        self.api.state.session.get = MagicMock()
+        self.api.state.session.get.return_value.status_code = 200
+        self.api.state.session.get.return_value.content = b'{"a": 1}'
+        self.api.request('GET', 'targets/u4fh8/resources')
+        ok = MagicMock(status_code=200, headers={'Content-Length': '1024'})
+        self.api.state.session.get = MagicMock(return_value=ok)
+        self.api.request('GET', 'https://downloads.com/file', stream=True)
+        snapshot = self.api.state.request_metrics.snapshot()
+        resources = snapshot['GET platform.synack.com/api/targets/.../resources']
+        self.assertEqual(1, resources['count'])
+        self.assertEqual(8, resources['bytes'])
+        self.assertEqual({200: 1}, resources['statuses'])
+        self.assertEqual(1024, snapshot['GET downloads.com/file']['bytes'])
+
+    def test_request_not_logged(self):
+        """Nothing should be passed to the logger while debugging is disabled"""
+        self.api.state.session.get = MagicMock()
+        self.api.state.session.get.return_value.status_code = 200
+        self.api.debug.enabled = False
+        self.api.request('GET', 'test')
+        self.api.debug.log.assert_not_called()
 
     def test_request_patch(self):
         """PATCH requests should work"""
@@ -228,6 +495,7 @@ class ApiTestCase(unittest.TestCase):
                                                       headers=headers,
                                                       proxies=proxies,
                                                       params=None,
+                                                      stream=False,
                                                       verify=False)
 
     def test_request_put(self):
@@ -248,3 +516,155 @@ class ApiTestCase(unittest.TestCase):
                                                       headers=headers,
                                                       proxies=None,
                                                       verify=True)
+
+    def test_request_rate_limited(self):
+        """Requests should wait for the rate limiter before being sent"""
+        self.api.state.session.get = MagicMock()
+        self.api.state._rate_limiter = MagicMock()
+        self.api.state.rate_limiter.reserve.return_value = 0.25
+        with patch('time.sleep') as mock_sleep:
+            self.api.request('GET', 'test')
+        self.api.state.rate_limiter.reserve.assert_called_with('https://platform.synack.com/api/test')
+        mock_sleep.assert_called_with(0.25)
+
+    def test_request_refresh_token(self):
+        """A request Synack rejects the API token of should be sent again once after logging in"""
+        self.api.db.use_proxies = False
+        self.api.db.api_token = "12345"
+        expired = MagicMock(status_code=401)
+        self.api.state.session.get = MagicMock(side_effect=[expired, MagicMock(status_code=200)])
+        self.api.state.plugins['Auth'] = MagicMock()
+        self.api.state.plugins['Auth'].get_api_token.return_value = "67890"
+        self.api.state.login = True
+        self.assertEqual(200, self.api.request('GET', 'tasks/v2/tasks').status_code)
+        self.api.state.plugins['Auth'].get_api_token.assert_called_once_with(expired="12345")
+        self.assertEqual(2, self.api.state.session.get.call_count)
+        for login, url, token, new_token in [(False, 'tasks/v2/tasks', '12345', '67890'),
+                                             (True, 'https://notifications.synack.com/api/v2/test', '12345', '67890'),
+                                             (True, 'https://platform.synack.com/token', '12345', '67890'),
+                                             (True, 'tasks/v2/tasks', None, '67890'),
+                                             (True, 'tasks/v2/tasks', '12345', None),
+                                             (True, 'tasks/v2/tasks', '12345', '12345')]:
+            self.api.state.login = login
+            self.api.db.api_token = token
+            self.api.state.plugins['Auth'].get_api_token.return_value = new_token
+            self.api.state.session.get = MagicMock(return_value=expired)
+            self.assertEqual(401, self.api.request('GET', url).status_code)
+            self.assertEqual(1, self.api.state.session.get.call_count)
+
+    def test_request_retry(self):
+        """Throttled requests should pause the rate limiter and be retried"""
+        throttled = requests.models.Response()
+        throttled.status_code = 429
+        throttled.headers['Retry-After'] = '2'
+        ok = requests.models.Response()
+        ok.status_code = 200
+        self.api.state.session.get = MagicMock(side_effect=[throttled, ok])
+        self.api.state._rate_limiter = MagicMock()
+        self.api.state.rate_limiter.reserve.return_value = 0
+        self.assertIs(ok, self.api.request('GET', 'test'))
+        self.api.state.rate_limiter.pause.assert_called_once_with('https://platform.synack.com/api/test', 2)
+        self.assertEqual(2, self.api.debug.log.call_count)
+
+    def test_request_retry_exhausted(self):
+        """Should raise once every retry has been throttled"""
+        throttled = requests.models.Response()
+        throttled.status_code = 503
+        self.api.state.session.post = MagicMock(return_value=throttled)
+        self.api.state._rate_limiter = MagicMock()
+        self.api.state.rate_limiter.reserve.return_value = 0
+        self.api.state.max_retries = 2
+        with self.assertRaises(requests.HTTPError):
+            self.api.request('POST', 'test', data={})
+        self.assertEqual(3, self.api.state.session.post.call_count)
+        self.assertEqual(2, self.api.state.rate_limiter.pause.call_count)
+
+    def test_request_single_flight(self):
+        """Identical GET requests sent at the same time should share one network call"""
+        release = threading.Event()
+        ok = requests.models.Response()
+        ok.status_code = 200
+        ok._content = b'{"slug": "abc"}'
+        self.api.db.use_proxies = False
+        self.api.state.session.get = MagicMock(side_effect=lambda *args, **kwargs: release.wait() and ok)
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(self.api.request('GET', 'launchpoint')))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        while self.api._flights.shared < 3:
+            release.wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, self.api.state.session.get.call_count)
+        self.assertEqual([{'slug': 'abc'}] * 4, [res.json() for res in results])
+        self.api.request('GET', 'launchpoint', query={'a': 1})
+        self.assertEqual(2, self.api.state.session.get.call_count)
+
+    def test_request_stream(self):
+        """Streamed requests should skip the cache and cassette and never read the body"""
+        self.api.state.cache_ttls = {'downloads.com/*': 60}
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '0'})
+        ok = MagicMock(status_code=200)
+        self.api.state.session.get = MagicMock(side_effect=[throttled, ok])
+        with tempfile.TemporaryDirectory() as tmp:
+            self.api.state.cassette_file = os.path.join(tmp, 'cassette.jsonl')
+            self.api.state.cassette_mode = 'record'
+            self.assertIs(ok, self.api.request('GET', 'https://downloads.com/file', stream=True))
+            self.api.state.cassette_file = None
+            with open(os.path.join(tmp, 'cassette.jsonl')) as fp:
+                self.assertEqual('', fp.read())
+        self.assertTrue(self.api.state.session.get.call_args.kwargs['stream'])
+        throttled.close.assert_called_once_with()
+        self.assertEqual('(streamed)', self.api.debug.log.call_args.args[-1])
+        self.assertIsNone(self.api.state.response_cache.lookup('https://downloads.com/file')[1])
+
+    def test_send_prepared(self):
+        """Should send a prepared request as is, after the rate limiter, and count it in the metrics"""
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.debug.enabled = False
+        prepared = self.api.prepare('POST', 'test', data={'type': 'CLAIM'})
+        res = MagicMock(status_code=201, content=b'')
+        self.api.state.session.send = MagicMock(return_value=res)
+        self.api.state.rate_limiter.reserve = MagicMock(return_value=0.01)
+        with patch.object(time, 'sleep') as mock_sleep:
+            self.assertIs(res, self.api.send_prepared(prepared))
+        mock_sleep.assert_called_once_with(0.01)
+        self.api.state.session.send.assert_called_once_with(prepared, proxies=None, verify=True)
+        self.api.state.rate_limiter.reserve.assert_called_once_with('https://platform.synack.com/api/test')
+        self.assertEqual(1, self.api.state.request_metrics.snapshot()['POST platform.synack.com/api/test']['count'])
+        self.api.debug.log.assert_not_called()
+        self.api.debug.enabled = True
+        self.api.state.rate_limiter.reserve.return_value = 0
+        self.api.send_prepared(prepared)
+        self.assertIn('(prepared)', self.api.debug.log.call_args.args[1])
+
+    def test_send_prepared_base_url(self):
+        """Prepared requests to Synack should be sent to state.base_url"""
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.state.base_url = 'http://127.0.0.1:8080'
+        self.api.state.session.send = MagicMock()
+        prepared = self.api.prepare('POST', 'test', data={'type': 'CLAIM'})
+        self.api.send_prepared(prepared)
+        sent = self.api.state.session.send.call_args.args[0]
+        self.assertEqual('http://127.0.0.1:8080/api/test', sent.url)
+        self.assertEqual('platform.synack.com', sent.headers['Host'])
+        self.assertEqual(prepared.body, sent.body)
+        self.assertEqual('https://platform.synack.com/api/test', prepared.url)
+        self.assertNotIn('Host', prepared.headers)
+
+    def test_warm(self):
+        """Should open as many connections as asked for with HEAD requests"""
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.send_prepared = MagicMock(return_value=MagicMock(status_code=200))
+        self.assertEqual([200, 200, 200], self.api.warm(connections=3))
+        self.assertEqual(3, self.api.send_prepared.call_count)
+        prepared = self.api.send_prepared.call_args.args[0]
+        self.assertEqual(('HEAD', 'https://platform.synack.com/api/transactions'), (prepared.method, prepared.url))
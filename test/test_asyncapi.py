@@ -0,0 +1,301 @@
+"""test_asyncapi.py
+
+Tests for the plugins/asyncapi.py AsyncApi Class
+"""
+
+import asyncio
+import os
+import requests
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '..')))
+
+import synack  # noqa: E402
+import synack._json  # noqa: E402
+from pages import build_async_pages  # noqa: E402
+
+
+async def append_ticks(events, count=3):
+    """Append 0 to count - 1 to events, letting other coroutines run between each"""
+    for i in range(count):
+        events.append(i)
+        await asyncio.sleep(0.01)
+
+
+async def slow_read():
+    await asyncio.sleep(0.01)
+    return b'{"test": "test"}'
+
+
+class AsyncApiTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state = synack._state.State()
+        self.api = synack.plugins.AsyncApi(self.state)
+        self.api.debug = MagicMock()
+        self.api.db = MagicMock()
+        self.api.db.use_proxies = False
+        self.api.db.user_id = "paco"
+        self.api.db.api_token = "12345"
+        self.api.session = MagicMock()
+        self.api.session.closed = False
+        self.response = self.api.session.request.return_value.__aenter__.return_value
+        self.response.status = 200
+        self.response.reason = 'OK'
+        self.response.url = 'https://platform.synack.com/api/test'
+        self.response.headers = {'Content-Type': 'application/json; charset=utf-8', 'x-count': '5'}
+        self.response.read = AsyncMock(return_value=b'{"test": "test"}')
+        self.headers = {
+            'Authorization': 'Bearer 12345',
+            'user_id': 'paco'
+        }
+
+    def test_build_params(self):
+        """Query dictionaries should be flattened like requests does"""
+        query = {'a': 1, 'b': ['x', 'y'], 'c': None, 'd': True}
+        expected = [('a', '1'), ('b', 'x'), ('b', 'y'), ('d', 'True')]
+        self.assertEqual(expected, self.api._build_params(query))
+        self.assertIsNone(self.api._build_params(None))
+
+    async def test_close(self):
+        """Closing should close and forget the session"""
+        session = self.api.session
+        session.close = AsyncMock()
+        await self.api.close()
+        session.close.assert_awaited_once_with()
+        self.assertIsNone(self.api.session)
+        await self.api.close()
+
+    async def test_get_session(self):
+        """A new aiohttp session should be made when there is none"""
+        self.api.session = None
+        session = self.api._get_session()
+        self.assertIs(session, self.api._get_session())
+        self.assertEqual(synack._json.get_accept_encoding(), session.headers['Accept-Encoding'])
+        await self.api.close()
+        self.assertIsNot(session, self.api._get_session())
+        await self.api.close()
+
+    async def test_login_path(self):
+        """Login Base URL should prepend and request should be made"""
+        self.api.request = AsyncMock(return_value='res')
+        self.assertEqual('res', await self.api.login('GET', 'test'))
+        self.api.request.assert_awaited_with('GET', 'https://login.synack.com/api/test')
+
+    async def test_notification_bad_token(self):
+        """Notifications token should be cleared if it is rejected"""
+        self.api.request = AsyncMock()
+        self.api.request.return_value.status_code = 422
+        self.api.db.notifications_token = "bad_token"
+        await self.api.notifications('GET', 'test')
+        self.api.request.assert_awaited_with('GET',
+                                             'https://notifications.synack.com/api/v2/test',
+                                             headers={"Authorization": "Bearer bad_token"})
+        self.assertEqual("", self.api.db.notifications_token)
+
+    async def test_notification_full_path(self):
+        """Notifications Base URL should not be added to a full URL"""
+        self.api.request = AsyncMock()
+        self.api.request.return_value.status_code = 200
+        self.api.db.notifications_token = "something"
+        await self.api.notifications('GET', 'http://www.google.com/api/test')
+        self.api.request.assert_awaited_with('GET',
+                                             'http://www.google.com/api/test',
+                                             headers={"Authorization": "Bearer something"})
+
+    async def test_paginate(self):
+        """Should yield the items of every page until a short or failed page"""
+        self.api.request = AsyncMock(side_effect=build_async_pages({1: [1, 2], 2: [3, 4], 3: [5]}))
+        ret = [item async for item in self.api.paginate('GET', 'tasks', per_page=2, query={'status': 'CLAIMED'})]
+        self.assertEqual([1, 2, 3, 4, 5], ret)
+        self.api.request.assert_awaited_with('GET', 'tasks', query={'status': 'CLAIMED', 'perPage': 2, 'page': 3})
+        self.api.request = AsyncMock(side_effect=build_async_pages({1: [1]}))
+        self.assertEqual([1], [item async for item in self.api.paginate('GET', 'tasks')])
+
+    async def test_paginate_prefetch(self):
+        """Should request the next page early, and stop once the caller does"""
+        self.api.request = AsyncMock(side_effect=build_async_pages({1: [1, 2], 2: [3, 4], 3: [5, 6]}))
+        pager = self.api.paginate('GET', 'tasks', per_page=2, max_pages=3, prefetch=True)
+        self.assertEqual(1, await pager.__anext__())
+        await pager.aclose()
+        self.assertEqual(2, self.api.request.call_count)
+        self.api.request = AsyncMock(side_effect=build_async_pages({1: [1, 2], 2: [3, 4], 3: [5, 6]}))
+        ret = [item async for item in self.api.paginate('GET', 'tasks', per_page=2, max_pages=3, prefetch=True)]
+        self.assertEqual([1, 2, 3, 4, 5, 6], ret)
+        self.assertEqual(3, self.api.request.call_count)
+
+    async def test_paginate_strict(self):
+        """Should raise at a page that fails when strict is set"""
+        self.api.request = AsyncMock(side_effect=build_async_pages({1: [1]}))
+        with self.assertRaises(requests.HTTPError):
+            [item async for item in self.api.paginate('GET', 'tasks', strict=True)]
+
+    async def test_request_base_url(self):
+        """Requests to Synack hosts should be sent to base_url with their host in the Host header"""
+        self.state.base_url = 'http://127.0.0.1:8080'
+        await self.api.request('HEAD', 'tasks/v1/tasks')
+        self.api.session.request.assert_called_with('HEAD',
+                                                    'http://127.0.0.1:8080/api/tasks/v1/tasks',
+                                                    headers={**self.headers, 'Host': 'platform.synack.com'},
+                                                    allow_redirects=False,
+                                                    params=None)
+        self.assertIn('HEAD platform.synack.com/api/tasks/v1/tasks', self.state.request_metrics.snapshot())
+
+    async def test_request_cache(self):
+        """GET requests to endpoints with a TTL should use the response cache"""
+        self.state.cache_ttls = {'platform.synack.com/api/assessments': 60}
+        self.response.headers = {'ETag': '"abc"'}
+        self.assertEqual({'test': 'test'}, (await self.api.request('GET', 'assessments')).json())
+        self.assertEqual({'test': 'test'}, (await self.api.request('GET', 'assessments')).json())
+        self.assertEqual(1, self.api.session.request.call_count)
+        await self.api.request('PATCH', 'assessments/1', data={})
+        self.response.status = 304
+        self.assertEqual({'test': 'test'}, (await self.api.request('GET', 'assessments')).json())
+        self.assertEqual('"abc"', self.api.session.request.call_args.kwargs['headers']['If-None-Match'])
+
+    async def test_request_cassette(self):
+        """Responses should be recorded to the cassette and then played back without a network"""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.state.cassette_file = os.path.join(tmp, 'cassette.jsonl.gz')
+            self.state.cassette_mode = 'record'
+            await self.api.request('GET', 'test')
+            self.state.cassette_mode = 'replay'
+            self.state.cassette_latency = 'recorded'
+            self.api.session.request.reset_mock()
+            res = await self.api.request('GET', 'test')
+            self.assertEqual({'test': 'test'}, res.json())
+            self.api.session.request.assert_not_called()
+            self.state.cassette_file = None
+
+    async def test_request_coalesced(self):
+        """Identical GET requests sent at the same time should share one network call"""
+        self.response.read = AsyncMock(side_effect=slow_read)
+        results = await asyncio.gather(*[self.api.request('GET', 'launchpoint') for i in range(3)],
+                                       self.api.request('POST', 'launchpoint'))
+        self.assertEqual([{'test': 'test'}] * 4, [res.json() for res in results])
+        self.assertEqual(2, self.api.session.request.call_count)
+        self.assertEqual(2, self.api._flights.shared)
+
+    async def test_request_get(self):
+        """GET requests should work and return a requests Response"""
+        res = await self.api.request('GET', 'test', query={'status': 'PUBLISHED', 'page': 1})
+        self.api.session.request.assert_called_with('GET',
+                                                    'https://platform.synack.com/api/test',
+                                                    headers=self.headers,
+                                                    allow_redirects=True,
+                                                    params=[('status', 'PUBLISHED'), ('page', '1')])
+        self.assertEqual(200, res.status_code)
+        self.assertEqual({'test': 'test'}, res.json())
+        self.assertEqual('5', res.headers['X-Count'])
+        self.assertEqual('utf-8', res.encoding)
+        self.api.debug.log.assert_called()
+        metrics = self.state.request_metrics.snapshot()['GET platform.synack.com/api/test']
+        self.assertEqual(1, metrics['count'])
+        self.assertEqual(16, metrics['bytes'])
+
+    async def test_request_head(self):
+        """HEAD requests should not follow redirects"""
+        await self.api.request('HEAD', 'https://platform.synack.com/api/test')
+        self.api.session.request.assert_called_with('HEAD',
+                                                    'https://platform.synack.com/api/test',
+                                                    headers=self.headers,
+                                                    allow_redirects=False,
+                                                    params=None)
+
+    async def test_request_header_kwargs(self):
+        """requests should merge in kwargs headers"""
+        await self.api.request('get', 'test', headers={'test': 'test'})
+        headers = self.api.session.request.call_args.kwargs['headers']
+        self.assertEqual({**self.headers, 'test': 'test'}, headers)
+
+    async def test_request_json(self):
+        """Responses, cached ones included, should be decoded with the JSON backend of the State"""
+        self.state._json_loads = MagicMock(return_value={'fast': True})
+        self.state.cache_ttls = {'platform.synack.com/api/assessments': 60}
+        self.assertEqual({'fast': True}, (await self.api.request('GET', 'assessments')).json())
+        self.assertEqual({'fast': True}, (await self.api.request('GET', 'assessments')).json())
+        self.state._json_loads.assert_called_with(b'{"test": "test"}')
+        self.assertEqual(2, self.state._json_loads.call_count)
+
+    async def test_request_login_pending(self):
+        """A deferred login should happen once, before the first request"""
+        self.state.plugins['Auth'] = MagicMock()
+        threads = list()
+        self.state.plugins['Auth'].get_deferred_api_token.side_effect = \
+            lambda: threads.append(threading.get_ident()) or setattr(self.state, 'login_pending', False)
+        self.state.login_pending = True
+        await self.api.request('GET', 'test')
+        await self.api.request('GET', 'test')
+        self.state.plugins['Auth'].get_deferred_api_token.assert_called_once_with()
+        self.assertNotEqual([threading.get_ident()], threads)
+
+    async def test_request_login_slow(self):
+        """Other coroutines should carry on while a request waits for the login"""
+        events = list()
+        self.state.plugins['Auth'] = MagicMock()
+        self.state.plugins['Auth'].get_deferred_api_token.side_effect = \
+            lambda: time.sleep(0.2) or events.append('login')
+        self.state.login_pending = True
+        await asyncio.gather(self.api.request('GET', 'test'), append_ticks(events))
+        self.assertEqual([0, 1, 2, 'login'], events)
+        self.assertEqual(1, self.api.session.request.call_count)
+
+    async def test_request_post(self):
+        """POST requests should send json"""
+        await self.api.request('POST', 'test', data={'type': 'CLAIM'})
+        self.api.session.request.assert_called_with('POST',
+                                                    'https://platform.synack.com/api/test',
+                                                    headers=self.headers,
+                                                    allow_redirects=True,
+                                                    json={'type': 'CLAIM'})
+
+    async def test_request_proxies(self):
+        """Proxies should be used, and certificates not verified, if set"""
+        self.api.db.use_proxies = True
+        self.api.db.proxies = {'http': 'http://127.0.0.1:8080', 'https': 'http://127.0.0.1:8081'}
+        await self.api.request('PATCH', 'test', data={'test': 'test'})
+        self.api.session.request.assert_called_with('PATCH',
+                                                    'https://platform.synack.com/api/test',
+                                                    headers=self.headers,
+                                                    allow_redirects=True,
+                                                    ssl=False,
+                                                    proxy='http://127.0.0.1:8081',
+                                                    json={'test': 'test'})
+
+    async def test_request_put(self):
+        """PUT requests should send data as params"""
+        with patch.object(self.api, '_get_session', return_value=self.api.session):
+            await self.api.request('PUT', 'test', data={'listing_id': 'abc'})
+        self.api.session.request.assert_called_with('PUT',
+                                                    'https://platform.synack.com/api/test',
+                                                    headers=self.headers,
+                                                    allow_redirects=True,
+                                                    params=[('listing_id', 'abc')])
+
+    async def test_request_refresh_token(self):
+        """A request Synack rejects the API token of should be sent again once after logging in"""
+        self.response.status = 401
+        self.state.plugins['Auth'] = MagicMock()
+        self.state.plugins['Auth'].get_api_token.return_value = "67890"
+        self.state.login = True
+        self.assertEqual(401, (await self.api.request('GET', 'tasks/v2/tasks')).status_code)
+        self.state.plugins['Auth'].get_api_token.assert_called_once_with(expired="12345")
+        self.assertEqual(2, self.api.session.request.call_count)
+
+    async def test_request_retry(self):
+        """Throttled requests should pause the rate limiter and be retried"""
+        self.state._rate_limiter = MagicMock()
+        self.state.rate_limiter.reserve.side_effect = [0.01, 0]
+        self.response.status = 429
+        self.response.headers = {'Retry-After': '0'}
+        self.state.max_retries = 1
+        with self.assertRaises(requests.HTTPError):
+            await self.api.request('GET', 'test')
+        self.assertEqual(2, self.api.session.request.call_count)
+        self.state.rate_limiter.pause.assert_called_once_with('https://platform.synack.com/api/test', 0)
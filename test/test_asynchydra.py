@@ -0,0 +1,68 @@
+"""test_asynchydra.py
+
+Tests for the plugins/asynchydra.py AsyncHydra Class
+"""
+
+import os
+import sys
+import unittest
+
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+
+
+async def iterate(items):
+    """Asynchronously yield each item, as AsyncApi.paginate does"""
+    for item in items:
+        yield item
+
+
+class AsyncHydraTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state = synack._state.State()
+        self.hydra = synack.plugins.AsyncHydra(self.state)
+        self.hydra.asyncapi = MagicMock()
+        self.hydra.asyncapi.request = AsyncMock(return_value=MagicMock())
+        self.hydra.db = MagicMock()
+        self.hydra.build_db_input = MagicMock(return_value='BuildDbInputReturn')
+        self.hydra.db.find_targets.return_value = [
+            synack.db.models.Target(codename='CRUSTYCRAB', slug='87314gru')
+        ]
+
+    async def test_get_hydra(self):
+        """Should get information from Hydra"""
+        self.hydra.asyncapi.paginate = MagicMock(return_value=iterate([{'somecontent': 'content'}]))
+        returned = await self.hydra.get_hydra(codename='CRUSTYCRAB')
+        self.assertEqual([{'somecontent': 'content'}], returned)
+        query = {
+            'listing_uids': '87314gru',
+            'q': '+port_is_open:true'
+        }
+        self.hydra.asyncapi.paginate.assert_called_with('GET', 'hydra_search/search', page=1, per_page=10,
+                                                        max_pages=5, per_page_param=None, prefetch=True,
+                                                        query=query)
+        self.hydra.build_db_input.assert_called_with([{'somecontent': 'content'}])
+        self.hydra.db.add_ports.assert_called_with('BuildDbInputReturn')
+
+    async def test_get_hydra_multipage(self):
+        """Should get every page but only update the database once"""
+        self.hydra.asyncapi.paginate = MagicMock(return_value=iterate([{'somecontent': 'content'}] * 20))
+        returned = await self.hydra.get_hydra(codename='CRUSTYCRAB', max_page=0)
+        self.assertEqual(20, len(returned))
+        self.assertEqual(1000, self.hydra.asyncapi.paginate.call_args.kwargs['max_pages'])
+        self.hydra.db.add_ports.assert_called_once_with('BuildDbInputReturn')
+
+    async def test_get_hydra_no_target(self):
+        """Should return None if the target is unknown"""
+        self.hydra.db.find_targets.return_value = []
+        self.assertIsNone(await self.hydra.get_hydra(codename='CRUSTYCRAB'))
+        self.hydra.asyncapi.request.assert_not_awaited()
+
+    async def test_get_hydra_no_update_db(self):
+        """Should get information from Hydra without updating the DB"""
+        self.hydra.asyncapi.paginate = MagicMock(return_value=iterate([]))
+        self.assertEqual([], await self.hydra.get_hydra(codename='CRUSTYCRAB', update_db=False))
+        self.hydra.db.add_ports.assert_not_called()
@@ -0,0 +1,154 @@
+"""test_asyncmissions.py
+
+Tests for the plugins/asyncmissions.py AsyncMissions Class
+"""
+
+import os
+import requests
+import sys
+import unittest
+
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '..')))
+
+import synack  # noqa: E402
+from pages import build_async_pages  # noqa: E402
+
+
+async def iterate(items, error=None):
+    """Asynchronously yield each item, as AsyncApi.paginate does, then raise error if given"""
+    for item in items:
+        yield item
+    if error:
+        raise error
+
+
+class AsyncMissionsTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state = synack._state.State()
+        self.missions = synack.plugins.AsyncMissions(self.state)
+        self.missions.asyncapi = MagicMock()
+        self.missions.asyncapi.request = AsyncMock(return_value=MagicMock())
+        self.missions.db = MagicMock()
+
+    async def test_get(self):
+        """Should get a list of missions"""
+        self.missions.asyncapi.request.return_value.status_code = 200
+        self.missions.asyncapi.request.return_value.json.return_value = ['1', '2']
+        self.assertEqual(['1', '2'], await self.missions.get())
+        query = {
+            'status': 'PUBLISHED',
+            'perPage': 20,
+            'page': 1,
+            'viewed': 'true'
+        }
+        self.missions.asyncapi.request.assert_awaited_with('GET', 'tasks/v2/tasks', query=query)
+
+    async def test_get_available(self):
+        """Inherited wrappers should return awaitables from the async get"""
+        self.missions.asyncapi.request.return_value.status_code = 200
+        self.missions.asyncapi.request.return_value.json.return_value = ['1']
+        self.assertEqual(['1'], await self.missions.get_available())
+
+    async def test_get_failed(self):
+        """Should return None if the request fails"""
+        self.missions.asyncapi.request.return_value.status_code = 401
+        self.assertIsNone(await self.missions.get())
+
+    async def test_get_multiple_pages(self):
+        """Should page through the missions and keep the listing_uids filter when the total is not known"""
+        self.missions.asyncapi.request.return_value.status_code = 200
+        self.missions.asyncapi.request.return_value.headers = {}
+        self.missions.asyncapi.request.return_value.json.return_value = ['1', '2']
+        self.missions.asyncapi.paginate = MagicMock(return_value=iterate(['3']))
+        ret = await self.missions.get(max_pages=3, per_page=2, listing_uids='abc')
+        self.assertEqual(['1', '2', '3'], ret)
+        query = {
+            'status': 'PUBLISHED',
+            'perPage': 2,
+            'page': 2,
+            'viewed': 'true',
+            'listingUids': 'abc'
+        }
+        self.missions.asyncapi.paginate.assert_called_with('GET', 'tasks/v2/tasks', page=2, per_page=2,
+                                                           max_pages=3, prefetch=True, strict=True, query=query)
+
+    async def test_get_multiple_pages_concurrent(self):
+        """Should get the remaining pages at once and keep them in order"""
+        pages = {
+            1: ['1', '2'],
+            2: ['3', '4'],
+            3: ['5', '6'],
+            4: ['7']
+        }
+        self.missions.asyncapi.request.side_effect = build_async_pages(pages, 7, {2: 0.05})
+        ret = await self.missions.get(max_pages=10, per_page=2, listing_uids='abc')
+        self.assertEqual(['1', '2', '3', '4', '5', '6', '7'], ret)
+        self.assertEqual(4, self.missions.asyncapi.request.await_count)
+
+    async def test_get_multiple_pages_failed(self):
+        """Should return None rather than a partial list if a page could not be retrieved"""
+        self.missions.asyncapi.request.side_effect = build_async_pages({1: ['1', '2'], 3: ['5']}, 5, {2: 0.05})
+        self.assertIsNone(await self.missions.get(max_pages=3, per_page=2))
+        self.missions.asyncapi.request.side_effect = None
+        self.missions.asyncapi.request.return_value.status_code = 200
+        self.missions.asyncapi.request.return_value.headers = {}
+        self.missions.asyncapi.request.return_value.json.return_value = ['1', '2']
+        self.missions.asyncapi.paginate = MagicMock(return_value=iterate(['3'], requests.HTTPError('500')))
+        self.assertIsNone(await self.missions.get(max_pages=3, per_page=2))
+
+    async def test_get_new(self):
+        """Should await the available missions before comparing them with the last ones"""
+        self.missions.get = AsyncMock(return_value=['one', 'two'])
+        self.missions.diff = MagicMock(return_value={'new': ['two'], 'changed': [], 'gone': []})
+        self.assertEqual(['two'], await self.missions.get_new())
+        self.missions.get.assert_awaited_with("PUBLISHED", max_pages=50)
+        self.missions.diff.assert_called_with(['one', 'two'])
+        self.missions.get.return_value = None
+        self.assertIsNone(await self.missions.get_new(max_pages=2))
+        self.assertEqual(1, self.missions.diff.call_count)
+
+    async def test_set_claimed(self):
+        """Should send a CLAIM to set_status"""
+        self.missions.set_status = AsyncMock(return_value="ret")
+        self.missions._claims = {"yup": ("12345", "prepared")}
+        self.assertEqual("ret", await self.missions.set_claimed({"id": "yup"}))
+        self.missions.set_status.assert_awaited_with({"id": "yup"}, "CLAIM")
+
+    async def test_set_status(self):
+        """Should interact with a mission"""
+        m = {
+            "organizationUid": "24re7yuf",
+            "listingUid": "4wr7egtu",
+            "campaignUid": "27493fe8r",
+            "id": "4i3eg86fyu",
+            "payout": {"amount": 10},
+            "title": "Some Mission"
+        }
+        ret = {
+            "target": "4wr7egtu",
+            "title": "Some Mission",
+            "payout": "10",
+            "status": "CLAIM",
+            "success": True
+        }
+        self.missions.asyncapi.request.return_value.status_code = 201
+        self.assertEqual(ret, await self.missions.set_status(m, "CLAIM"))
+        self.missions.asyncapi.request.assert_awaited_with('POST',
+                                                           'tasks/v1' +
+                                                           '/organizations/24re7yuf' +
+                                                           '/listings/4wr7egtu' +
+                                                           '/campaigns/27493fe8r' +
+                                                           '/tasks/4i3eg86fyu' +
+                                                           '/transitions',
+                                                           data={"type": "CLAIM"})
+
+    async def test_watch(self):
+        """Should watch with the Missions Plugin, whose requests are not coroutines"""
+        self.state.plugins['Missions'] = MagicMock()
+        callback = MagicMock()
+        ret = self.missions.watch(callback, block=False, interval=10)
+        self.assertIs(self.state.plugins['Missions'].watch.return_value, ret)
+        self.state.plugins['Missions'].watch.assert_called_with(callback, False, interval=10)
@@ -0,0 +1,115 @@
+"""test_asynctargets.py
+
+Tests for the plugins/asynctargets.py AsyncTargets Class
+"""
+
+import os
+import requests
+import sys
+import unittest
+
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+from synack.db.models import Category, Target  # noqa: E402
+
+
+async def iterate(items, error=None):
+    """Asynchronously yield each item, as AsyncApi.paginate does, then raise error if given"""
+    for item in items:
+        yield item
+    if error:
+        raise error
+
+
+class AsyncTargetsTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state = synack._state.State()
+        self.targets = synack.plugins.AsyncTargets(self.state)
+        self.targets.asyncapi = MagicMock()
+        self.targets.asyncapi.request = AsyncMock(return_value=MagicMock())
+        self.targets.db = MagicMock()
+        self.targets.scratchspace = MagicMock()
+        self.target = Target(slug='213h89h3', codename='SASSYSQUIRREL', category=1)
+        self.targets.db.find_targets.return_value = [self.target]
+
+    async def test_get_assets(self):
+        """Should get the assets of a target with a flattened query"""
+        self.targets.asyncapi.paginate = MagicMock(return_value=iterate(['asset']))
+        self.targets.db.use_scratchspace = True
+        self.assertEqual(['asset'], await self.targets.get_assets(codename='SASSYSQUIRREL', scope='in'))
+        query = self.targets.asyncapi.paginate.call_args.kwargs['query']
+        self.assertEqual('213h89h3', query['listingUid[]'])
+        self.assertEqual(['in'], query['scope[]'])
+        self.assertEqual(5000, self.targets.asyncapi.paginate.call_args.kwargs['per_page'])
+        self.assertIsNone(self.targets.asyncapi.paginate.call_args.kwargs['max_pages'])
+        self.assertTrue(self.targets.asyncapi.paginate.call_args.kwargs['strict'])
+        self.targets.scratchspace.set_assets_file.assert_called_once_with('["asset"]', target=self.target)
+
+    async def test_get_assets_connected(self):
+        """Should get the assets of the connected target if no target is given"""
+        self.targets.get_connected = MagicMock(return_value={'slug': '213h89h3'})
+        self.targets.asyncapi.paginate = MagicMock(return_value=iterate([]))
+        self.assertEqual([], await self.targets.get_assets())
+        self.targets.db.find_targets.assert_called_with(slug='213h89h3')
+
+    async def test_get_assets_failed(self):
+        """Should return None rather than part of the assets if a page fails, and ask for one page without perPage"""
+        self.targets.asyncapi.paginate = MagicMock(return_value=iterate(['asset'], requests.HTTPError('500')))
+        self.assertIsNone(await self.targets.get_assets(codename='SASSYSQUIRREL'))
+        self.targets.scratchspace.set_assets_file.assert_not_called()
+        self.targets.asyncapi.paginate = MagicMock(return_value=iterate(['asset']))
+        self.targets.db.use_scratchspace = False
+        self.assertEqual(['asset'], await self.targets.get_assets(codename='SASSYSQUIRREL', page=2, perPage=None))
+        self.assertEqual(2, self.targets.asyncapi.paginate.call_args.kwargs['max_pages'])
+
+    async def test_get_scope(self):
+        """Should get the scope based on the target category"""
+        self.targets.db.categories = [Category(id=1, name='Host')]
+        self.targets.get_scope_host = AsyncMock(return_value={'1.1.1.1/32'})
+        self.assertEqual({'1.1.1.1/32'}, await self.targets.get_scope(codename='SASSYSQUIRREL'))
+        self.targets.db.categories = [Category(id=1, name='Web Application')]
+        self.targets.get_connected = MagicMock(return_value={'slug': '213h89h3'})
+        self.targets.get_scope_web = AsyncMock(return_value=['web'])
+        self.assertEqual(['web'], await self.targets.get_scope())
+
+    async def test_get_scope_host(self):
+        """Should get the scope for a Host"""
+        self.targets.db.use_scratchspace = True
+        self.targets.get_assets = AsyncMock(return_value=[
+            {'active': True, 'location': '1.1.1.1/32'},
+            {'active': False, 'location': '2.2.2.2/32'}
+        ])
+        self.targets.build_scope_host_db = MagicMock(return_value='host_db_return_value')
+        out = await self.targets.get_scope_host(codename='SASSYSQUIRREL', add_to_db=True)
+        self.assertEqual({'1.1.1.1/32'}, out)
+        self.targets.db.add_ips.assert_called_with('host_db_return_value')
+        self.targets.scratchspace.set_hosts_file.assert_called_with(out, target=self.target)
+        self.targets.get_connected = MagicMock(return_value={'slug': '213h89h3'})
+        self.assertEqual({'1.1.1.1/32'}, await self.targets.get_scope_host())
+        self.targets.get_assets.return_value = None
+        self.assertIsNone(await self.targets.get_scope_host(codename='SASSYSQUIRREL'))
+
+    async def test_get_scope_web(self):
+        """Should get the scope for a Web Application"""
+        self.targets.db.use_scratchspace = True
+        self.targets.get_assets = AsyncMock(return_value=[
+            {
+                'active': True,
+                'listings': [{'listingUid': '213h89h3', 'scope': 'in'}],
+                'location': 'https://www.example.com (https://www.example.com)',
+                'scopeRules': [{'rule': '*.example.com/*'}]
+            }
+        ])
+        self.targets.build_scope_web_db = MagicMock(return_value='web_db_return_value')
+        self.targets.build_scope_web_burp = MagicMock(return_value='burp')
+        out = await self.targets.get_scope_web(codename='SASSYSQUIRREL', add_to_db=True)
+        self.assertEqual(self.targets.build_scope_web(self.targets.get_assets.return_value), out)
+        self.targets.db.add_urls.assert_called_with('web_db_return_value')
+        self.targets.scratchspace.set_burp_file.assert_called_with('burp', target=self.target)
+        self.targets.get_connected = MagicMock(return_value={'slug': '213h89h3'})
+        self.assertEqual(out, await self.targets.get_scope_web())
+        self.targets.get_assets.return_value = None
+        self.assertIsNone(await self.targets.get_scope_web(codename='SASSYSQUIRREL'))
@@ -3,22 +3,36 @@
 Tests for the _Auth.py Auth Class
 """
 
+import base64
+import json
 import os
 import pathlib
 import pyotp
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
 
 import synack  # noqa: E402
 
 
+def build_token(expiry):
+    """Return a token shaped like a JWT that expires at the given time"""
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': expiry}).encode()).decode().rstrip('=')
+    return f'eyJhbGciOiJIUzI1NiJ9.{payload}.c2lnbmF0dXJl'
+
+
 class AuthTestCase(unittest.TestCase):
     def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
         self.state = synack._state.State()
+        self.state.config_dir = self.tmp.name
         self.auth = synack.plugins.Auth(self.state)
         self.auth.api = MagicMock()
         self.auth.db = MagicMock()
@@ -26,14 +40,28 @@ class AuthTestCase(unittest.TestCase):
 
     def test_build_otp(self):
         """Should generate a OTP"""
-        pyotp.TOTP = MagicMock()
         self.auth.db.otp_secret = "123"
-        self.auth.build_otp()
-        self.assertEqual(7, pyotp.TOTP.return_value.digits)
-        self.assertEqual(10, pyotp.TOTP.return_value.interval)
-        self.assertEqual('synack', pyotp.TOTP.return_value.issuer)
-        pyotp.TOTP.assert_called_with('123')
-        pyotp.TOTP.return_value.now.assert_called_with()
+        with patch.object(pyotp, 'TOTP') as mock_totp, \
+                patch.object(time, 'time', return_value=1000.0):
+            self.auth.build_otp()
+        self.assertEqual(7, mock_totp.return_value.digits)
+        self.assertEqual(10, mock_totp.return_value.interval)
+        self.assertEqual('synack', mock_totp.return_value.issuer)
+        mock_totp.assert_called_with('123')
+        mock_totp.return_value.now.assert_called_with()
+
+    def test_build_otp_window(self):
+        """Should wait for the next OTP if the current one is about to change"""
+        self.auth.db.otp_secret = "123"
+        with patch.object(pyotp, 'TOTP') as mock_totp, \
+                patch.object(time, 'time', return_value=1008.5), \
+                patch.object(time, 'sleep') as mock_sleep:
+            mock_totp.return_value.interval = 10
+            self.auth.build_otp()
+            mock_sleep.assert_called_once_with(1.5)
+            time.time.return_value = 1007.5
+            self.auth.build_otp()
+            mock_sleep.assert_called_once_with(1.5)
 
     def test_get_api_token(self):
         """Should complete the login workflow when check fails"""
@@ -56,6 +84,46 @@ class AuthTestCase(unittest.TestCase):
         self.auth.get_login_grant_token.assert_called_with("csrf_fwlnm",
                                                            "pt_rsaemnt")
 
+    def test_get_api_token_expired(self):
+        """Should only log in again if the rejected token has not been replaced yet"""
+        self.auth.db.api_token = "new_token"
+        self.auth.get_login_csrf = MagicMock()
+        self.assertEqual("new_token", self.auth.get_api_token(expired="old_token"))
+        self.auth.get_login_csrf.assert_not_called()
+        self.auth.users.get_profile.assert_not_called()
+        self.auth.get_login_csrf.return_value = None
+        self.assertIsNone(self.auth.get_api_token(expired="new_token"))
+        self.auth.get_login_csrf.assert_called_with()
+        self.auth.users.get_profile.assert_not_called()
+
+    def test_get_api_token_expiry(self):
+        """Should read the expiry from the token, once for each token"""
+        expiry = int(time.time()) + 3600
+        self.auth.db.api_token = build_token(expiry)
+        self.assertEqual(expiry, self.auth.get_api_token_expiry())
+        with patch.object(base64, 'urlsafe_b64decode') as mock_decode:
+            self.assertEqual(expiry, self.auth.get_api_token_expiry())
+            mock_decode.assert_not_called()
+        for token in [None, '', 'opaque', 'a.b.c', 'a.W10.c', 'a.e30.c']:
+            self.auth.db.api_token = token
+            self.assertIsNone(self.auth.get_api_token_expiry())
+
+    def test_get_api_token_fresh(self):
+        """Should not check a token with Synack until it is about to expire"""
+        self.auth.db.api_token = build_token(time.time() + 3600)
+        self.assertEqual(self.auth.db.api_token, self.auth.get_api_token())
+        self.auth.users.get_profile.assert_not_called()
+        self.auth.db.api_token = build_token(time.time() + 30)
+        self.auth.users.get_profile.return_value = {"user_id": "john"}
+        self.assertEqual(self.auth.db.api_token, self.auth.get_api_token())
+        self.auth.users.get_profile.assert_called_with()
+        self.auth.users.get_profile.reset_mock()
+        self.auth.db.api_token = build_token(time.time() - 30)
+        self.auth.get_login_csrf = MagicMock(return_value=None)
+        self.assertIsNone(self.auth.get_api_token())
+        self.auth.users.get_profile.assert_not_called()
+        self.auth.get_login_csrf.assert_called_with()
+
     def test_get_api_token_login_success(self):
         """Should return the database token when check succeeds"""
         self.auth.db.api_token = "qweqweqwe"
@@ -64,6 +132,65 @@ class AuthTestCase(unittest.TestCase):
         self.auth.users.get_profile.return_value = {"user_id": "john"}
         self.assertEqual("qweqweqwe", self.auth.get_api_token())
 
+    def test_get_api_token_other_process(self):
+        """Should use the token another process logged in with while this one waited for the lock"""
+        self.auth.db.api_token = "old_token"
+        self.auth.db.reload.side_effect = lambda: setattr(self.auth.db, 'api_token', "new_token")
+        self.auth.get_login_csrf = MagicMock()
+        self.assertEqual("new_token", self.auth.get_api_token(expired="old_token"))
+        self.auth.db.reload.assert_called_once_with()
+        self.auth.get_login_csrf.assert_not_called()
+        self.assertTrue((self.state.config_dir / 'login.lock').exists())
+
+    def test_get_api_token_threads(self):
+        """Threads rejected with the same token should log in once and share the new token"""
+        self.auth.db.api_token = "old_token"
+        self.auth.set_login_script = MagicMock()
+        self.auth.get_login_csrf = MagicMock(side_effect=lambda: time.sleep(0.05) or "csrf")
+        self.auth.get_login_progress_token = MagicMock(return_value="pt")
+        self.auth.get_login_grant_token = MagicMock(return_value="gt")
+        self.auth.api.request.return_value.status_code = 200
+        self.auth.api.request.return_value.json.return_value = {"access_token": "new_token"}
+        tokens = list()
+        threads = [threading.Thread(target=lambda: tokens.append(self.auth.get_api_token(expired="old_token")))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(["new_token"] * 5, tokens)
+        self.auth.get_login_csrf.assert_called_once_with()
+
+    def test_get_api_token_user_id(self):
+        """Should fill in a missing user_id from the profile, even while the token is fresh"""
+        self.auth.db.api_token = build_token(time.time() + 3600)
+        self.auth.db.user_id = None
+        self.assertEqual(self.auth.db.api_token, self.auth.get_api_token())
+        self.auth.users.get_profile.assert_called_once_with()
+        self.auth.db.user_id = "john"
+        self.auth.get_api_token()
+        self.auth.db.user_id = None
+        self.auth.get_login_csrf = MagicMock(return_value=None)
+        self.auth.get_api_token(expired=self.auth.db.api_token)
+        self.auth.users.get_profile.assert_called_once_with()
+
+    def test_get_deferred_api_token(self):
+        """Threads arriving while the deferred login happens should wait for it, and only one should log in"""
+        self.state.login_pending = True
+        self.auth.db.api_token = None
+        login = MagicMock(side_effect=lambda: time.sleep(0.05) or setattr(self.auth.db, 'api_token', "token"))
+        self.auth.get_api_token = login
+        tokens = list()
+        threads = [threading.Thread(target=lambda: tokens.append(self.auth.get_deferred_api_token()))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(["token"] * 5, tokens)
+        login.assert_called_once_with()
+        self.assertFalse(self.state.login_pending)
+
     def test_get_login_grant_token(self):
         """Should get the grant token from valid authy TOTP"""
         self.auth.build_otp = MagicMock(return_value="12345")
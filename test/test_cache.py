@@ -0,0 +1,151 @@
+"""test_cache.py
+
+Tests for the ResponseCache class
+"""
+
+import os
+import pathlib
+import requests
+import sys
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._cache  # noqa: E402
+
+
+def build_response(status_code=200, content=b'[]', headers=None):
+    res = requests.models.Response()
+    res.status_code = status_code
+    res.url = 'https://platform.synack.com/api/assessments'
+    res.headers = requests.structures.CaseInsensitiveDict(headers or dict())
+    res._content = content
+    return res
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ttls = {
+            'platform.synack.com/api/assessments': 60,
+            'platform.synack.com/api/targets/*/resources': 0
+        }
+        self.cache = synack._cache.ResponseCache(self.ttls, size=2)
+        self.url = 'https://platform.synack.com/api/assessments'
+
+    def test_build_response(self):
+        """Cached entries should become new requests Responses"""
+        entry = synack._cache.CacheEntry(self.url, {'Content-Type': 'application/json; charset=utf-8'}, b'[1]', 0)
+        res = entry.build_response()
+        self.assertEqual(200, res.status_code)
+        self.assertEqual([1], res.json())
+        self.assertEqual('utf-8', res.encoding)
+        self.assertIsNot(res, entry.build_response())
+
+    def test_clear(self):
+        """Should forget everything in memory and on disk"""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = synack._cache.ResponseCache(self.ttls, directory=pathlib.Path(tmp) / 'cache')
+            key, entry, fresh = cache.lookup(self.url)
+            cache.update(key, entry, build_response())
+            cache.clear()
+            self.assertEqual([], list(cache.directory.iterdir()))
+            self.assertEqual((key, None, False), cache.lookup(self.url))
+
+    def test_disk(self):
+        """Responses should be shared with other caches using the same directory"""
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = pathlib.Path(tmp) / 'cache'
+            cache = synack._cache.ResponseCache(self.ttls, directory=directory)
+            key, entry, fresh = cache.lookup(self.url)
+            cache.update(key, entry, build_response(content=b'[2]', headers={'ETag': '"abc"'}))
+            other = synack._cache.ResponseCache(self.ttls, directory=directory)
+            key, entry, fresh = other.lookup(self.url)
+            self.assertTrue(fresh)
+            self.assertEqual(b'[2]', entry.content)
+            self.assertEqual({'If-None-Match': '"abc"'}, entry.validators)
+            (directory / f'{cache._get_path(key).name}.json').write_text('{not json')
+            self.assertIsNone(synack._cache.ResponseCache(self.ttls, directory=directory)._read(key))
+            self.assertIsNone(synack._cache.ResponseCache(self.ttls, directory=directory)._read('other'))
+            with patch('os.replace', side_effect=OSError):
+                cache._write('other', entry)
+            self.assertEqual(2, len(list(directory.iterdir())))
+
+    def test_get_endpoint(self):
+        """Should cut URLs after the first part of the API path"""
+        self.assertEqual('https://platform.synack.com/api/targets',
+                         self.cache._get_endpoint('https://platform.synack.com/api/targets/abc/signup'))
+        self.assertEqual('https://notifications.synack.com/api/v2/notifications',
+                         self.cache._get_endpoint('https://notifications.synack.com/api/v2/notifications?x=1'))
+        self.assertEqual('https://hooks.slack.com/x', self.cache._get_endpoint('https://hooks.slack.com/x'))
+
+    def test_get_key(self):
+        """Should include sorted query parameters in the key"""
+        self.assertEqual(f'{self.url}?a=1&b=x&b=y',
+                         self.cache._get_key(self.url, {'b': ['x', 'y'], 'c': None, 'a': 1}))
+        self.assertEqual(f'{self.url}?z=1&a=1', self.cache._get_key(f'{self.url}?z=1', {'a': 1}))
+        self.assertEqual(self.url, self.cache._get_key(self.url, None))
+
+    def test_get_key_identity(self):
+        """Should keep the responses of each identity apart, without storing the identity itself"""
+        key = self.cache._get_key(self.url, None, 'Bearer abc')
+        self.assertTrue(key.startswith(f'{self.url}#'))
+        self.assertNotIn('abc', key)
+        self.assertNotEqual(key, self.cache._get_key(self.url, None, 'Bearer def'))
+        self.cache.update(key, None, build_response())
+        self.assertTrue(self.cache.lookup(self.url, identity='Bearer abc')[2])
+        self.assertIsNone(self.cache.lookup(self.url, identity='Bearer def')[1])
+        self.assertIsNone(self.cache.lookup(self.url)[1])
+
+    def test_invalidate(self):
+        """Writes to an endpoint should make its cached responses be checked again"""
+        key, entry, fresh = self.cache.lookup(self.url)
+        with patch('time.time', return_value=100):
+            self.cache.update(key, entry, build_response())
+        with patch('time.time', return_value=101):
+            self.assertTrue(self.cache.lookup(self.url)[2])
+            self.cache.invalidate('https://platform.synack.com/api/assessments/123')
+            self.assertFalse(self.cache.lookup(self.url)[2])
+
+    def test_lookup(self):
+        """Should only cache URLs with a TTL, and only until it runs out"""
+        self.assertEqual((None, None, False), self.cache.lookup('https://platform.synack.com/api/tasks/v2/tasks'))
+        key, entry, fresh = self.cache.lookup(self.url)
+        self.assertEqual((self.url, None, False), (key, entry, fresh))
+        with patch('time.time', return_value=100):
+            self.cache.update(key, entry, build_response(content=b'[3]'))
+        with patch('time.time', return_value=159):
+            key, entry, fresh = self.cache.lookup(self.url)
+            self.assertTrue(fresh)
+            self.assertEqual(b'[3]', entry.content)
+        with patch('time.time', return_value=161):
+            self.assertFalse(self.cache.lookup(self.url)[2])
+
+    def test_lru(self):
+        """Should only keep the most recently used responses in memory"""
+        urls = [f'https://platform.synack.com/api/targets/{slug}/resources' for slug in ['a', 'b', 'c']]
+        for url in urls:
+            key, entry, fresh = self.cache.lookup(url)
+            self.cache.update(key, entry, build_response())
+            self.assertFalse(self.cache.lookup(url)[2])
+        self.assertEqual(urls[1:], list(self.cache._entries.keys()))
+        self.cache.lookup(urls[1])
+        self.assertEqual([urls[2], urls[1]], list(self.cache._entries.keys()))
+
+    def test_update(self):
+        """Should keep the cached body when Synack says it has not changed"""
+        key, entry, fresh = self.cache.lookup(self.url)
+        res = self.cache.update(key, entry, build_response(content=b'[4]', headers={'etag': '"1"'}))
+        self.assertEqual(b'[4]', res.content)
+        key, entry, fresh = self.cache.lookup(self.url)
+        not_modified = build_response(304, b'', {'ETag': '"2"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        res = self.cache.update(key, entry, not_modified)
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(b'[4]', res.content)
+        self.assertEqual({'If-None-Match': '"2"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+                         self.cache.lookup(self.url)[1].validators)
+        error = build_response(500)
+        self.assertIs(error, self.cache.update(key, entry, error))
+        self.assertEqual(b'[4]', self.cache.lookup(self.url)[1].content)
@@ -0,0 +1,114 @@
+"""test_cassette.py
+
+Tests for the Cassette class
+"""
+
+import os
+import requests
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._cassette  # noqa: E402
+
+
+def build_response(status, content, headers=None):
+    """Return a requests Response as the network would"""
+    res = requests.models.Response()
+    res.status_code = status
+    res.reason = 'OK'
+    res.url = 'https://platform.synack.com/api/test'
+    res.headers = requests.structures.CaseInsensitiveDict(headers or {'Content-Type': 'application/json'})
+    res._content = content
+    return res
+
+
+def record_cassette(path):
+    """Record four responses, two of them to the same request"""
+    cassette = synack._cassette.Cassette(path, 'record')
+    headers = {'Content-Type': 'application/json', 'Set-Cookie': 'session=secret'}
+    cassette.record('GET', 'https://platform.synack.com/api/tasks', {'page': 1}, None,
+                    build_response(200, b'[1]', headers), 0.25)
+    cassette.record('GET', 'https://platform.synack.com/api/tasks', {'page': 1}, None,
+                    build_response(200, b'[2]'), 0.5)
+    cassette.record('POST', 'https://login.synack.com/api/authenticate', None, {'password': 'hunter2'},
+                    build_response(200, b'{"access_token": "abc"}'), 0.1)
+    cassette.record('GET', 'https://downloads.com/file', None, None,
+                    build_response(200, b'\xff\xfe\x00'), 0.1)
+    cassette.close()
+    cassette.close()
+
+
+class CassetteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'cassette.jsonl')
+
+    def test_get_delay(self):
+        """Should wait for nothing, a fixed time, or the recorded time"""
+        record_cassette(self.path)
+        cassette = synack._cassette.Cassette(self.path)
+        interaction = {'seconds': 0.25}
+        self.assertEqual(0, cassette.get_delay(interaction))
+        cassette.latency = 0.1
+        self.assertEqual(0.1, cassette.get_delay(interaction))
+        cassette.latency = 'recorded'
+        self.assertEqual(0.25, cassette.get_delay(interaction))
+
+    def test_get_key(self):
+        """Should match on method, URL, query and body without keeping the body"""
+        key = synack._cassette.Cassette.get_key('POST', 'https://x.com', {'b': 2, 'a': 1}, {'password': 'hunter2'})
+        self.assertEqual(key, synack._cassette.Cassette.get_key('POST', 'https://x.com', {'a': 1, 'b': 2},
+                                                                {'password': 'hunter2'}))
+        self.assertNotIn('hunter2', key)
+        self.assertNotEqual(key, synack._cassette.Cassette.get_key('POST', 'https://x.com', {'a': 1, 'b': 2},
+                                                                   {'password': 'hunter3'}))
+        key = synack._cassette.Cassette.get_key('POST', 'https://x.com', None, {'authy_token': '1234567', 'a': 1})
+        self.assertEqual(key, synack._cassette.Cassette.get_key('POST', 'https://x.com', None,
+                                                                {'authy_token': '7654321', 'a': 1}))
+
+    def test_record(self):
+        """Should write one compact line per response, without cookies or request bodies"""
+        record_cassette(self.path)
+        with open(self.path) as fp:
+            content = fp.read()
+        self.assertEqual(4, len(content.splitlines()))
+        self.assertNotIn('hunter2', content)
+        self.assertNotIn('session=secret', content)
+
+    def test_replay(self):
+        """Should play back responses in the order they were recorded, repeating the last one"""
+        record_cassette(self.path)
+        cassette = synack._cassette.Cassette(self.path)
+        for expected in [b'[1]', b'[2]', b'[2]']:
+            interaction = cassette.replay('GET', 'https://platform.synack.com/api/tasks', {'page': 1}, None)
+            res = cassette.build_response(interaction)
+            self.assertEqual(expected, res.content)
+            self.assertEqual(200, res.status_code)
+            self.assertEqual('application/json', res.headers['content-type'])
+        interaction = cassette.replay('POST', 'https://login.synack.com/api/authenticate', None,
+                                      {'password': 'hunter2'})
+        self.assertEqual({'access_token': 'abc'}, cassette.build_response(interaction).json())
+        interaction = cassette.replay('GET', 'https://downloads.com/file', None, None)
+        res = cassette.build_response(interaction)
+        self.assertEqual(b'\xff\xfe\x00', b''.join(res.iter_content(1)))
+
+    def test_replay_gzip(self):
+        """Should compress cassettes whose name ends in .gz"""
+        path = self.path + '.gz'
+        record_cassette(path)
+        with open(path, 'rb') as fp:
+            self.assertEqual(b'\x1f\x8b', fp.read(2))
+        cassette = synack._cassette.Cassette(path)
+        interaction = cassette.replay('GET', 'https://platform.synack.com/api/tasks', {'page': 1}, None)
+        self.assertEqual(b'[1]', cassette.build_response(interaction).content)
+
+    def test_replay_missing(self):
+        """Should raise LookupError for requests that were never recorded"""
+        record_cassette(self.path)
+        cassette = synack._cassette.Cassette(self.path)
+        with self.assertRaises(LookupError):
+            cassette.replay('GET', 'https://platform.synack.com/api/tasks', {'page': 2}, None)
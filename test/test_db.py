@@ -5,10 +5,13 @@ Tests for the plugins/db.py Db class
 
 import alembic.command
 import alembic.config
+import alembic.script
+import concurrent.futures
 import os
 import sqlalchemy
 import sys
 import pathlib
+import tempfile
 import unittest
 
 from unittest.mock import MagicMock, patch
@@ -138,6 +141,15 @@ class DbTestCase(unittest.TestCase):
             self.db.Session.return_value.commit.assert_called_with()
             self.db.Session.return_value.close.assert_called_with()
 
+    def test_add_missions(self):
+        """Should insert or update the status and payout of missions"""
+        self.db.Session = MagicMock()
+        self.db.add_missions([{"id": "abc", "status": "PUBLISHED", "payout": {"amount": 10}}])
+        mission = self.db.Session.return_value.merge.call_args.args[0]
+        self.assertEqual(("abc", "PUBLISHED", 10.0), (mission.id, mission.status, mission.payout))
+        self.db.Session.return_value.commit.assert_called_with()
+        self.db.Session.return_value.close.assert_called_with()
+
     def test_add_organizations(self):
         """Should update Organizations table if organization.slug provided"""
         mock = MagicMock()
@@ -390,6 +402,53 @@ class DbTestCase(unittest.TestCase):
         self.assertEqual("123", self.db.api_token)
         self.db.get_config.assert_called_with("api_token")
 
+    def test_batch_configs(self):
+        """Should write every change made in the batch with one commit"""
+        self.db.Session = MagicMock()
+        config = synack.db.models.Config()
+        query = self.db.Session.return_value.query
+        query.return_value.filter_by.return_value.first.return_value = config
+        self.db.get_config()
+        self.db.Session.reset_mock()
+
+        with self.db.batch_configs():
+            self.db.api_token = 'token'
+            self.db.user_id = 'paco'
+            self.db.set_config('slack_url', 'https://slack.com')
+            self.db.Session.assert_not_called()
+            self.assertEqual('https://slack.com', self.db.slack_url)
+            self.assertEqual('token', self.db.api_token)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                self.assertIsNone(executor.submit(lambda: self.db.api_token).result())
+
+        self.assertEqual('token', config.api_token)
+        self.assertEqual('paco', config.user_id)
+        self.assertEqual('https://slack.com', config.slack_url)
+        self.db.Session.assert_called_once_with()
+        self.db.Session.return_value.commit.assert_called_once_with()
+
+    def test_batch_configs_exception(self):
+        """Should not write anything if the batch raises an exception"""
+        self.db.Session = MagicMock()
+        with self.assertRaises(ValueError):
+            with self.db.batch_configs():
+                self.db.api_token = 'token'
+                raise ValueError()
+        self.db.Session.assert_not_called()
+        self.db.set_config('api_token', 'token')
+        self.db.Session.return_value.commit.assert_called_once_with()
+
+    def test_batch_configs_nested(self):
+        """Nested batches should join the outermost batch"""
+        self.db.Session = MagicMock()
+        with self.db.batch_configs() as outer:
+            with self.db.batch_configs() as inner:
+                self.db.api_token = 'token'
+            self.assertIs(outer, inner)
+            self.db.Session.assert_not_called()
+        self.assertEqual({'api_token': 'token'}, outer)
+        self.db.Session.return_value.commit.assert_called_once_with()
+
     def test_categories(self):
         """Should pull the categories from the database"""
         self.db.Session = MagicMock()
@@ -626,6 +685,19 @@ class DbTestCase(unittest.TestCase):
         query.return_value.filter_by.return_value.first.assert_called_with()
         self.db.Session.return_value.close.assert_called_with()
 
+    def test_get_config_cached(self):
+        """Should only read the config from the database once"""
+        self.db.Session = MagicMock()
+        config = synack.db.models.Config(password='test', email='1@2.com')
+        query = self.db.Session.return_value.query
+        query.return_value.filter_by.return_value.first.return_value = config
+
+        self.assertEqual('test', self.db.get_config('password'))
+        self.assertEqual('1@2.com', self.db.get_config('email'))
+        self.assertEqual(config, self.db.get_config())
+
+        self.db.Session.assert_called_once_with()
+
     def test_get_config_empty_db(self):
         self.db.Session = MagicMock()
         query = self.db.Session.return_value.query
@@ -639,6 +711,22 @@ class DbTestCase(unittest.TestCase):
         self.db.Session.return_value.add.assert_called()
         self.db.Session.return_value.close.assert_called_with()
 
+    def test_get_migration(self):
+        """Should return the revision of an existing database"""
+        self.assertEqual(synack.db.HEAD_REVISION, self.db.get_migration())
+
+    def test_get_migration_new_db(self):
+        """Should return None if the database has never been migrated"""
+        self.db.engine = sqlalchemy.create_engine('sqlite://')
+        self.assertIsNone(self.db.get_migration())
+
+    def test_head_revision(self):
+        """HEAD_REVISION should match the newest alembic migration"""
+        config = alembic.config.Config()
+        config.set_main_option('script_location', str(pathlib.Path(synack.db.__file__).parent / 'alembic'))
+        script = alembic.script.ScriptDirectory.from_config(config)
+        self.assertEqual(script.get_current_head(), synack.db.HEAD_REVISION)
+
     def test_http_proxy(self):
         """Should set and get the http_proxy from the database"""
         self.db.get_config = MagicMock()
@@ -663,6 +751,20 @@ class DbTestCase(unittest.TestCase):
         self.assertEqual("123", self.db.https_proxy)
         self.db.get_config.assert_called_with("https_proxy")
 
+    def test_init_migration_behind(self):
+        """Should run migrations when the database is behind"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            self.state.config_dir = config_dir
+            with patch.object(alembic.command, 'upgrade') as mock_upgrade:
+                synack.plugins.Db(self.state)
+                mock_upgrade.assert_called_once()
+
+    def test_init_migration_current(self):
+        """Should not run migrations when the database is current"""
+        with patch.object(alembic.command, 'upgrade') as mock_upgrade:
+            synack.plugins.Db(self.state)
+            mock_upgrade.assert_not_called()
+
     def test_ips(self):
         """Should get all ips from the database"""
         self.db.Session = MagicMock()
@@ -674,6 +776,17 @@ class DbTestCase(unittest.TestCase):
         query.return_value.all.assert_called_with()
         self.db.Session.return_value.close.assert_called_with()
 
+    def test_missions(self):
+        """Should get all seen missions from the database"""
+        self.db.Session = MagicMock()
+        query = self.db.Session.return_value.query
+        query.return_value.all.return_value = 'missions'
+
+        self.assertEqual('missions', self.db.missions)
+        query.assert_called_with(synack.db.models.Mission)
+        query.return_value.all.assert_called_with()
+        self.db.Session.return_value.close.assert_called_with()
+
     def test_notifications_token(self):
         """Should pull notifications_token from the database"""
         self.db.get_config = MagicMock()
@@ -790,6 +903,31 @@ class DbTestCase(unittest.TestCase):
 
         self.db.get_config.assert_not_called()
 
+    def test_reload(self):
+        """Should read the config from the database again"""
+        self.db.Session = MagicMock()
+        query = self.db.Session.return_value.query
+        query.return_value.filter_by.return_value.first.return_value = synack.db.models.Config(password='old')
+        self.assertEqual('old', self.db.get_config('password'))
+
+        query.return_value.filter_by.return_value.first.return_value = synack.db.models.Config(password='new')
+        self.assertEqual('old', self.db.get_config('password'))
+        version = self.db.config_version
+        self.db.reload()
+        self.assertEqual(version + 1, self.db.config_version)
+        self.assertEqual('new', self.db.get_config('password'))
+        self.assertEqual(2, self.db.Session.call_count)
+
+    def test_remove_missions(self):
+        """Should delete the missions with the given IDs"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            self.state.config_dir = config_dir
+            db = synack.plugins.Db(self.state)
+            db.add_missions([{"id": i, "status": "PUBLISHED", "payout": {"amount": 10}} for i in "abc"])
+            db.remove_missions(["a", "c"])
+            self.assertEqual(["b"], [m.id for m in db.missions])
+            db.engine.dispose()
+
     def test_remove_targets(self):
         self.db.Session = MagicMock()
         self.db.remove_targets()
@@ -842,6 +980,10 @@ class DbTestCase(unittest.TestCase):
         self.db.set_config('password', 'bacon')
 
         self.assertEqual('bacon', config.password)
+        self.db.Session.return_value.refresh.assert_called_with(config)
+        self.db.Session.return_value.expunge.assert_called_with(config)
+        self.assertEqual('bacon', self.db.get_config('password'))
+        self.assertEqual(1, self.db.Session.call_count)
         query.assert_called_with(synack.db.models.Config)
         query.return_value.filter_by.assert_called_with(id=1)
         query.return_value.filter_by.return_value.first.assert_called_with()
@@ -859,6 +1001,46 @@ class DbTestCase(unittest.TestCase):
         query.assert_called_with(synack.db.models.Config)
         self.db.Session.return_value.add.assert_called()
 
+    def test_set_config_other_process(self):
+        """Changes made elsewhere should only show up after a reload"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            self.state.config_dir = config_dir
+            db = synack.plugins.Db(self.state)
+            other_state = synack._state.State()
+            other_state.config_dir = config_dir
+            other = synack.plugins.Db(other_state)
+
+            db.set_config('email', '1@2.com')
+            self.assertEqual('1@2.com', db.get_config('email'))
+            self.assertEqual('http://localhost:8080', db.get_config('http_proxy'))
+            self.assertEqual('1@2.com', other.get_config('email'))
+
+            db.set_config('email', '3@4.com')
+            self.assertEqual('1@2.com', other.get_config('email'))
+            other.reload()
+            self.assertEqual('3@4.com', other.get_config('email'))
+
+    def test_set_configs(self):
+        """Should set several configs with one commit"""
+        self.db.Session = MagicMock()
+        config = synack.db.models.Config()
+        query = self.db.Session.return_value.query
+        query.return_value.filter_by.return_value.first.return_value = config
+
+        version = self.db.config_version
+        self.db.set_configs(email='1@2.com', password='password1234')
+        self.assertEqual(version + 1, self.db.config_version)
+
+        self.assertEqual('1@2.com', config.email)
+        self.assertEqual('password1234', config.password)
+        self.db.Session.return_value.commit.assert_called_once_with()
+
+    def test_set_configs_empty(self):
+        """Should not touch the database if there is nothing to set"""
+        self.db.Session = MagicMock()
+        self.db.set_configs()
+        self.db.Session.assert_not_called()
+
     def test_set_migration(self):
         db_dir = pathlib.Path(__file__).parent.parent / 'src/synack/db'
         conf_dir = pathlib.Path('~/.config/synack').expanduser().resolve()
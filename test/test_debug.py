@@ -3,16 +3,19 @@
 Tests for the plugins/debug.py debug class
 """
 
-import datetime
+import io
+import logging
 import os
 import sys
+import tempfile
 import unittest
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
 
 import synack  # noqa: E402
+from synack.plugins.debug import HANDLER_NAME, Payload  # noqa: E402
 
 
 class DebugTestCase(unittest.TestCase):
@@ -20,10 +23,111 @@ class DebugTestCase(unittest.TestCase):
         self.state = synack._state.State()
         self.debug = synack.plugins.Debug(self.state)
         self.debug.db = MagicMock()
+        self.logger = self.debug.logger
+        self.stdout = io.StringIO()
+        stdout = patch('sys.stdout', self.stdout)
+        stdout.start()
+        self.addCleanup(stdout.stop)
+
+    def tearDown(self):
+        self.state.debug_file = None
+        self.debug._destination = None
+        if self.state.debug:
+            self.debug._set_handler()
+        for handler in [h for h in self.logger.handlers if h.name == HANDLER_NAME]:
+            self.logger.removeHandler(handler)
+        logging.getLogger('synack').propagate = True
+
+    def test_enabled(self):
+        """Should follow the Database as its config changes, and let the State override it"""
+        db_debug = PropertyMock(side_effect=[1, 0])
+        type(self.debug.db).debug = db_debug
+        self.assertTrue(self.debug.enabled)
+        self.assertFalse(self.debug.enabled)
+        self.state.debug = True
+        self.assertTrue(self.debug.enabled)
+        self.assertEqual(2, db_debug.call_count)
+
+    def test_log_disabled(self):
+        """Should not format or write anything while debugging is disabled"""
+        self.state.debug = False
+        payload = MagicMock()
+        with patch.object(self.debug.logger, 'debug') as mock_debug:
+            self.debug.log("title", "message %s", payload)
+            mock_debug.assert_not_called()
+        payload.__str__.assert_not_called()
 
     def test_log_enabled(self):
-        with patch('builtins.print') as mock_print:
-            now = datetime.datetime.strftime(datetime.datetime.now(),
-                                             "%Y-%m-%d %H:%M:%S")
+        """Should write the title and formatted message to stdout"""
+        self.state.debug = True
+        with self.assertLogs('synack', level='DEBUG') as logs:
+            self.debug.log("title", "message %s -- %s", 200, 'GET')
+            self.debug.log("title", "again")
+            handlers = [h for h in self.logger.handlers if h.name == HANDLER_NAME]
+        self.assertEqual('TITLE', logs.records[0].title)
+        self.assertEqual('message 200 -- GET', logs.records[0].getMessage())
+        self.assertEqual(1, len(handlers))
+        self.assertIsInstance(handlers[0], logging.StreamHandler)
+        self.assertRegex(self.stdout.getvalue(), r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d -- TITLE\n\tmessage 200 -- GET\n')
+
+    def test_log_file(self):
+        """Should write messages to debug_file through a queue"""
+        self.state.debug = True
+        with tempfile.TemporaryDirectory() as tmp:
+            self.state.debug_file = os.path.join(tmp, 'debug.log')
+            self.debug.log("Network Request", "%s", {'Authorization': 'Bearer 12345'})
+            handlers = [h for h in self.logger.handlers if h.name == HANDLER_NAME]
+            self.assertIsInstance(handlers[0], logging.handlers.QueueHandler)
+            self.debug._listener.stop()
+            self.debug._listener.start()
+            with open(self.state.debug_file) as fp:
+                content = fp.read()
+            self.assertIn(' -- NETWORK REQUEST\n\t', content)
+            self.assertIn("{'Authorization': 'Bearer REDACTED'}", content)
+            self.state.debug_file = None
             self.debug.log("title", "message")
-            mock_print.assert_called_with(f"{now} -- TITLE\n\tmessage")
+            self.assertIsNone(self.debug._listener)
+
+    def test_log_root(self):
+        """Should not also hand messages to the root logger, which apps may already write somewhere"""
+        self.state.debug = True
+        root = MagicMock(level=logging.DEBUG)
+        logging.getLogger().addHandler(root)
+        self.addCleanup(logging.getLogger().removeHandler, root)
+        self.debug.log("title", "message")
+        root.handle.assert_not_called()
+        self.assertIn('TITLE', self.stdout.getvalue())
+
+    def test_log_states(self):
+        """Handlers with their own States should each write to their own destination"""
+        other = synack.plugins.Debug(synack._state.State())
+        other.db = MagicMock()
+        self.addCleanup(lambda: [other.logger.removeHandler(h) for h in list(other.logger.handlers)])
+        self.state.debug = other.state.debug = True
+        with tempfile.TemporaryDirectory() as tmp:
+            self.state.debug_file = os.path.join(tmp, 'debug.log')
+            self.debug.log("first", "message")
+            other.log("second", "message")
+            self.debug.log("third", "message")
+            self.debug._listener.stop()
+            self.debug._listener.start()
+            with open(self.state.debug_file) as fp:
+                content = fp.read()
+            self.state.debug_file = None
+            self.debug.log("title", "message")
+        self.assertIn('FIRST', content)
+        self.assertIn('THIRD', content)
+        self.assertNotIn('SECOND', content)
+        self.assertIn('SECOND', self.stdout.getvalue())
+        self.assertNotIn('THIRD', self.stdout.getvalue())
+
+    def test_payload(self):
+        """Should redact secrets and truncate long values"""
+        self.assertEqual('200', str(Payload(200)))
+        self.assertEqual('{"a": "b"}', str(Payload(b'{"a": "b"}')))
+        self.assertEqual("{'Authorization': 'Bearer REDACTED', 'user_id': 'paco'}",
+                         str(Payload({'Authorization': 'Bearer abc.def', 'user_id': 'paco'})))
+        self.assertEqual('{"access_token": "REDACTED", "password": "REDACTED"}',
+                         str(Payload(b'{"access_token": "abc", "password": "pass word"}')))
+        self.assertEqual('abcde... (3 more characters)', str(Payload('abcdefgh', 5)))
+        self.assertEqual('abcdefgh', str(Payload('abcdefgh', None)))
@@ -0,0 +1,65 @@
+"""test_filelock.py
+
+Tests for the FileLock class
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from unittest.mock import ANY, MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._filelock  # noqa: E402
+
+
+def hold(path, events, release):
+    """Take the lock on path, and hold it until release is set"""
+    with synack._filelock.FileLock(path):
+        events.append('enter')
+        release.wait(1)
+        events.append('exit')
+
+
+class FileLockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'login.lock')
+
+    def test_lock(self):
+        """Only one holder of the same path should be inside the lock at a time"""
+        events = list()
+        release = threading.Event()
+        with synack._filelock.FileLock(self.path) as lock:
+            thread = threading.Thread(target=hold, args=(self.path, events, release))
+            thread.start()
+            thread.join(0.1)
+            self.assertEqual([], events)
+            self.assertIsNotNone(lock._fp)
+        release.set()
+        thread.join()
+        self.assertEqual(['enter', 'exit'], events)
+        self.assertIsNone(lock._fp)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_lock_error(self):
+        """Should close the file if it can not be locked"""
+        lock = synack._filelock.FileLock(self.path)
+        with patch.object(lock, '_lock', side_effect=OSError):
+            with self.assertRaises(OSError):
+                lock.__enter__()
+        self.assertTrue(lock._fp.closed)
+
+    def test_lock_windows(self):
+        """Should lock the first byte of the file with msvcrt on Windows, retrying until it gets it"""
+        msvcrt = MagicMock()
+        msvcrt.locking.side_effect = [OSError, None, None]
+        with patch.object(os, 'name', 'nt'), patch.dict(sys.modules, {'msvcrt': msvcrt}):
+            with synack._filelock.FileLock(self.path):
+                self.assertEqual(2, msvcrt.locking.call_count)
+                msvcrt.locking.assert_called_with(ANY, msvcrt.LK_LOCK, 1)
+        msvcrt.locking.assert_called_with(ANY, msvcrt.LK_UNLCK, 1)
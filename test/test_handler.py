@@ -3,23 +3,63 @@
 Tests for the Handler class
 """
 
+import alembic.command
+import asyncio
 import os
+import sqlalchemy
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
 
 import synack  # noqa: E402
 
 
+plugins = {name: getattr(synack.plugins, name) for name in synack.plugins.base.Plugin.registry.keys()}
+
+
 class HandlerTestCase(unittest.TestCase):
     def setUp(self):
         for plugin in synack.plugins.base.Plugin.registry.keys():
             synack.plugins.base.Plugin.registry[plugin] = MagicMock()
         self.handler = synack.Handler()
 
+    def test_async_handler(self):
+        """Should use the Async version of a plugin when there is one"""
+        handler = synack.AsyncHandler()
+        registry = synack.plugins.base.Plugin.registry
+        self.assertIs(registry['AsyncMissions'].return_value, handler.missions)
+        self.assertIs(registry['Auth'].return_value, handler.auth)
+        self.assertNotIn('Missions', handler.state.plugins)
+
+    def test_async_handler_close(self):
+        """Should close the AsyncApi session when leaving the context"""
+        handler = synack.AsyncHandler()
+        asyncio.run(handler.close())
+        handler.api.close = AsyncMock()
+        self.assertIs(handler, asyncio.run(handler.__aenter__()))
+        asyncio.run(handler.__aexit__(None, None, None))
+        handler.api.close.assert_awaited_once_with()
+
+    def test_defer_login(self):
+        """Should not log in until the first request when login is deferred"""
+        handler = synack.Handler(login=True, defer_login=True)
+        self.assertTrue(handler.state.login_pending)
+        self.assertNotIn('Auth', handler.state.plugins)
+
+    def test_lazy_plugins(self):
+        """Should only build plugins when they are first used"""
+        self.assertEqual(dict(), self.handler.state.plugins)
+        missions = self.handler.missions
+        self.assertIs(missions, self.handler.state.plugins['Missions'])
+        self.assertIs(missions, self.handler.missions)
+        self.assertNotIn('Targets', self.handler.state.plugins)
+
     def test_loads_plugins(self):
         """Should Load all Plugins"""
         plugins = [
@@ -34,7 +74,46 @@ class HandlerTestCase(unittest.TestCase):
         self.handler.login()
         self.handler.auth.get_api_token.assert_called_with()
 
+    def test_shares_plugins(self):
+        """Should build each plugin, and therefore each database engine, once"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            with patch.dict(synack.plugins.base.Plugin.registry, plugins), \
+                    patch.object(sqlalchemy, 'create_engine', wraps=sqlalchemy.create_engine) as mock_engine, \
+                    patch.object(alembic.command, 'upgrade') as mock_upgrade:
+                handler = synack.Handler(config_dir=config_dir, login=False)
+                for name in plugins.keys():
+                    getattr(handler, name.lower())
+            self.assertEqual(1, mock_engine.call_count)
+            self.assertEqual(1, mock_upgrade.call_count)
+            self.assertIs(handler.db, handler.api.db)
+            self.assertIs(handler.db, handler.missions.targets.db)
+            self.assertIs(handler.api, handler.auth.users.api)
+            self.assertIs(handler.state.plugins['Missions'], handler.missions)
+
+    def test_shares_plugins_threads(self):
+        """Threads using a plugin for the first time should all wait for the same one to be built"""
+        with tempfile.TemporaryDirectory() as config_dir:
+            with patch.dict(synack.plugins.base.Plugin.registry, plugins), \
+                    patch.object(alembic.command, 'upgrade', side_effect=lambda *a: time.sleep(0.1)) as mock_upgrade:
+                handler = synack.Handler(config_dir=config_dir, login=False)
+                barrier = threading.Barrier(8)
+                found = list()
+                threads = [threading.Thread(target=lambda: (barrier.wait(), found.append(
+                    (handler.missions, handler.missions.api, handler.missions.api.db)))) for i in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(1, mock_upgrade.call_count)
+            self.assertEqual([found[0]] * 8, found)
+            self.assertIs(handler.db, handler.missions.api.db)
+
     def test_state_kwargs(self):
         handler = synack.Handler(login=True, debug=False)
         self.assertTrue(handler.state.login)
         self.assertFalse(handler.state.debug)
+
+    def test_unknown_attribute(self):
+        """Should raise AttributeError for things that are not plugins"""
+        with self.assertRaises(AttributeError):
+            self.handler.not_a_plugin
@@ -3,7 +3,6 @@
 Tests for the Hydra Plugin
 """
 
-import json
 import os
 import sys
 import unittest
@@ -101,7 +100,6 @@ class HydraTestCase(unittest.TestCase):
     def test_get_hydra(self):
         """Should get information from Hydra"""
         query = {
-            'page': 1,
             'listing_uids': '87314gru',
             'q': '+port_is_open:true'
         }
@@ -110,56 +108,49 @@ class HydraTestCase(unittest.TestCase):
         self.hydra.db.find_targets.return_value = [
             synack.db.models.Target(codename='CRUSTYCRAB', slug='87314gru')
         ]
-        self.hydra.api.request.return_value.status_code = 200
-        content = '[{"somecontent": "content"}]'
-        self.hydra.api.request.return_value.content = content
+        content = [{"somecontent": "content"}]
+        self.hydra.api.paginate.return_value = iter(content)
         returned = self.hydra.get_hydra(codename='CRUSTYCRAB')
-        self.assertTrue(returned == json.loads(content))
-        self.hydra.api.request.assert_called_with('GET',
-                                                  'hydra_search/search',
-                                                  query=query)
-        self.hydra.build_db_input.assert_called_with(json.loads(content))
+        self.assertEqual(content, returned)
+        self.hydra.api.paginate.assert_called_with('GET',
+                                                   'hydra_search/search',
+                                                   page=1,
+                                                   per_page=10,
+                                                   max_pages=5,
+                                                   per_page_param=None,
+                                                   prefetch=True,
+                                                   query=query)
+        self.hydra.build_db_input.assert_called_with(content)
         self.hydra.db.add_ports.assert_called_with('BuildDbInputReturn')
 
     def test_get_hydra_multipage(self):
         """Should get information from Hydra spanning multiple pages"""
-        query = {
-            'page': 2,
-            'listing_uids': '87314gru',
-            'q': '+port_is_open:true'
-        }
         self.hydra.build_db_input = MagicMock()
         self.hydra.db.find_targets.return_value = [
             synack.db.models.Target(codename='CRUSTYCRAB', slug='87314gru')
         ]
-        content = '[' + ','.join(['{"somecontent": "content"}' for i in range(0, 10)]) + ']'
-        self.hydra.api.request.return_value.status_code = 200
-        self.hydra.api.request.return_value.content = content
-        returned = self.hydra.get_hydra(codename='CRUSTYCRAB', max_page=2)
+        self.hydra.api.paginate.return_value = iter([{"somecontent": "content"}] * 20)
+        returned = self.hydra.get_hydra(codename='CRUSTYCRAB', max_page=0)
         self.assertTrue(len(returned) == 20)
-        self.hydra.api.request.assert_called_with('GET',
-                                                  'hydra_search/search',
-                                                  query=query)
+        self.assertEqual(1000, self.hydra.api.paginate.call_args.kwargs['max_pages'])
+        self.hydra.db.add_ports.assert_called_once()
+
+    def test_get_hydra_no_target(self):
+        """Should return None if the target is unknown"""
+        self.hydra.db.find_targets.return_value = []
+        self.assertIsNone(self.hydra.get_hydra(codename='CRUSTYCRAB'))
+        self.hydra.api.paginate.assert_not_called()
 
     def test_get_hydra_no_update_db(self):
         """Should get information from Hydra without updating the DB"""
-        query = {
-            'page': 1,
-            'listing_uids': '87314gru',
-            'q': '+port_is_open:true'
-        }
         self.hydra.build_db_input = MagicMock()
         self.hydra.build_db_input.return_value = 'BuildDbInputReturn'
         self.hydra.db.find_targets.return_value = [
             synack.db.models.Target(codename='CRUSTYCRAB', slug='87314gru')
         ]
-        self.hydra.api.request.return_value.status_code = 200
-        content = '[{"somecontent": "content"}]'
-        self.hydra.api.request.return_value.content = content
+        content = [{"somecontent": "content"}]
+        self.hydra.api.paginate.return_value = iter(content)
         returned = self.hydra.get_hydra(codename='CRUSTYCRAB', update_db=False)
-        self.assertTrue(returned == json.loads(content))
-        self.hydra.api.request.assert_called_with('GET',
-                                                  'hydra_search/search',
-                                                  query=query)
+        self.assertEqual(content, returned)
         self.hydra.build_db_input.assert_not_called()
         self.hydra.db.add_ports.assert_not_called()
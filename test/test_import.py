@@ -0,0 +1,47 @@
+"""test_import.py
+
+Tests for what gets pulled in by `import synack`
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+src = os.path.abspath(os.path.join(__file__, '../../src'))
+
+
+def import_times(statement):
+    """Return the modules imported by a statement, as measured by `python -X importtime`"""
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                         cwd=src, capture_output=True, text=True, check=True)
+    ret = dict()
+    for line in res.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            _, self_us, cumulative_us, name = [p.strip() for p in line.replace(':', '|', 1).split('|')]
+            ret[name] = int(cumulative_us)
+    return ret
+
+
+class ImportTestCase(unittest.TestCase):
+    heavy = ['alembic', 'asyncio', 'email.message', 'pyotp', 'requests', 'smtplib', 'sqlalchemy']
+    budget_us = 250000
+
+    def test_import_defers_heavy_modules(self):
+        """Importing synack should not import modules only some functions need"""
+        modules = import_times('import synack')
+        self.assertIn('synack', modules)
+        for name in self.heavy:
+            self.assertNotIn(name, modules)
+
+    def test_import_registers_plugins(self):
+        """Deferring imports should not stop plugins from registering"""
+        names = ['Alerts', 'Api', 'AsyncApi', 'AsyncHydra', 'AsyncMissions', 'AsyncTargets', 'Auth', 'Db', 'Debug',
+                 'Hydra', 'Metrics', 'Missions', 'Notifications', 'Scratchspace', 'Targets', 'Templates',
+                 'Transactions', 'Users']
+        import_times(f'import synack; assert {set(names)!r} <= set(synack.plugins.base.Plugin.registry)')
+
+    def test_import_time(self):
+        """Importing synack should stay well under its time budget"""
+        modules = import_times('import synack')
+        self.assertLess(modules['synack'], self.budget_us)
@@ -0,0 +1,61 @@
+"""test_json.py
+
+Tests for the JSON backends and compression of responses
+"""
+
+import json
+import orjson
+import os
+import requests
+import sys
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._json  # noqa: E402
+
+
+def build_response(content, encoding=None):
+    res = requests.models.Response()
+    res.status_code = 200
+    res.encoding = encoding
+    res._content = content
+    return res
+
+
+class JSONTestCase(unittest.TestCase):
+    def test_decode(self):
+        """Should decode with loads"""
+        loads = MagicMock(return_value={'fast': True})
+        self.assertEqual({'fast': True}, synack._json.decode(build_response(b'{"a": 1}'), loads))
+        loads.assert_called_with(b'{"a": 1}')
+
+    def test_decode_fallback(self):
+        """Bodies and arguments loads can not handle should be left to requests"""
+        res = build_response('{"a": "é"}'.encode('utf-16'), 'utf-16')
+        self.assertEqual({'a': 'é'}, synack._json.decode(res, orjson.loads))
+        self.assertEqual({'a': 1.5}, synack._json.decode(build_response(b'{"a": 1.5}'), orjson.loads,
+                                                         parse_float=float))
+        with self.assertRaises(requests.exceptions.JSONDecodeError):
+            synack._json.decode(build_response(b''), orjson.loads)
+
+    def test_get_accept_encoding(self):
+        """Should only offer brotli when it can be decoded"""
+        with patch.dict(sys.modules, {'brotli': None}):
+            self.assertEqual('gzip, deflate', synack._json.get_accept_encoding())
+        with patch.dict(sys.modules, {'brotli': MagicMock()}):
+            self.assertEqual('gzip, deflate, br', synack._json.get_accept_encoding())
+
+    def test_get_loads(self):
+        """Should use orjson when it is installed unless json is asked for"""
+        self.assertEqual(orjson.loads, synack._json.get_loads())
+        self.assertEqual(orjson.loads, synack._json.get_loads('orjson'))
+        self.assertEqual(json.loads, synack._json.get_loads('json'))
+        with patch.dict(sys.modules, {'orjson': None}):
+            self.assertEqual(json.loads, synack._json.get_loads())
+            with self.assertRaises(ImportError):
+                synack._json.get_loads('orjson')
+        with self.assertRaises(ValueError):
+            synack._json.get_loads('simplejson')
@@ -0,0 +1,66 @@
+"""test_limiter.py
+
+Tests for the RateLimiter class
+"""
+
+import os
+import sys
+import unittest
+
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._limiter  # noqa: E402
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.limits = {
+            'platform.synack.com': (10, 2),
+            'platform.synack.com/tasks': (1, 1),
+            'login.synack.com': None
+        }
+        with patch('time.monotonic', return_value=100):
+            self.limiter = synack._limiter.RateLimiter(self.limits)
+
+    def test_get_keys(self):
+        """Should return the host and endpoint class of a URL"""
+        self.assertEqual(['platform.synack.com', 'platform.synack.com/tasks'],
+                         self.limiter._get_keys('https://platform.synack.com/api/tasks/v2/tasks?page=1'))
+        self.assertEqual(['notifications.synack.com', 'notifications.synack.com/notifications'],
+                         self.limiter._get_keys('https://notifications.synack.com/api/v2/notifications'))
+        self.assertEqual(['login.synack.com'], self.limiter._get_keys('https://login.synack.com/'))
+
+    def test_no_limit(self):
+        """Should never wait for hosts without a limit"""
+        with patch('time.monotonic', return_value=100):
+            for i in range(10):
+                self.assertEqual(0, self.limiter.reserve('https://login.synack.com/api/authenticate'))
+                self.assertEqual(0, self.limiter.reserve('https://hooks.slack.com/something'))
+
+    def test_pause(self):
+        """Should make every request to a host wait after a pause"""
+        with patch('time.monotonic', return_value=100):
+            self.limiter.pause('https://platform.synack.com/api/targets', 5)
+            self.assertAlmostEqual(5, self.limiter.reserve('https://platform.synack.com/api/targets'))
+            self.assertAlmostEqual(5.1, self.limiter.reserve('https://platform.synack.com/api/targets'))
+        with patch('time.monotonic', return_value=110):
+            self.assertEqual(0, self.limiter.reserve('https://platform.synack.com/api/targets'))
+
+    def test_reserve(self):
+        """Should allow a burst, then wait for the bucket to refill"""
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual(0, self.limiter.reserve('https://platform.synack.com/api/targets'))
+            self.assertEqual(0, self.limiter.reserve('https://platform.synack.com/api/targets'))
+            self.assertAlmostEqual(0.1, self.limiter.reserve('https://platform.synack.com/api/targets'))
+            self.assertAlmostEqual(0.2, self.limiter.reserve('https://platform.synack.com/api/targets'))
+        with patch('time.monotonic', return_value=101):
+            self.assertEqual(0, self.limiter.reserve('https://platform.synack.com/api/targets'))
+
+    def test_reserve_endpoint_class(self):
+        """Should wait for the slowest bucket a URL belongs to"""
+        with patch('time.monotonic', return_value=100):
+            self.assertEqual(0, self.limiter.reserve('https://platform.synack.com/api/tasks/v2/tasks'))
+            self.assertAlmostEqual(1, self.limiter.reserve('https://platform.synack.com/api/tasks/v2/tasks'))
+            self.assertAlmostEqual(0.1, self.limiter.reserve('https://platform.synack.com/api/targets'))
@@ -0,0 +1,56 @@
+"""test_metrics.py
+
+Tests for the plugins/metrics.py Metrics Class
+"""
+
+import os
+import requests
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state = synack._state.State()
+        self.metrics = synack.plugins.Metrics(self.state)
+        self.state.request_metrics.record('GET', 'https://platform.synack.com/api/profiles/me', 200, 0.02, 10)
+
+    def test_clear(self):
+        """Should forget every request recorded so far"""
+        self.metrics.clear()
+        self.assertEqual(dict(), self.metrics.get_snapshot())
+
+    def test_get_prometheus(self):
+        """Should return the metrics of the State in the Prometheus format"""
+        self.assertEqual(self.state.request_metrics.to_prometheus(), self.metrics.get_prometheus())
+
+    def test_get_snapshot(self):
+        """Should return the metrics of the State as a dict"""
+        snapshot = self.metrics.get_snapshot()
+        self.assertEqual(1, snapshot['GET platform.synack.com/api/profiles/me']['count'])
+
+    def test_set_prometheus_file(self):
+        """Should replace the file with the current metrics"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'synack.prom')
+            with open(path, 'w') as fp:
+                fp.write('old')
+            self.assertEqual(path, str(self.metrics.set_prometheus_file(path)))
+            with open(path) as fp:
+                self.assertEqual(self.metrics.get_prometheus(), fp.read())
+            self.assertEqual(['synack.prom'], os.listdir(tmp))
+
+    def test_set_prometheus_server(self):
+        """Should serve the current metrics over HTTP"""
+        server = self.metrics.set_prometheus_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        res = requests.get(f'http://127.0.0.1:{server.server_port}/metrics')
+        self.assertEqual(200, res.status_code)
+        self.assertTrue(res.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertEqual(self.metrics.get_prometheus(), res.text)
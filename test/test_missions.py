@@ -6,14 +6,18 @@ Tests for the plugins/missions.py Missions Class
 import datetime
 import os
 import random
+import requests
 import sys
+import tempfile
 import unittest
 
 from unittest.mock import MagicMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '..')))
 
 import synack  # noqa: E402
+from pages import build_pages  # noqa: E402
 
 
 class MissionsTestCase(unittest.TestCase):
@@ -25,6 +29,34 @@ class MissionsTestCase(unittest.TestCase):
         self.missions.targets = MagicMock()
         self.missions.templates = MagicMock()
 
+    def test_build_claims(self):
+        """Should prepare a claim for each mission with the current API token"""
+        self.missions.db.api_token = "12345"
+        self.missions.api.prepare.side_effect = ["prepared1", "prepared2"]
+        missions = [
+            {"organizationUid": "o", "listingUid": "l", "campaignUid": "c", "id": "1"},
+            {"organizationUid": "o", "listingUid": "l", "campaignUid": "c", "id": "2"}
+        ]
+        self.assertEqual(2, self.missions.build_claims(missions))
+        self.missions.api.prepare.assert_called_with('POST',
+                                                     'tasks/v1/organizations/o/listings/l/campaigns/c' +
+                                                     '/tasks/2/transitions',
+                                                     data={"type": "CLAIM"})
+        self.assertEqual({"1": ("12345", "prepared1"), "2": ("12345", "prepared2")}, self.missions._claims)
+
+    def test_build_claims_evicted(self):
+        """Should only keep the most recent claims, and drop the ones prepared with an old API token"""
+        self.missions.db.api_token = "12345"
+        missions = [{"organizationUid": "o", "listingUid": "l", "campaignUid": "c", "id": str(i)} for i in range(3)]
+        with unittest.mock.patch.object(synack.plugins.missions, 'MAX_CLAIMS', 2):
+            self.missions.build_claims(missions)
+            self.assertEqual(["1", "2"], list(self.missions._claims))
+            self.missions.build_claims(missions[1:2])
+            self.assertEqual(["2", "1"], list(self.missions._claims))
+            self.missions.db.api_token = "67890"
+            self.missions.build_claims(missions[:1])
+            self.assertEqual(["0"], list(self.missions._claims))
+
     def test_build_order(self):
         """Should sort by payout high (default)"""
         m = [
@@ -157,6 +189,44 @@ class MissionsTestCase(unittest.TestCase):
 
         self.assertEqual(ret, self.missions.build_summary(m))
 
+    def test_diff(self):
+        """Should return the missions that appeared, changed or went away, and only write those"""
+        a = {"id": "a", "status": "PUBLISHED", "payout": {"amount": 10}}
+        b = {"id": "b", "status": "PUBLISHED", "payout": {"amount": 25}}
+        self.missions.db.missions = [MagicMock(id="z", status="PUBLISHED", payout=50.0)]
+        self.assertEqual({'new': [a, b], 'changed': [], 'gone': [{'id': 'z', 'status': 'PUBLISHED', 'payout': 50.0}]},
+                         self.missions.diff([a, b]))
+        self.missions.db.add_missions.assert_called_once_with([a, b])
+        self.missions.db.remove_missions.assert_called_once_with(["z"])
+        self.assertEqual({'new': [], 'changed': [], 'gone': []}, self.missions.diff([a, b]))
+        self.missions.db.add_missions.assert_called_once_with([a, b])
+        self.missions.db.remove_missions.assert_called_once_with(["z"])
+
+    def test_diff_persisted(self):
+        """Should carry on from the missions kept in the Database"""
+        a = {"id": "a", "status": "PUBLISHED", "payout": {"amount": 10}}
+        b = {"id": "b", "status": "PUBLISHED", "payout": {"amount": 25}}
+        c = {"id": "c", "status": "PUBLISHED", "payout": {"amount": 50}}
+        with tempfile.TemporaryDirectory() as config_dir:
+            self.state = synack._state.State()
+            self.state.config_dir = config_dir
+            missions = synack.plugins.Missions(self.state)
+            missions.db = synack.plugins.Db(self.state)
+            self.assertEqual([a, b], missions.diff([a, b])['new'])
+            missions.db.engine.dispose()
+            self.state = synack._state.State()
+            self.state.config_dir = config_dir
+            missions = synack.plugins.Missions(self.state)
+            missions.db = synack.plugins.Db(self.state)
+            claimed = {**b, "status": "CLAIMED"}
+            self.assertEqual({'new': [c], 'changed': [claimed], 'gone': []}, missions.diff([a, claimed, c]))
+            ret = missions.diff([c])
+            self.assertEqual({'a', 'b'}, {m['id'] for m in ret['gone']})
+            self.assertEqual({'id': 'b', 'status': 'CLAIMED', 'payout': 25.0},
+                             [m for m in ret['gone'] if m['id'] == 'b'][0])
+            self.assertEqual(['c'], [m.id for m in missions.db.missions])
+            missions.db.engine.dispose()
+
     def test_get_approved(self):
         """Should request APPROVED missions"""
         self.missions.get = MagicMock()
@@ -283,31 +353,96 @@ class MissionsTestCase(unittest.TestCase):
                                                      query=query)
 
     def test_get_multi_page(self):
-        """Should get a list missions across multiple pages"""
-        q1 = {
+        """Should page through the missions when the total is not known"""
+        query = {
             "status": "CLAIMED",
-            "perPage": 5,
+            "perPage": 1,
             "page": 2,
             "viewed": "true",
             "listingUids": "49fh48g7"
         }
         self.missions.api.request.return_value.status_code = 200
-        self.missions.api.request.return_value.json.side_effect = [
-            ["mission_one"],
-            ["mission_two"],
-            ["mission_three"]
-        ]
-        calls = [
-            unittest.mock.call("GET",
-                               "tasks/v2/tasks",
-                               query=q1)
-        ]
+        self.missions.api.request.return_value.headers = {}
+        self.missions.api.request.return_value.json.return_value = ["mission_one"]
+        self.missions.api.paginate.return_value = iter(["mission_two"])
         self.assertEqual(["mission_one", "mission_two"],
-                         self.missions.get(max_pages=2,
-                                           per_page=1))
-        self.missions.api.request.has_calls(calls)
+                         self.missions.get("CLAIMED",
+                                           max_pages=2,
+                                           per_page=1,
+                                           listing_uids="49fh48g7"))
+        self.missions.api.paginate.assert_called_with("GET",
+                                                      "tasks/v2/tasks",
+                                                      page=2,
+                                                      per_page=1,
+                                                      max_pages=2,
+                                                      prefetch=True,
+                                                      strict=True,
+                                                      query=query)
+        self.assertEqual(1, self.missions.api.request.call_count)
+
+    def test_get_multi_page_concurrent(self):
+        """Should get the remaining pages at once and keep them in order"""
+        pages = {
+            1: ['1', '2'],
+            2: ['3', '4'],
+            3: ['5', '6'],
+            4: ['7']
+        }
+        self.missions.api.request.side_effect = build_pages(pages, 7, {2: 0.1})
+        self.state.page_workers = 3
+        ret = self.missions.get("CLAIMED", max_pages=10, per_page=2, listing_uids="49fh48g7")
+        self.assertEqual(['1', '2', '3', '4', '5', '6', '7'], ret)
+        self.assertEqual(4, self.missions.api.request.call_count)
+        query = {
+            "status": "CLAIMED",
+            "perPage": 2,
+            "page": 4,
+            "viewed": "true",
+            "listingUids": "49fh48g7"
+        }
+        self.missions.api.request.assert_any_call("GET", "tasks/v2/tasks", query=query)
+
+    def test_get_multi_page_failed(self):
+        """Should return None rather than a partial list if a page could not be retrieved"""
+        pages = {
+            1: ['1', '2'],
+            3: ['5']
+        }
+        self.missions.api.request.side_effect = build_pages(pages, 5)
+        self.assertIsNone(self.missions.get(max_pages=3, per_page=2))
+        self.assertEqual(3, self.missions.api.request.call_count)
+
+    def test_get_multi_page_failed_paginate(self):
+        """Should return None if a page fails while the total is not known"""
+        self.missions.api.request.return_value.status_code = 200
+        self.missions.api.request.return_value.headers = {}
+        self.missions.api.request.return_value.json.return_value = ["mission_one"]
+        self.missions.api.paginate.side_effect = requests.HTTPError('500 Error getting page 2')
+        self.assertIsNone(self.missions.get(max_pages=3, per_page=1))
+
+    def test_get_multi_page_max_pages(self):
+        """Should not get pages past max_pages, whatever x-count says"""
+        pages = {
+            1: ['1'],
+            2: ['2'],
+            3: ['3']
+        }
+        self.missions.api.request.side_effect = build_pages(pages, 100)
+        self.assertEqual(['1', '2'], self.missions.get(max_pages=2, per_page=1))
         self.assertEqual(2, self.missions.api.request.call_count)
 
+    def test_get_new(self):
+        """Should return the available missions not seen last time"""
+        self.missions.get = MagicMock(return_value=['one', 'two'])
+        self.missions.diff = MagicMock(return_value={'new': ['two'], 'changed': [], 'gone': []})
+        self.assertEqual(['two'], self.missions.get_new())
+        self.missions.get.assert_called_with("PUBLISHED", max_pages=50)
+        self.missions.diff.assert_called_with(['one', 'two'])
+        self.missions.get.return_value = None
+        self.assertIsNone(self.missions.get_new(max_pages=2))
+        self.missions.get.assert_called_with("PUBLISHED", max_pages=2)
+        self.assertEqual(1, self.missions.diff.call_count)
+
     def test_get_wallet_claimed(self):
         """Should report the Mission Wallet Claimed Amount"""
         self.missions.api.request.return_value.status_code = 200
@@ -335,6 +470,38 @@ class MissionsTestCase(unittest.TestCase):
         self.assertEqual(["ret"], self.missions.set_claimed(["yup"]))
         self.missions.set_status.assert_called_with(["yup"], "CLAIM")
 
+    def test_set_claimed_prepared(self):
+        """Should send a prepared claim once, unless the API token changed or was rejected"""
+        m = {
+            "listingUid": "4wr7egtu",
+            "id": "4i3eg86fyu",
+            "payout": {"amount": 10},
+            "title": "Some Mission"
+        }
+        ret = {
+            "target": "4wr7egtu",
+            "title": "Some Mission",
+            "payout": "10",
+            "status": "CLAIM",
+            "success": True
+        }
+        self.missions.set_status = MagicMock(return_value="slow")
+        self.missions.db.api_token = "12345"
+        self.missions.api.send_prepared.return_value.status_code = 201
+        self.missions._claims = {"4i3eg86fyu": ("12345", "prepared")}
+        self.assertEqual(ret, self.missions.set_claimed(m))
+        self.missions.api.send_prepared.assert_called_once_with("prepared")
+        self.assertEqual("slow", self.missions.set_claimed(m))
+        self.missions.set_status.assert_called_with(m, "CLAIM")
+        self.missions._claims = {"4i3eg86fyu": ("old", "prepared")}
+        self.assertEqual("slow", self.missions.set_claimed(m))
+        self.missions.api.send_prepared.assert_called_once_with("prepared")
+        self.missions._claims = {"4i3eg86fyu": ("12345", "prepared")}
+        self.missions.api.send_prepared.return_value.status_code = 401
+        self.assertEqual("slow", self.missions.set_claimed(m))
+        self.assertEqual(2, self.missions.api.send_prepared.call_count)
+        self.assertEqual(dict(), self.missions._claims)
+
     def test_set_disclaimed(self):
         """Should send a DISCLAIM to set_status"""
         self.missions.set_status = MagicMock()
@@ -446,3 +613,15 @@ class MissionsTestCase(unittest.TestCase):
                                data=data)
         ]
         self.missions.api.request.has_calls(calls)
+
+    def test_watch(self):
+        """Should poll for new missions in this thread, or from a background thread"""
+        callback = MagicMock()
+        with unittest.mock.patch.object(synack.plugins.missions, 'MissionWatcher') as mock_watcher:
+            self.assertIs(mock_watcher.return_value, self.missions.watch(callback, interval=10))
+            mock_watcher.assert_called_with(self.missions, [callback], interval=10)
+            mock_watcher.return_value.run.assert_called_once_with()
+            mock_watcher.return_value.start.assert_not_called()
+            self.assertIs(mock_watcher.return_value.start.return_value, self.missions.watch(block=False))
+            mock_watcher.assert_called_with(self.missions, None)
+            mock_watcher.return_value.start.assert_called_once_with()
@@ -0,0 +1,108 @@
+"""test_request_metrics.py
+
+Tests for the RequestMetrics class
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._metrics  # noqa: E402
+
+
+class RequestMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.metrics = synack._metrics.RequestMetrics()
+
+    def test_clear(self):
+        """Should forget every endpoint"""
+        self.metrics.record('GET', 'https://platform.synack.com/api/profiles/me', 200, 0.1, 10)
+        self.metrics.clear()
+        self.assertEqual(dict(), self.metrics.snapshot())
+
+    def test_get_endpoint(self):
+        """Should collapse IDs but keep API versions and names"""
+        url = 'https://platform.synack.com/api/tasks/v1/organizations/4rtgd8/listings/9e8wrg' + \
+              '/campaigns/27493fe8r/tasks/4i3eg86fyu/transitions?page=2'
+        self.assertEqual('platform.synack.com/api/tasks/v1/organizations/.../listings/.../campaigns/.../tasks/...' +
+                         '/transitions', synack._metrics.get_endpoint(url))
+        self.assertEqual('platform.synack.com/api/hydra_search/search',
+                         synack._metrics.get_endpoint('https://platform.synack.com/api/hydra_search/search'))
+        self.assertEqual('platform.synack.com/api/targets/.../resources',
+                         synack._metrics.get_endpoint('https://platform.synack.com/api/targets/u4fh8/resources'))
+
+    def test_get_endpoint_slugs(self):
+        """Should collapse IDs without a digit that follow a collection, but not the named endpoints there"""
+        for slug in ['qwertyui', 'abcdefgh']:
+            self.assertEqual('platform.synack.com/api/targets/.../signup',
+                             synack._metrics.get_endpoint(f'https://platform.synack.com/api/targets/{slug}/signup'))
+        url = 'https://platform.synack.com/api/tasks/v2/tasks/abcdef/evidences'
+        self.assertEqual('platform.synack.com/api/tasks/v2/tasks/.../evidences', synack._metrics.get_endpoint(url))
+        for path in ['profiles/me', 'targets/registered_summary', 'users/notifications_token', 'tasks/v2/tasks',
+                     'tasks/v2/researcher/claimed_amount', 'targets', 'hydra_search/search']:
+            self.assertEqual(f'platform.synack.com/api/{path}',
+                             synack._metrics.get_endpoint(f'https://platform.synack.com/api/{path}'))
+
+    def test_get_percentile(self):
+        """Should return the nearest-rank percentiles of the recent latencies"""
+        endpoint = synack._metrics.EndpointMetrics()
+        self.assertIsNone(endpoint.get_percentile(50))
+        for i in range(1, 101):
+            endpoint.record(200, i / 100, 0)
+        self.assertEqual(0.5, endpoint.get_percentile(50))
+        self.assertEqual(0.95, endpoint.get_percentile(95))
+        self.assertEqual(0.99, endpoint.get_percentile(99))
+        self.assertEqual(0.01, endpoint.get_percentile(0))
+
+    def test_record_threads(self):
+        """Should not lose any request recorded from many threads at once"""
+        url = 'https://platform.synack.com/api/tasks/v2/tasks'
+        threads = [threading.Thread(target=lambda: [self.metrics.record('GET', url, 200, 0.01, 1)
+                                                    for i in range(100)]) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(800, self.metrics.snapshot()['GET platform.synack.com/api/tasks/v2/tasks']['count'])
+
+    def test_snapshot(self):
+        """Should report count, statuses, bytes and latency of each endpoint"""
+        self.metrics.record('GET', 'https://platform.synack.com/api/targets/abc1/resources', 200, 0.1, 100)
+        self.metrics.record('GET', 'https://platform.synack.com/api/targets/def2/resources', 200, 0.3, 50)
+        self.metrics.record('GET', 'https://platform.synack.com/api/targets/def2/resources', 429, 0.2, 0)
+        self.metrics.record('POST', 'https://platform.synack.com/api/targets/def2/signup', 200, 1, 2)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(['GET platform.synack.com/api/targets/.../resources',
+                          'POST platform.synack.com/api/targets/.../signup'], list(snapshot.keys()))
+        resources = snapshot['GET platform.synack.com/api/targets/.../resources']
+        self.assertEqual(3, resources['count'])
+        self.assertEqual(150, resources['bytes'])
+        self.assertEqual({200: 2, 429: 1}, resources['statuses'])
+        self.assertAlmostEqual(0.2, resources['latency']['mean'])
+        self.assertEqual(0.2, resources['latency']['p50'])
+        self.assertEqual(0.3, resources['latency']['p99'])
+
+    def test_to_prometheus(self):
+        """Should export counters and a cumulative latency histogram"""
+        self.metrics.record('GET', 'https://platform.synack.com/api/profiles/me', 200, 0.02, 10)
+        self.metrics.record('GET', 'https://platform.synack.com/api/profiles/me', 503, 20, 0)
+        text = self.metrics.to_prometheus()
+        labels = 'method="GET",endpoint="platform.synack.com/api/profiles/me"'
+        self.assertIn('# TYPE synack_requests_total counter\n', text)
+        self.assertIn(f'synack_requests_total{{{labels},status="200"}} 1\n', text)
+        self.assertIn(f'synack_requests_total{{{labels},status="503"}} 1\n', text)
+        self.assertIn(f'synack_response_bytes_total{{{labels}}} 10\n', text)
+        self.assertIn(f'synack_request_duration_seconds_bucket{{{labels},le="0.01"}} 0\n', text)
+        self.assertIn(f'synack_request_duration_seconds_bucket{{{labels},le="0.025"}} 1\n', text)
+        self.assertIn(f'synack_request_duration_seconds_bucket{{{labels},le="10"}} 1\n', text)
+        self.assertIn(f'synack_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2\n', text)
+        self.assertIn(f'synack_request_duration_seconds_count{{{labels}}} 2\n', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_to_prometheus_escaped(self):
+        """Should escape label values"""
+        self.metrics.record('GET', 'https://example.com/a"b\\c', 200, 0.02, 10)
+        self.assertIn('endpoint="example.com/a\\"b\\\\c"', self.metrics.to_prometheus())
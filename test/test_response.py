@@ -0,0 +1,25 @@
+"""test_response.py
+
+Tests for the build_response function
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._response  # noqa: E402
+
+
+class BuildResponseTestCase(unittest.TestCase):
+    def test_build_response(self):
+        """Should build a requests Response that reads like one requests received"""
+        res = synack._response.build_response(404, 'Not Found', 'https://platform.synack.com/api/x',
+                                              {'content-type': 'application/json; charset=utf-8'}, b'{"a": 1}')
+        self.assertEqual((404, 'Not Found'), (res.status_code, res.reason))
+        self.assertEqual('https://platform.synack.com/api/x', res.url)
+        self.assertEqual('application/json; charset=utf-8', res.headers['Content-Type'])
+        self.assertEqual('utf-8', res.encoding)
+        self.assertEqual({'a': 1}, res.json())
+        self.assertEqual([b'{"a": 1}'], list(res.iter_content(100)))
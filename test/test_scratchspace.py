@@ -3,9 +3,12 @@
 Tests for the plugins/scratchspace.py Db class
 """
 
+import hashlib
 import os
 import pathlib
+import requests
 import sys
+import tempfile
 import unittest
 
 from unittest.mock import MagicMock, patch, mock_open
@@ -15,6 +18,20 @@ sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
 import synack  # noqa: E402
 
 
+def build_response(status_code, chunks, error=None, headers=None):
+    """Return a mock streamed response whose body is sent in chunks, optionally failing part way through"""
+    def iter_content(chunk_size=None):
+        yield from chunks
+        if error:
+            raise error
+
+    res = MagicMock()
+    res.status_code = status_code
+    res.headers = headers or dict()
+    res.iter_content = iter_content
+    return res
+
+
 class ScratchspaceTestCase(unittest.TestCase):
     def setUp(self):
         self.state = synack._state.State()
@@ -77,46 +94,137 @@ class ScratchspaceTestCase(unittest.TestCase):
             m.return_value.write.assert_called_with('{"test": "test"}')
             m.assert_called_with('/tmp/TIREDTURKEY/burp.txt', 'w')
 
+    def test_set_download_attachments_checksum(self):
+        """Should only keep downloads whose checksum matches"""
+        attachments = [
+            {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'},
+            {'slug': '43i7i', 'filename': 'file2.txt', 'url': 'https://downloads.com/abcd'}
+        ]
+        checksums = {
+            'file1.txt': 'sha256:' + hashlib.sha256(b'file_content').hexdigest().upper(),
+            'file2.txt': hashlib.sha256(b'other_content').hexdigest()
+        }
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.side_effect = [build_response(200, [b'file_', b'content']),
+                                                     build_response(200, [b'file_content'])]
+        with tempfile.TemporaryDirectory() as tmp:
+            self.scratchspace.build_filepath = lambda filename, **kwargs: pathlib.Path(tmp) / filename
+            ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER',
+                                                             checksums=checksums)
+            self.assertEqual([pathlib.Path(tmp) / 'file1.txt'], ret)
+            self.assertEqual(['file1.txt'], os.listdir(tmp))
+
     def test_set_download_attachments_codename(self):
-        """Should download files give a list of attachments"""
-        dest_path = pathlib.Path('/tmp/TIREDTURKEY/burp.txt')
-        self.scratchspace.build_filepath = MagicMock()
-        self.scratchspace.build_filepath.return_value = dest_path
-        self.scratchspace.api.request = MagicMock()
-        self.scratchspace.api.request.return_value.status_code = 200
-        self.scratchspace.api.request.return_value.content = b'file_content'
-        m = mock_open()
+        """Should stream each attachment into place"""
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.return_value = build_response(200, [b'file_', b'content'])
         attachments = [
             {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'}
         ]
-        with patch('builtins.open', m, create=True):
+        with tempfile.TemporaryDirectory() as tmp:
+            dest_path = pathlib.Path(tmp) / 'file1.txt'
+            self.scratchspace.build_filepath = MagicMock(return_value=dest_path)
             ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER')
             self.assertEqual([dest_path], ret)
-            m.return_value.write.assert_called_with(b'file_content')
-            m.assert_called_with(dest_path, 'wb')
+            self.assertEqual(b'file_content', dest_path.read_bytes())
+            self.assertEqual(['file1.txt'], os.listdir(tmp))
+            self.scratchspace.api.request.assert_called_with('GET', 'https://downloads.com/xyzf',
+                                                             headers=None, stream=True)
+            self.scratchspace.api.request.return_value.close.assert_called_with()
+
+    def test_set_download_attachments_failed(self):
+        """Should not return attachments that could not be downloaded"""
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.return_value = build_response(404, [])
+        attachments = [
+            {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'}
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            self.scratchspace.build_filepath = MagicMock(return_value=pathlib.Path(tmp) / 'file1.txt')
+            self.assertEqual([], self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER'))
+            self.scratchspace.api.request.return_value = build_response(200, [b'file'],
+                                                                        requests.exceptions.ConnectionError())
+            self.assertEqual([], self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER',
+                                                                            prompt_overwrite=False))
+            self.assertEqual(4, self.scratchspace.api.request.call_count - 1)
+            self.assertEqual(['file1.txt.part'], os.listdir(tmp))
 
     @patch('builtins.input', side_effect=['yes'])
     def test_set_download_attachments_prompt_overwrite(self, input_mock):
         """Should prompt to overwrite if file exists"""
-        dest_path = pathlib.Path('/tmp/TIREDTURKEY/burp.txt')
-        self.scratchspace.build_filepath = MagicMock()
-        self.scratchspace.build_filepath.return_value = dest_path
-        self.scratchspace.api.request = MagicMock()
-        self.scratchspace.api.request.return_value.status_code = 200
-        self.scratchspace.api.request.return_value.content = b'file_content'
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.return_value = build_response(200, [b'file_content'])
         attachments = [
             {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'}
         ]
-        open_mock = mock_open()
-
-        with patch('pathlib.Path.exists') as exists_mock:
-            with patch('builtins.open', open_mock, create=True):
-                exists_mock.return_value = True
-                ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER')
-                self.assertEqual([dest_path], ret)
-                open_mock.return_value.write.assert_called_with(b'file_content')
-                open_mock.assert_called_with(dest_path, 'wb')
-                input_mock.assert_called_with('file1.txt exists. Overwrite? [y/N]: ')
+        with tempfile.TemporaryDirectory() as tmp:
+            dest_path = pathlib.Path(tmp) / 'file1.txt'
+            dest_path.write_bytes(b'old_content')
+            self.scratchspace.build_filepath = MagicMock(return_value=dest_path)
+            ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER')
+            self.assertEqual([dest_path], ret)
+            self.assertEqual(b'file_content', dest_path.read_bytes())
+            input_mock.assert_called_with('file1.txt exists. Overwrite? [y/N]: ')
+
+    def test_set_download_attachments_resume(self):
+        """Should resume interrupted downloads with a Range request, unless the file changed since"""
+        modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.side_effect = [
+            build_response(200, [b'file_'], requests.exceptions.ChunkedEncodingError(),
+                           headers={'ETag': 'W/"1"', 'Last-Modified': modified}),
+            build_response(206, [b'content']),
+            build_response(416, [], headers={'Content-Range': 'bytes */12'}),
+            build_response(200, [b'file_content'], headers={'ETag': '"2"'})
+        ]
+        attachments = [
+            {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'}
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            dest_path = pathlib.Path(tmp) / 'file1.txt'
+            self.scratchspace.build_filepath = MagicMock(return_value=dest_path)
+            ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER')
+            self.assertEqual([dest_path], ret)
+            self.assertEqual(b'file_content', dest_path.read_bytes())
+            self.scratchspace.api.request.assert_called_with('GET', 'https://downloads.com/xyzf',
+                                                             headers={'Range': 'bytes=5-', 'If-Range': modified},
+                                                             stream=True)
+            (pathlib.Path(tmp) / 'file1.txt.part').write_bytes(b'stale')
+            (pathlib.Path(tmp) / 'file1.txt.part.validator').write_text('"1"')
+            ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER',
+                                                             prompt_overwrite=False)
+            self.assertEqual(b'file_content', dest_path.read_bytes())
+            self.scratchspace.api.request.assert_called_with('GET', 'https://downloads.com/xyzf',
+                                                             headers=None, stream=True)
+            self.assertEqual(['file1.txt'], os.listdir(tmp))
+            (pathlib.Path(tmp) / 'file1.txt.part').write_bytes(b'stale')
+            self.scratchspace.api.request.side_effect = [build_response(200, [b'new_content'])]
+            self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER', prompt_overwrite=False)
+            self.scratchspace.api.request.assert_called_with('GET', 'https://downloads.com/xyzf',
+                                                             headers=None, stream=True)
+            self.assertEqual(b'new_content', dest_path.read_bytes())
+
+    def test_set_download_attachments_resume_complete(self):
+        """Should keep a .part file the server says is already complete, once its checksum matches"""
+        self.scratchspace.api = MagicMock()
+        self.scratchspace.api.request.return_value = build_response(416, [], headers={'Content-Range': 'bytes */12'})
+        attachments = [
+            {'slug': '43i7h', 'filename': 'file1.txt', 'url': 'https://downloads.com/xyzf'}
+        ]
+        checksums = {'file1.txt': hashlib.sha256(b'file_content').hexdigest()}
+        with tempfile.TemporaryDirectory() as tmp:
+            dest_path = pathlib.Path(tmp) / 'file1.txt'
+            self.scratchspace.build_filepath = MagicMock(return_value=dest_path)
+            (pathlib.Path(tmp) / 'file1.txt.part').write_bytes(b'file_content')
+            (pathlib.Path(tmp) / 'file1.txt.part.validator').write_text('"1"')
+            ret = self.scratchspace.set_download_attachments(attachments, codename='TIREDTIGER',
+                                                             checksums=checksums)
+            self.assertEqual([dest_path], ret)
+            self.assertEqual(b'file_content', dest_path.read_bytes())
+            self.assertEqual(['file1.txt'], os.listdir(tmp))
+            self.scratchspace.api.request.assert_called_once_with('GET', 'https://downloads.com/xyzf',
+                                                                  headers={'Range': 'bytes=12-', 'If-Range': '"1"'},
+                                                                  stream=True)
 
     def test_set_hosts_file(self):
         """Should create a host file within the correct directory"""
@@ -0,0 +1,104 @@
+"""test_singleflight.py
+
+Tests for the SingleFlight class
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._singleflight  # noqa: E402
+
+
+def call(flights, fn, results, i):
+    try:
+        results[i] = flights.do('key', fn)
+    except Exception as e:
+        results[i] = e
+
+
+def run_threads(flights, release, fn, count):
+    """Call do() from several threads at once and return what each of them got"""
+    results = [None] * count
+    threads = [threading.Thread(target=call, args=(flights, fn, results, i)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    while flights.shared < count - 1:
+        release.wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+async def do_work(fn, error=None):
+    fn()
+    await asyncio.sleep(0.01)
+    if error:
+        raise error
+    return ['result']
+
+
+async def gather(*flights):
+    return await asyncio.gather(*flights, return_exceptions=True)
+
+
+def wait_then_raise(release):
+    release.wait()
+    raise ValueError('nope')
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flights = synack._singleflight.SingleFlight()
+        self.release = threading.Event()
+
+    def test_do(self):
+        """Concurrent callers should share one call and each get a copy of its result"""
+        fn = MagicMock(side_effect=lambda: self.release.wait() and ['result'])
+        results = run_threads(self.flights, self.release, fn, 5)
+        fn.assert_called_once_with()
+        self.assertEqual([['result']] * 5, results)
+        self.assertEqual(5, len(set(id(r) for r in results)))
+        self.assertEqual(4, self.flights.shared)
+        self.assertEqual(dict(), self.flights._flights)
+
+    def test_do_async(self):
+        """Concurrent coroutines should share one awaited call"""
+        fn = MagicMock()
+        flights = [self.flights.do_async('key', lambda: do_work(fn)) for i in range(5)]
+        flights.append(self.flights.do_async('other', lambda: do_work(fn)))
+        self.assertEqual([['result']] * 6, asyncio.run(gather(*flights)))
+        self.assertEqual(2, fn.call_count)
+        self.assertEqual(4, self.flights.shared)
+        self.assertEqual(dict(), self.flights._futures)
+
+    def test_do_async_error(self):
+        """Every concurrent coroutine should see the exception of the shared call"""
+        fn = MagicMock()
+        flights = [self.flights.do_async('key', lambda: do_work(fn, ValueError('nope'))) for i in range(3)]
+        results = asyncio.run(gather(*flights))
+        self.assertTrue(all(type(r) is ValueError for r in results))
+        fn.assert_called_once_with()
+        self.assertEqual(dict(), self.flights._futures)
+
+    def test_do_error(self):
+        """Every concurrent caller should see the exception of the shared call"""
+        fn = MagicMock(side_effect=lambda: wait_then_raise(self.release))
+        results = run_threads(self.flights, self.release, fn, 3)
+        self.assertTrue(all(type(r) is ValueError for r in results))
+        fn.assert_called_once_with()
+
+    def test_do_sequential(self):
+        """Calls that do not overlap should not be shared"""
+        fn = MagicMock(return_value='result')
+        self.assertEqual('result', self.flights.do('key', fn))
+        self.assertEqual('result', self.flights.do('key', fn))
+        self.assertEqual(2, fn.call_count)
+        self.assertEqual(0, self.flights.shared)
@@ -0,0 +1,272 @@
+"""test_standin.py
+
+Tests for the StandIn class
+"""
+
+import concurrent.futures
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack  # noqa: E402
+import synack._standin  # noqa: E402
+import synack._watcher  # noqa: E402
+
+plugins = {name: getattr(synack.plugins, name) for name in synack.plugins.base.Plugin.registry.keys()}
+
+
+def send(standin, method, path, data=None, host='platform.synack.com', token=None):
+    """Return the status, headers and decoded body of a request handled by a StandIn"""
+    headers = {'Authorization': f'Bearer {token or standin.token}'}
+    body = data if type(data) is bytes else json.dumps(data).encode() if data is not None else b''
+    status, headers, content = standin.handle(method, host, path, headers, body)
+    if headers.get('Content-Type') == 'application/json':
+        content = json.loads(content)
+    return status, headers, content
+
+
+class StandInTestCase(unittest.TestCase):
+    def setUp(self):
+        self.standin = synack._standin.StandIn(missions=25, targets=4, assets=30, hydra=15)
+
+    def test_assessments(self):
+        """Should pass every category"""
+        status, _, content = send(self.standin, 'GET', '/api/assessments')
+        self.assertEqual(200, status)
+        self.assertEqual(['Host', 'Web Application'], [c['category_name'] for c in content])
+        self.assertTrue(all(c['practical_assessment']['passed'] for c in content))
+
+    def test_assets(self):
+        """Should page through the assets of the listings asked for"""
+        slug = self.standin.targets[1]['slug']
+        path = f'/api/asset/v2/assets?listingUid%5B%5D={slug}'
+        status, _, content = send(self.standin, 'GET', f'{path}&page=2&perPage=20')
+        self.assertEqual(200, status)
+        self.assertEqual(10, len(content))
+        self.assertEqual(slug, content[0]['listings'][0]['listingUid'])
+        self.assertEqual(30, len(send(self.standin, 'GET', path)[2]))
+
+    def test_error_rate(self):
+        """Should answer the given fraction of requests with error_status"""
+        self.standin.error_rate = 0.5
+        statuses = [send(self.standin, 'GET', '/api/profiles/me')[0] for i in range(100)]
+        self.assertTrue(20 < statuses.count(503) < 80)
+        self.assertEqual(100, statuses.count(503) + statuses.count(200))
+        self.standin.error_rate = 1
+        self.assertEqual((503, {'Retry-After': '0'}, b''), send(self.standin, 'GET', '/api/profiles/me'))
+
+    def test_gzip(self):
+        """Should compress large JSON bodies for clients accepting gzip"""
+        headers = {'Authorization': f'Bearer {self.standin.token}', 'Accept-Encoding': 'gzip, deflate'}
+        status, headers, content = self.standin.handle('GET', 'platform.synack.com', '/api/tasks/v2/tasks',
+                                                       headers, b'')
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertEqual(20, len(json.loads(gzip.decompress(content))))
+        self.assertNotIn('Content-Encoding', send(self.standin, 'GET', '/api/tasks/v2/tasks')[1])
+
+    def test_handler(self):
+        """A Handler should log in and work through the stand-in via base_url"""
+        self.standin.start()
+        try:
+            with tempfile.TemporaryDirectory() as config_dir, \
+                    patch.dict(synack.plugins.base.Plugin.registry, plugins):
+                handler = synack.Handler(config_dir=config_dir, base_url=self.standin.base_url, login=True,
+                                         email='joe@schmoe.com', password='password1234',
+                                         otp_secret='JBSWY3DPEHPK3PXP', use_scratchspace=False)
+                self.assertEqual(self.standin.token, handler.db.api_token)
+                self.assertEqual(self.standin.user_id, handler.db.user_id)
+                self.assertEqual(self.standin.user_id, handler.users.get_profile()['user_id'])
+                self.assertEqual(25, handler.missions.get_count())
+                missions = handler.missions.get(max_pages=2)
+                self.assertEqual(25, len(missions))
+                self.assertTrue(handler.missions.set_claimed(missions[0])['success'])
+                self.assertFalse(handler.missions.set_claimed(missions[0])['success'])
+                self.standin.tokens[self.standin.token] = 0
+                self.assertEqual(24, handler.missions.get_count())
+                self.assertEqual(self.standin.token, handler.db.api_token)
+                self.assertEqual([200, 200], handler.api.warm(connections=2))
+                handler.missions.build_claims(missions[1:3])
+                self.assertTrue(handler.missions.set_claimed(missions[1])['success'])
+                self.assertEqual('CLAIMED', self.standin.missions[1]['status'])
+                watcher = synack._watcher.MissionWatcher(handler.missions)
+                self.assertEqual(23, len(watcher.poll()))
+                self.assertEqual([], watcher.poll())
+                self.standin.publish(2)
+                self.assertEqual(self.standin.missions[-2:], watcher.poll())
+                handler.missions.set_claimed(missions[3])
+                handler.missions.set_claimed(missions[4])
+                self.standin.publish(1)
+                self.assertEqual(self.standin.missions[-1:], watcher.poll())
+                handler.state.session.close()
+        finally:
+            self.standin.stop()
+        self.assertIsNone(self.standin.server)
+        self.standin.stop()
+
+    def test_hydra(self):
+        """Should page through Hydra results 10 at a time"""
+        slug = self.standin.targets[0]['slug']
+        self.assertEqual(10, len(send(self.standin, 'GET', f'/api/hydra_search/search?listing_uids={slug}')[2]))
+        self.assertEqual(5, len(send(self.standin, 'GET', f'/api/hydra_search/search?listing_uids={slug}&page=2')[2]))
+        self.assertEqual([], send(self.standin, 'GET', '/api/hydra_search/search?listing_uids=nope')[2])
+
+    def test_latency(self):
+        """Should wait before every response"""
+        self.standin.latency = 0.05
+        start = time.monotonic()
+        send(self.standin, 'GET', '/api/profiles/me')
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_launchpoint(self):
+        """Should remember the target connected to"""
+        self.assertEqual({'slug': ''}, send(self.standin, 'GET', '/api/launchpoint')[2])
+        self.assertEqual({'slug': 'abc'}, send(self.standin, 'PUT', '/api/launchpoint?listing_id=abc')[2])
+        self.assertEqual({'slug': 'abc'}, send(self.standin, 'GET', '/api/launchpoint')[2])
+
+    def test_login(self):
+        """Should walk through the CSRF, progress token, grant token and access token"""
+        status, headers, content = send(self.standin, 'GET', '/', host='login.synack.com')
+        self.assertEqual(200, status)
+        self.assertIn(b'<meta name="csrf-token" content="', content)
+        data = {'email': 'joe@schmoe.com', 'password': 'password1234'}
+        status, _, content = send(self.standin, 'POST', '/api/authenticate', data, host='login.synack.com')
+        self.assertIn('progress_token', content)
+        data = {'authy_token': '1234567', 'progress_token': content['progress_token']}
+        status, _, content = send(self.standin, 'POST', '/api/authenticate', data, host='login.synack.com')
+        self.assertIn('grant_token', content)
+        status, _, content = send(self.standin, 'GET', '/token?grant_token=abc', token='bad')
+        self.assertEqual({'access_token': self.standin.token}, content)
+        self.assertEqual(400, send(self.standin, 'POST', '/api/authenticate', b'{', host='login.synack.com')[0])
+        self.assertEqual(400, send(self.standin, 'POST', '/api/authenticate', ['a'], host='login.synack.com')[0])
+        self.assertEqual(404, send(self.standin, 'GET', '/nope', host='login.synack.com')[0])
+
+    def test_login_cassette(self):
+        """A recorded login should replay without a network, even though the OTP it sends has changed"""
+        self.standin.start()
+        try:
+            with tempfile.TemporaryDirectory() as config_dir, \
+                    patch.dict(synack.plugins.base.Plugin.registry, plugins), \
+                    patch.object(synack.plugins.Auth, 'build_otp', side_effect=['1234567', '7654321']):
+                options = dict(email='joe@schmoe.com', password='password1234', otp_secret='JBSWY3DPEHPK3PXP',
+                               use_scratchspace=False, login=True,
+                               cassette_file=os.path.join(config_dir, 'login.jsonl'))
+                handler = synack.Handler(config_dir=os.path.join(config_dir, 'record'), cassette_mode='record',
+                                         base_url=self.standin.base_url, **options)
+                handler.state.cassette.close()
+                handler.state.session.close()
+                self.standin.stop()
+                replayed = synack.Handler(config_dir=os.path.join(config_dir, 'replay'), **options)
+                self.assertEqual(handler.db.api_token, replayed.db.api_token)
+                self.assertEqual(self.standin.user_id, replayed.db.user_id)
+        finally:
+            self.standin.stop()
+
+    def test_login_shared(self):
+        """Handlers sharing a config_dir should log in once when their token expires, and all use the new one"""
+        self.standin.start()
+        try:
+            with tempfile.TemporaryDirectory() as config_dir, \
+                    patch.dict(synack.plugins.base.Plugin.registry, plugins):
+                options = dict(config_dir=config_dir, base_url=self.standin.base_url, email='joe@schmoe.com',
+                               password='password1234', otp_secret='JBSWY3DPEHPK3PXP', use_scratchspace=False)
+                handlers = [synack.Handler(login=True, **options)]
+                handlers.extend(synack.Handler(**options) for i in range(4))
+                token = self.standin.token
+                self.standin.tokens[token] = 0
+                issued = len(self.standin.tokens)
+                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                    tokens = list(executor.map(lambda h: h.auth.get_api_token(expired=token), handlers))
+                self.assertEqual([self.standin.token] * 5, tokens)
+                self.assertEqual(issued + 1, len(self.standin.tokens))
+                self.assertEqual(self.standin.user_id, synack.Handler(login=True, **options).db.user_id)
+                for handler in handlers:
+                    handler.state.session.close()
+        finally:
+            self.standin.stop()
+
+    def test_missions(self):
+        """Should page through and count missions, filtered by status and listing"""
+        status, headers, content = send(self.standin, 'GET', '/api/tasks/v2/tasks?status=PUBLISHED&perPage=20&page=2')
+        self.assertEqual(200, status)
+        self.assertEqual('25', headers['x-count'])
+        self.assertEqual(5, len(content))
+        slug = self.standin.targets[0]['slug']
+        content = send(self.standin, 'GET', f'/api/tasks/v2/tasks?listingUids={slug}')[2]
+        self.assertEqual({slug}, {m['listingUid'] for m in content})
+        status, headers, content = send(self.standin, 'HEAD', '/api/tasks/v1/tasks?status=PUBLISHED')
+        self.assertEqual((204, '25', b''), (status, headers['x-count'], content))
+        self.assertEqual([], send(self.standin, 'GET', '/api/tasks/v2/tasks?status=CLAIMED')[2])
+        self.assertIn('introduction', send(self.standin, 'GET', '/api/tasks/v2/tasks/abc/evidences')[2])
+
+    def test_not_found(self):
+        """Should answer unknown endpoints with a 404"""
+        self.assertEqual((404, {}, b''), send(self.standin, 'GET', '/api/nope'))
+
+    def test_profile(self):
+        """Should return the user ID and claim limit"""
+        content = send(self.standin, 'GET', '/api/profiles/me')[2]
+        self.assertEqual({'user_id': self.standin.user_id, 'claim_limit': 500}, content)
+
+    def test_publish(self):
+        """Should publish new missions for the targets in turn"""
+        missions = self.standin.publish(3)
+        self.assertEqual(3, len(missions))
+        self.assertEqual(missions, self.standin.missions[-3:])
+        self.assertEqual(self.standin.targets[1]['slug'], missions[0]['listingUid'])
+        self.assertEqual('28', send(self.standin, 'HEAD', '/api/tasks/v1/tasks?status=PUBLISHED')[1]['x-count'])
+
+    def test_seed(self):
+        """The same seed should build the same data"""
+        other = synack._standin.StandIn(missions=25, targets=4, assets=30, hydra=15)
+        self.assertEqual(self.standin.missions, other.missions)
+        self.assertEqual(self.standin.targets, other.targets)
+        self.assertNotEqual(self.standin.missions, synack._standin.StandIn(missions=25, targets=4, seed=1).missions)
+        self.assertEqual([], synack._standin.StandIn(targets=0).missions)
+
+    def test_targets(self):
+        """Should list registered and unregistered targets and sign up to them"""
+        registered = send(self.standin, 'GET', '/api/targets/registered_summary')[2]
+        self.assertEqual(2, len(registered))
+        self.assertNotIn('index', registered[0])
+        unregistered = send(self.standin, 'GET', '/api/targets?filter%5Bprimary%5D=unregistered')[2]
+        self.assertEqual(2, len(unregistered))
+        self.assertEqual([], send(self.standin, 'GET', '/api/targets?filter%5Bprimary%5D=upcoming')[2])
+        self.assertEqual(200, send(self.standin, 'POST', f'/api/targets/{unregistered[0]["slug"]}/signup')[0])
+        self.assertEqual(404, send(self.standin, 'POST', '/api/targets/nope/signup')[0])
+        self.assertEqual(3, len(send(self.standin, 'GET', '/api/targets')[2]))
+        self.assertEqual([], send(self.standin, 'GET', f'/api/targets/{unregistered[0]["slug"]}/resources')[2])
+
+    def test_tokens(self):
+        """Should hand out a notifications token and refuse requests with a wrong or expired API token"""
+        self.assertIn('token', send(self.standin, 'GET', '/api/users/notifications_token')[2])
+        self.assertEqual(401, send(self.standin, 'GET', '/api/profiles/me', token='bad')[0])
+        self.standin.tokens[self.standin.token] = time.time() - 1
+        self.assertEqual(401, send(self.standin, 'GET', '/api/profiles/me')[0])
+
+    def test_transactions(self):
+        """Should send the balance in the x-balance header"""
+        status, headers, content = send(self.standin, 'HEAD', '/api/transactions')
+        self.assertEqual(200, status)
+        self.assertEqual('0.0', json.loads(headers['x-balance'])['total_balance'])
+
+    def test_transitions(self):
+        """Only the first claim of a mission should succeed, and claimed missions should count to the wallet"""
+        mission = self.standin.missions[0]
+        path = f'/api/tasks/v1/organizations/{mission["organizationUid"]}/listings/{mission["listingUid"]}' + \
+            f'/campaigns/{mission["campaignUid"]}/tasks/{mission["id"]}/transitions'
+        self.assertEqual(201, send(self.standin, 'POST', path, {'type': 'CLAIM'})[0])
+        self.assertEqual(412, send(self.standin, 'POST', path, {'type': 'CLAIM'})[0])
+        self.assertEqual('CLAIMED', mission['status'])
+        amount = send(self.standin, 'GET', '/api/tasks/v2/researcher/claimed_amount')[2]['claimedAmount']
+        self.assertEqual(mission['payout']['amount'], amount)
+        self.assertEqual(201, send(self.standin, 'POST', path, {'type': 'DISCLAIM'})[0])
+        self.assertEqual('PUBLISHED', mission['status'])
+        self.assertEqual(404, send(self.standin, 'POST', path.replace(mission['id'], 'nope'), {'type': 'CLAIM'})[0])
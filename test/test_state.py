@@ -3,8 +3,13 @@
 Tests for the State class
 """
 
+import http.server
+import json
+import orjson
 import os
 import sys
+import tempfile
+import threading
 import unittest
 import pathlib
 import requests
@@ -12,12 +17,70 @@ import requests
 sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
 
 import synack  # noqa: E402
+import synack._json  # noqa: E402
 
 
 class StateTestCase(unittest.TestCase):
     def setUp(self):
         self.state = synack._state.State()
 
+    def test_base_url(self):
+        self.assertEqual(None, self.state.base_url)
+        self.assertEqual(None, self.state._base_url)
+        self.state.base_url = 'http://127.0.0.1:8080'
+        self.assertEqual('http://127.0.0.1:8080', self.state.base_url)
+        self.assertEqual('http://127.0.0.1:8080', self.state._base_url)
+
+    def test_cache_size(self):
+        self.assertEqual(32, self.state.cache_size)
+        self.state.cache_size = 4
+        self.assertEqual(4, self.state._cache_size)
+        self.assertEqual(4, self.state.response_cache.size)
+
+    def test_cache_ttls(self):
+        self.assertEqual(synack._state.CACHE_TTLS, self.state.cache_ttls)
+        cache = self.state.response_cache
+        self.state.cache_ttls = {'platform.synack.com/api/profiles/me': 5}
+        self.assertEqual({'platform.synack.com/api/profiles/me': 5}, self.state._cache_ttls)
+        self.assertIsNot(cache, self.state.response_cache)
+        self.assertEqual({'platform.synack.com/api/profiles/me': 5}, self.state.response_cache.ttls)
+
+    def test_cassette(self):
+        self.assertIsNone(self.state.cassette)
+        with tempfile.TemporaryDirectory() as tmp:
+            self.state.cassette_file = pathlib.Path(tmp) / 'cassette.jsonl'
+            self.state.cassette_mode = 'record'
+            cassette = self.state.cassette
+            self.assertEqual('record', cassette.mode)
+            self.assertIs(cassette, self.state._cassette)
+            self.state.cassette_latency = 0.1
+            self.assertEqual(0.1, cassette.latency)
+            self.state.cassette_mode = 'replay'
+            self.assertIsNone(cassette.file)
+            self.assertEqual('replay', self.state.cassette.mode)
+            self.assertEqual(0.1, self.state.cassette.latency)
+
+    def test_cassette_file(self):
+        self.assertEqual(None, self.state.cassette_file)
+        self.assertEqual(None, self.state._cassette_file)
+        self.state.cassette_file = '~/cassette.jsonl'
+        self.assertEqual(pathlib.Path('~/cassette.jsonl').expanduser().resolve(), self.state.cassette_file)
+        self.assertEqual(pathlib.Path('~/cassette.jsonl').expanduser().resolve(), self.state._cassette_file)
+
+    def test_cassette_latency(self):
+        self.assertEqual(None, self.state.cassette_latency)
+        self.assertEqual(None, self.state._cassette_latency)
+        self.state.cassette_latency = 'recorded'
+        self.assertEqual('recorded', self.state.cassette_latency)
+        self.assertEqual('recorded', self.state._cassette_latency)
+
+    def test_cassette_mode(self):
+        self.assertEqual('replay', self.state.cassette_mode)
+        self.assertEqual('replay', self.state._cassette_mode)
+        self.state.cassette_mode = 'record'
+        self.assertEqual('record', self.state.cassette_mode)
+        self.assertEqual('record', self.state._cassette_mode)
+
     def test_config_dir(self):
         self.assertEqual(pathlib.PosixPath, type(self.state.config_dir))
         self.assertEqual(pathlib.PosixPath, type(self.state._config_dir))
@@ -30,6 +93,33 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual(pathlib.Path('/tmp').expanduser().resolve(),
                          self.state._config_dir)
 
+    def test_connection_stats(self):
+        class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertEqual(dict(), self.state.connection_stats)
+        for i in range(3):
+            self.state.session.get(f'http://127.0.0.1:{server.server_port}/')
+        self.assertEqual({'127.0.0.1': {'new': 1, 'requests': 3, 'reused': 2}}, self.state.connection_stats)
+        self.state.keep_alive = False
+        for i in range(2):
+            self.state.session.get(f'http://127.0.0.1:{server.server_port}/')
+        self.assertEqual({'127.0.0.1': {'new': 2, 'requests': 5, 'reused': 3}}, self.state.connection_stats)
+
     def test_debug(self):
         self.assertEqual(None, self.state.debug)
         self.assertEqual(None, self.state._debug)
@@ -37,6 +127,29 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual(True, self.state.debug)
         self.assertEqual(True, self.state._debug)
 
+    def test_debug_file(self):
+        self.assertEqual(None, self.state.debug_file)
+        self.assertEqual(None, self.state._debug_file)
+        self.state.debug_file = '~/synack.log'
+        self.assertEqual(pathlib.Path('~/synack.log').expanduser().resolve(), self.state.debug_file)
+        self.assertEqual(pathlib.Path('~/synack.log').expanduser().resolve(), self.state._debug_file)
+        self.state.debug_file = None
+        self.assertEqual(None, self.state.debug_file)
+
+    def test_debug_max_length(self):
+        self.assertEqual(2000, self.state.debug_max_length)
+        self.assertEqual(2000, self.state._debug_max_length)
+        self.state.debug_max_length = None
+        self.assertEqual(None, self.state.debug_max_length)
+        self.assertEqual(None, self.state._debug_max_length)
+
+    def test_defer_login(self):
+        self.assertEqual(None, self.state.defer_login)
+        self.assertEqual(None, self.state._defer_login)
+        self.state.defer_login = True
+        self.assertEqual(True, self.state.defer_login)
+        self.assertEqual(True, self.state._defer_login)
+
     def test_email(self):
         self.assertEqual(None, self.state.email)
         self.assertEqual(None, self.state._email)
@@ -62,6 +175,25 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual('http://1.1.1.1:1234', self.state.https_proxy)
         self.assertEqual('http://1.1.1.1:1234', self.state._https_proxy)
 
+    def test_json_backend(self):
+        self.assertEqual(None, self.state.json_backend)
+        self.assertEqual(None, self.state._json_backend)
+        self.assertEqual(orjson.loads, self.state.json_loads)
+        self.state.json_backend = 'json'
+        self.assertEqual('json', self.state.json_backend)
+        self.assertEqual('json', self.state._json_backend)
+        self.assertEqual(json.loads, self.state.json_loads)
+        self.assertEqual(json.loads, self.state._json_loads)
+
+    def test_keep_alive(self):
+        self.assertEqual(True, self.state.keep_alive)
+        self.assertNotIn('Connection', self.state.session.headers)
+        self.state.keep_alive = False
+        self.assertEqual(False, self.state._keep_alive)
+        self.assertEqual('close', self.state.session.headers['Connection'])
+        self.state.keep_alive = True
+        self.assertNotIn('Connection', self.state.session.headers)
+
     def test_login(self):
         self.assertEqual(None, self.state.login)
         self.assertEqual(None, self.state._login)
@@ -69,6 +201,18 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual(False, self.state.login)
         self.assertEqual(False, self.state._login)
 
+    def test_login_pending(self):
+        self.assertEqual(False, self.state.login_pending)
+        self.assertEqual(False, self.state._login_pending)
+        self.state.login_pending = True
+        self.assertEqual(True, self.state.login_pending)
+        self.assertEqual(True, self.state._login_pending)
+
+    def test_max_retries(self):
+        self.assertEqual(3, self.state.max_retries)
+        self.state.max_retries = 0
+        self.assertEqual(0, self.state._max_retries)
+
     def test_otp_secret(self):
         self.assertEqual(None, self.state.otp_secret)
         self.assertEqual(None, self.state._otp_secret)
@@ -76,6 +220,13 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual('12345', self.state.otp_secret)
         self.assertEqual('12345', self.state._otp_secret)
 
+    def test_page_workers(self):
+        self.assertEqual(4, self.state.page_workers)
+        self.assertEqual(4, self.state._page_workers)
+        self.state.page_workers = 8
+        self.assertEqual(8, self.state.page_workers)
+        self.assertEqual(8, self.state._page_workers)
+
     def test_password(self):
         self.assertEqual(None, self.state.password)
         self.assertEqual(None, self.state._password)
@@ -83,6 +234,36 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual('password1234', self.state.password)
         self.assertEqual('password1234', self.state._password)
 
+    def test_plugins(self):
+        self.assertEqual(dict(), self.state.plugins)
+        self.assertIs(self.state._plugins, self.state.plugins)
+
+    def test_pool_block(self):
+        self.assertEqual(False, self.state.pool_block)
+        self.assertFalse(self.state.session.get_adapter('https://platform.synack.com/api/tasks')._pool_block)
+        self.state.pool_block = True
+        self.assertEqual(True, self.state._pool_block)
+        adapter = self.state.session.get_adapter('https://platform.synack.com/api/tasks')
+        self.assertTrue(adapter._pool_block)
+
+    def test_pool_connections(self):
+        self.assertEqual(10, self.state.pool_connections)
+        self.assertEqual(10, self.state.session.get_adapter('https://login.synack.com/api/')._pool_connections)
+        self.state.pool_connections = 2
+        self.assertEqual(2, self.state._pool_connections)
+        adapter = self.state.session.get_adapter('https://login.synack.com/api/authenticate')
+        self.assertEqual(2, adapter._pool_connections)
+
+    def test_pool_maxsize(self):
+        adapter = self.state.session.get_adapter('https://notifications.synack.com/api/v2/notifications')
+        self.assertEqual(10, self.state.pool_maxsize)
+        self.assertEqual(10, adapter._pool_maxsize)
+        self.state.pool_maxsize = 50
+        self.assertEqual(50, self.state._pool_maxsize)
+        self.assertIsNot(adapter, self.state.session.get_adapter('https://notifications.synack.com/api/v2/'))
+        adapter = self.state.session.get_adapter('https://notifications.synack.com/api/v2/notifications')
+        self.assertEqual(50, adapter._pool_maxsize)
+
     def test_proxies(self):
         self.assertEqual(self.state.proxies, {
             'http': None,
@@ -99,6 +280,33 @@ class StateTestCase(unittest.TestCase):
             'https': 'http://1.1.1.1:1234'
         })
 
+    def test_rate_limiter(self):
+        self.assertIsInstance(self.state.rate_limiter, synack._limiter.RateLimiter)
+        self.assertIs(self.state.rate_limiter, self.state.rate_limiter)
+
+    def test_rate_limits(self):
+        self.assertEqual(synack._state.RATE_LIMITS, self.state.rate_limits)
+        limiter = self.state.rate_limiter
+        self.state.rate_limits = {'platform.synack.com': (1, 1)}
+        self.assertEqual({'platform.synack.com': (1, 1)}, self.state._rate_limits)
+        self.assertIsNot(limiter, self.state.rate_limiter)
+        self.assertEqual(0, self.state.rate_limiter.reserve('https://platform.synack.com/api/targets'))
+        self.assertGreater(self.state.rate_limiter.reserve('https://platform.synack.com/api/targets'), 0)
+
+    def test_request_metrics(self):
+        self.assertIsInstance(self.state.request_metrics, synack._metrics.RequestMetrics)
+        self.assertIs(self.state._request_metrics, self.state.request_metrics)
+
+    def test_response_cache(self):
+        self.assertIsInstance(self.state.response_cache, synack._cache.ResponseCache)
+        self.assertIs(self.state.response_cache, self.state.response_cache)
+        self.assertIsNone(self.state.response_cache.directory)
+
+    def test_retry_backoff(self):
+        self.assertEqual(0.5, self.state.retry_backoff)
+        self.state.retry_backoff = 2
+        self.assertEqual(2, self.state._retry_backoff)
+
     def test_scratchspace_dir(self):
         self.assertEqual(None, self.state.scratchspace_dir)
         self.assertEqual(None, self.state._scratchspace_dir)
@@ -112,6 +320,9 @@ class StateTestCase(unittest.TestCase):
     def test_session(self):
         self.assertEqual(requests.sessions.Session, type(self.state.session))
         self.assertEqual(requests.sessions.Session, type(self.state._session))
+        for host in synack._state.POOL_HOSTS:
+            self.assertIn(host, self.state.session.adapters)
+        self.assertEqual(synack._json.get_accept_encoding(), self.state.session.headers['Accept-Encoding'])
 
     def test_template_dir(self):
         self.assertEqual(None, self.state.template_dir)
@@ -123,6 +334,13 @@ class StateTestCase(unittest.TestCase):
         self.assertEqual(pathlib.Path('/tmp').expanduser().resolve(),
                          self.state._template_dir)
 
+    def test_use_disk_cache(self):
+        self.assertEqual(None, self.state.use_disk_cache)
+        self.state.config_dir = '/tmp/synack'
+        self.state.use_disk_cache = True
+        self.assertEqual(True, self.state._use_disk_cache)
+        self.assertEqual(pathlib.Path('/tmp/synack/cache'), self.state.response_cache.directory)
+
     def test_use_proxies(self):
         self.assertEqual(None, self.state.use_proxies)
         self.assertEqual(None, self.state._use_proxies)
@@ -4,6 +4,7 @@ Tests for the Targets Plugin
 """
 
 import os
+import requests
 import sys
 import unittest
 
@@ -55,6 +56,16 @@ class TargetsTestCase(unittest.TestCase):
         self.targets.db.find_targets.assert_has_calls(calls)
         self.targets.get_registered_summary.assert_called_with()
 
+    def test_build_scope_host(self):
+        """Should keep only the active IPv4 networks from host assets"""
+        assets = [
+            {'active': True, 'location': '1.1.1.1/32'},
+            {'active': False, 'location': '2.2.2.2/32'},
+            {'active': True, 'location': '8675309'},
+            {'active': True, 'location': '10.0.0.0/8'}
+        ]
+        self.assertEqual({'1.1.1.1/32', '10.0.0.0/8'}, self.targets.build_scope_host(assets))
+
     def test_build_scope_host_db(self):
         """Should build a scope that can be ingested into the Database given a Synack API Scope"""
         scope = [
@@ -69,6 +80,30 @@ class TargetsTestCase(unittest.TestCase):
         ]
         self.assertEqual(expected, self.targets.build_scope_host_db(slug, scope))
 
+    def test_build_scope_web(self):
+        """Should build a rule for each listing of each active web asset"""
+        assets = [
+            {
+                'active': True,
+                'listings': [{'listingUid': 'uewqhuiewq', 'scope': 'in'}],
+                'location': 'https://good.things.com (https://good.things.com)',
+                'scopeRules': [{'rule': '*.good.things.com/*'}]
+            },
+            {
+                'active': False,
+                'listings': [{'listingUid': 'uewqhuiewq', 'scope': 'in'}],
+                'location': 'https://old.things.com',
+                'scopeRules': [{'rule': '*.old.things.com/*'}]
+            }
+        ]
+        expected = [{
+            'status': 'in',
+            'listing': 'uewqhuiewq',
+            'location': 'https://good.things.com',
+            'rule': '*.good.things.com/*'
+        }]
+        self.assertEqual(expected, self.targets.build_scope_web(assets))
+
     def test_build_scope_web_burp(self):
         """Should build a Burp Suite Scope given a Synack API Scope"""
         scope = [
@@ -221,36 +256,64 @@ class TargetsTestCase(unittest.TestCase):
         self.targets.get_connected = MagicMock()
         self.targets.get_connected.return_value = {'codename': 'TURBULENTTORTOISE', 'slug': '327h8iw'}
         self.targets.db.find_targets.return_value = [Target(slug='327h8iw')]
-        self.targets.api.request.return_value.status_code = 200
-        self.targets.api.request.return_value.text = 'rettext'
-        self.targets.api.request.return_value.json.return_value = 'retjson'
-        self.assertEqual('retjson', self.targets.get_assets())
-        self.targets.api.request.assert_called_with('GET',
-                                                    'asset/v2/assets?listingUid%5B%5D=327h8iw&scope%5B%5D=in' +
-                                                    '&scope%5B%5D=discovered&sort%5B%5D=location&active=true' +
-                                                    '&sortDir=asc&page=1&perPage=5000')
+        self.targets.db.use_scratchspace = False
+        self.targets.api.paginate.return_value = iter(['asset'])
+        self.assertEqual(['asset'], self.targets.get_assets())
+        self.targets.api.paginate.assert_called_with('GET',
+                                                     'asset/v2/assets?listingUid%5B%5D=327h8iw&scope%5B%5D=in' +
+                                                     '&scope%5B%5D=discovered&sort%5B%5D=location&active=true' +
+                                                     '&sortDir=asc',
+                                                     page=1,
+                                                     per_page=5000,
+                                                     max_pages=None,
+                                                     prefetch=True,
+                                                     strict=True)
+        self.targets.scratchspace.set_assets_file.assert_not_called()
+
+    def test_get_assets_failed(self):
+        """Should return None rather than part of the assets if a page fails"""
+        self.targets.db.find_targets.return_value = [Target(slug='327h8iw')]
+        self.targets.api.paginate.side_effect = requests.HTTPError('500')
+        self.assertIsNone(self.targets.get_assets(slug='327h8iw'))
+        self.targets.scratchspace.set_assets_file.assert_not_called()
 
     def test_get_assets_non_defaults(self):
         """Should return a list of assets given information to query"""
-        self.targets.db.find_targets.return_value = [Target(codename='TURBULENTTORTOISE', slug='327h8iw')]
-        self.targets.api.request.return_value.status_code = 200
-        self.targets.api.request.return_value.text = 'rettext'
-        self.targets.api.request.return_value.json.return_value = 'retjson'
-        self.assertEqual('retjson', self.targets.get_assets(codename='TURBULENTTORTOISE',
-                                                            asset_type='blah',
-                                                            host_type='cidr',
-                                                            active='false',
-                                                            scope='secret',
-                                                            sort='loc',
-                                                            sort_dir='desc',
-                                                            page=3,
-                                                            perPage=50,
-                                                            organization_uid='uiehqw'))
-        self.targets.api.request.assert_called_with('GET',
-                                                    'asset/v2/assets?listingUid%5B%5D=327h8iw' +
-                                                    '&organizationUid%5B%5D=uiehqw&assetType%5B%5D=blah' +
-                                                    '&hostType%5B%5D=cidr&scope%5B%5D=secret' +
-                                                    '&sort%5B%5D=loc&active=false&sortDir=desc&page=3&perPage=50')
+        target = Target(codename='TURBULENTTORTOISE', slug='327h8iw')
+        self.targets.db.find_targets.return_value = [target]
+        self.targets.db.use_scratchspace = True
+        self.targets.api.paginate.return_value = iter([{'location': 'a'}, {'location': 'b'}])
+        self.assertEqual([{'location': 'a'}, {'location': 'b'}],
+                         self.targets.get_assets(codename='TURBULENTTORTOISE',
+                                                 asset_type='blah',
+                                                 host_type='cidr',
+                                                 active='false',
+                                                 scope='secret',
+                                                 sort='loc',
+                                                 sort_dir='desc',
+                                                 page=3,
+                                                 perPage=50,
+                                                 organization_uid='uiehqw'))
+        self.targets.api.paginate.assert_called_with('GET',
+                                                     'asset/v2/assets?listingUid%5B%5D=327h8iw' +
+                                                     '&organizationUid%5B%5D=uiehqw&assetType%5B%5D=blah' +
+                                                     '&hostType%5B%5D=cidr&scope%5B%5D=secret' +
+                                                     '&sort%5B%5D=loc&active=false&sortDir=desc',
+                                                     page=3,
+                                                     per_page=50,
+                                                     max_pages=None,
+                                                     prefetch=True,
+                                                     strict=True)
+        self.targets.scratchspace.set_assets_file.assert_called_with('[{"location": "a"}, {"location": "b"}]',
+                                                                     target=target)
+
+    def test_get_assets_per_page_none(self):
+        """Should only ask for the first page when Synack picks the page size"""
+        self.targets.db.find_targets.return_value = [Target(slug='327h8iw')]
+        self.targets.db.use_scratchspace = False
+        self.targets.api.paginate.return_value = iter(['asset'])
+        self.assertEqual(['asset'], self.targets.get_assets(slug='327h8iw', page=2, perPage=None))
+        self.assertEqual(2, self.targets.api.paginate.call_args.kwargs['max_pages'])
 
     def test_get_attachments_current(self):
         """Should return a list of attachments based on currently selected target"""
@@ -582,6 +645,14 @@ class TargetsTestCase(unittest.TestCase):
         self.targets.get_connected.assert_called_with()
         self.targets.db.find_targets.assert_called_with(slug='213h89h3')
 
+    def test_get_scope_host_failed(self):
+        """Should return None and write nothing if the assets could not be retrieved"""
+        self.targets.get_assets = MagicMock(return_value=None)
+        self.targets.db.find_targets.return_value = [Target(slug='213h89h3', codename='SASSYSQUIRREL')]
+        self.assertIsNone(self.targets.get_scope_host(codename='SASSYSQUIRREL', add_to_db=True))
+        self.targets.db.add_ips.assert_not_called()
+        self.targets.scratchspace.set_hosts_file.assert_not_called()
+
     def test_get_scope_host_not_ip(self):
         """Should get the scope for a Host"""
         ips = {'1.1.1.1/32'}
@@ -699,6 +770,14 @@ class TargetsTestCase(unittest.TestCase):
         self.targets.db.find_targets.assert_called_with(slug='93g8eg8')
         self.targets.get_assets.assert_called_with(target=tgt, active='true', asset_type='webapp')
 
+    def test_get_scope_web_failed(self):
+        """Should return None and write nothing if the assets could not be retrieved"""
+        self.targets.get_assets = MagicMock(return_value=None)
+        self.targets.db.find_targets.return_value = [Target(slug='213h89h3', codename='SASSYSQUIRREL')]
+        self.assertIsNone(self.targets.get_scope_web(codename='SASSYSQUIRREL', add_to_db=True))
+        self.targets.db.add_urls.assert_not_called()
+        self.targets.scratchspace.set_burp_file.assert_not_called()
+
     def test_get_submissions(self):
         """Should return the accepted vulnerabilities for a target given a slug"""
         return_data = {
@@ -937,3 +1016,14 @@ class TargetsTestCase(unittest.TestCase):
         self.targets.get_unregistered.side_effect = [unreg, [t, t]]
         self.targets.api.request.return_value.status_code = 200
         self.assertEqual(17, len(self.targets.set_registered()))
+        self.assertEqual(2, self.targets.get_unregistered.call_count)
+
+    def test_set_registered_many_failed(self):
+        """Should stop once a full page of targets can not be registered"""
+        self.targets.get_unregistered = MagicMock()
+        unreg = [{"codename": "SLEEPYSLUG", "slug": "1o2h8o"}] * 15
+        self.targets.get_unregistered.return_value = unreg
+        self.targets.api.request.return_value.status_code = 403
+        self.assertEqual([], self.targets.set_registered())
+        self.assertEqual(1, self.targets.get_unregistered.call_count)
+        self.assertEqual(15, self.targets.api.request.call_count)
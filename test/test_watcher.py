@@ -0,0 +1,160 @@
+"""test_watcher.py
+
+Tests for the MissionWatcher class
+"""
+
+import os
+import sys
+import time
+import unittest
+
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, '../../src')))
+
+import synack._watcher  # noqa: E402
+
+# 2022-01-10 at noon, local time
+NOON = time.mktime((2022, 1, 10, 12, 0, 0, 0, 0, -1))
+
+
+def build_missions(*ids):
+    """Return missions with the given IDs"""
+    return [{'id': i} for i in ids]
+
+
+class MissionWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.missions = MagicMock()
+        self.callback = MagicMock()
+        self.watcher = synack._watcher.MissionWatcher(self.missions, [self.callback])
+
+    def test_add_callback(self):
+        """Should call every callback, even after one of them fails"""
+        self.callback.side_effect = ValueError('oops')
+        other = MagicMock()
+        self.watcher.add_callback(other)
+        self.missions.get_count.return_value = 1
+        self.missions.get.return_value = build_missions('a')
+        self.watcher.poll()
+        other.assert_called_once_with(build_missions('a'))
+        self.assertEqual(1, self.watcher.errors)
+        self.assertIn('oops', self.missions.debug.log.call_args.args[-1])
+
+    def test_get_interval(self):
+        """Should poll faster right after a drop, slowing down with each quiet poll"""
+        self.assertEqual(30, self.watcher.get_interval(NOON))
+        self.watcher.quiet_polls = 0
+        self.assertEqual(5, self.watcher.get_interval(NOON))
+        self.watcher.quiet_polls = 2
+        self.assertEqual(20, self.watcher.get_interval(NOON))
+        self.watcher.quiet_polls = 10
+        self.assertEqual(30, self.watcher.get_interval(NOON))
+
+    def test_get_interval_busy_hours(self):
+        """Should poll less often outside the busy hours given, or the hours drops were seen in"""
+        self.watcher.drops[12] = 1
+        self.assertEqual(30, self.watcher.get_interval(NOON))
+        self.assertEqual(120, self.watcher.get_interval(NOON + 3600))
+        self.watcher.busy_hours = range(13, 18)
+        self.assertEqual(120, self.watcher.get_interval(NOON))
+        self.assertEqual(30, self.watcher.get_interval(NOON + 3600))
+        self.watcher.quiet_polls = 3
+        self.assertEqual(40, self.watcher.get_interval(NOON))
+
+    def test_poll(self):
+        """Should only fetch missions when the count changes, and deliver the ones not seen yet"""
+        self.missions.get_count.return_value = 2
+        self.missions.get.return_value = build_missions('a', 'b')
+        with patch.object(time, 'localtime', return_value=time.localtime(NOON)):
+            self.assertEqual(build_missions('a', 'b'), self.watcher.poll())
+            self.missions.get_count.assert_called_with(status='PUBLISHED', listing_uids=None)
+            self.missions.get.assert_called_with(status='PUBLISHED', max_pages=1, per_page=20, listing_uids=None)
+            self.callback.assert_called_once_with(build_missions('a', 'b'))
+            self.assertEqual([0] * 24, self.watcher.drops)
+            self.assertEqual(0, self.watcher.quiet_polls)
+
+            self.assertEqual([], self.watcher.poll())
+            self.missions.get_count.return_value = 1
+            self.missions.get.return_value = build_missions('b')
+            self.assertEqual([], self.watcher.poll())
+            self.assertEqual({'b'}, self.watcher.seen)
+            self.assertEqual(2, self.missions.get.call_count)
+            self.assertEqual(2, self.watcher.quiet_polls)
+
+            self.missions.get_count.return_value = 21
+            self.missions.get.return_value = build_missions('b', 'c')
+            self.assertEqual(build_missions('c'), self.watcher.poll())
+            self.missions.get.assert_called_with(status='PUBLISHED', max_pages=2, per_page=20, listing_uids=None)
+            self.assertEqual(1, self.watcher.drops[12])
+            self.assertEqual(0, self.watcher.quiet_polls)
+            self.assertEqual(2, self.callback.call_count)
+
+            self.missions.get_count.return_value = 0
+            self.assertEqual([], self.watcher.poll())
+            self.assertEqual(set(), self.watcher.seen)
+            self.missions.get_count.return_value = 1
+            self.missions.get.return_value = build_missions('a')
+            self.assertEqual(build_missions('a'), self.watcher.poll())
+        self.assertEqual((6, 4), (self.watcher.polls, self.watcher.fetches))
+
+    def test_poll_count_down(self):
+        """Should deliver a mission that dropped while others were claimed, leaving the count lower"""
+        self.missions.get_count.return_value = 5
+        self.missions.get.return_value = build_missions('a', 'b', 'c', 'd', 'e')
+        self.watcher.poll()
+        self.missions.get_count.return_value = 4
+        self.missions.get.return_value = build_missions('c', 'd', 'e', 'f')
+        self.assertEqual(build_missions('f'), self.watcher.poll())
+        self.assertEqual({'c', 'd', 'e', 'f'}, self.watcher.seen)
+        self.assertEqual([], self.watcher.poll())
+        self.assertEqual(2, self.missions.get.call_count)
+
+    def test_poll_failed(self):
+        """Should wait for the next poll if the count or the missions can not be fetched"""
+        self.missions.get_count.return_value = None
+        self.assertEqual([], self.watcher.poll())
+        self.missions.get.assert_not_called()
+        self.missions.get_count.return_value = 3
+        self.missions.get.return_value = None
+        self.assertEqual([], self.watcher.poll())
+        self.assertEqual(0, self.watcher.count)
+        self.callback.assert_not_called()
+        self.missions.get.return_value = build_missions('a', 'b', 'c')
+        self.assertEqual(build_missions('a', 'b', 'c'), self.watcher.poll())
+        self.assertEqual(3, self.watcher.count)
+
+    def test_poll_prepare_claims(self):
+        """Should prepare claims for new missions before calling the callbacks"""
+        self.watcher = synack._watcher.MissionWatcher(self.missions, prepare_claims=True, listing_uids='abc',
+                                                      status='APPROVED')
+        self.watcher.add_callback(lambda missions: self.missions.build_claims.assert_called_with(missions))
+        self.missions.get_count.return_value = 1
+        self.missions.get.return_value = build_missions('a')
+        self.assertEqual(build_missions('a'), self.watcher.poll())
+        self.missions.get_count.assert_called_with(status='APPROVED', listing_uids='abc')
+        self.assertEqual(0, self.watcher.errors)
+
+    def test_run(self):
+        """Should poll until stopped, counting errors instead of stopping"""
+        self.watcher.min_interval = self.watcher.interval = 0.001
+        self.missions.get_count.side_effect = [ConnectionError('down'), 1, 1]
+        self.missions.get.return_value = build_missions('a')
+        self.callback.side_effect = lambda missions: self.watcher.stop()
+        self.watcher.run()
+        self.assertEqual(2, self.watcher.polls)
+        self.assertEqual(1, self.watcher.errors)
+        self.assertIn('down', self.missions.debug.log.call_args.args[-1])
+
+    def test_start(self):
+        """Should poll from a background thread until stopped"""
+        self.watcher.min_interval = self.watcher.interval = 0.001
+        self.missions.get_count.return_value = 0
+        self.assertIs(self.watcher, self.watcher.start())
+        while self.watcher.polls < 3:
+            time.sleep(0.001)
+        thread = self.watcher._thread
+        self.watcher.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.watcher._thread)
+        self.watcher.stop()